@@ -1,17 +1,15 @@
 from __future__ import division
+from collections import OrderedDict
 
 # Import OGRE-specific (and other UI-Client) external packages and modules.
 import ogre.renderer.OGRE as ogre
-from twisted.internet import reactor
-
-# Import other external packages and modules.
-import threading, time
 
 # Import internal packages and modules modules.
 from playscene import PlayScene
 import gamestate, net
 from net import packets
 from event import Event, SchedulerManager
+from timestep import FixedTimestep
 
 
 version = (0, 5, 1)
@@ -23,10 +21,11 @@ class ClientApplication(object):
     app_title = "Tides of the Elements %d.%d.%d build %s" % \
         (version[0], version[1], version[2], revision)
 
-    def __init__(self, player_name, address, port=8981):
+    def __init__(self, player_name, address, port=8981, transport="tcp"):
         self.address = address
         self.port = port
         self.player_name = player_name
+        self.transport = transport
 
     def go(self):
         # See Basic Tutorial 6 for details
@@ -84,7 +83,8 @@ class ClientApplication(object):
         vp.backGroundColor = (0, 0, 0)
 
     def createFrameListener(self):
-        self.playScene = PlayScene(self.sceneManager, self.address, self.port, self.player_name)
+        self.playScene = PlayScene(self.sceneManager, self.address, self.port,
+                                   self.player_name, self.transport)
         self.root.addFrameListener(self.playScene)
 
     def startRenderLoop(self):
@@ -97,75 +97,109 @@ class ClientApplication(object):
 
 
 class ServerApplication(SchedulerManager):
-    def __init__(self, port=8981):
+    # The most movement time a client's inputs can have banked (see
+    # _get_input_duration()), so that inputs held up by the network can be
+    # caught up on without the client moving faster than its speed.
+    max_input_time = 2 * packets.PlayerUpdate.max_duration
+
+    def __init__(self, port=8981, tick_rate=100, max_catch_up=5, backend="twisted",
+                 snapshot_interval=0.05, quantize=True):
+        """
+        Arguments:
+        port -- The port to listen for clients on.
+        tick_rate -- The number of game state updates per second.
+        max_catch_up -- The most updates to run in a row when the server falls
+            behind before dropping the rest (see timestep.FixedTimestep).
+        backend -- The networking backend to run the server on: "twisted"
+            (net.server), "asyncio" (net.asyncserver) or "udp" (net.udp,
+            for clients using the UDP transport).
+        snapshot_interval -- The time in seconds between the WorldSnapshots
+            sent to the clients.
+        quantize -- Whether to send the WorldSnapshots quantized (see
+            net.quantization) rather than as floats.
+        """
         SchedulerManager.__init__(self)
         self.port = port
+        self.backend = backend
         self.is_round_active = False
+        self.timestep = FixedTimestep(self.update, tick_rate, max_catch_up)
+        self.snapshot_interval = snapshot_interval
+        self.quantize = quantize
+        self.server = None
 
     def go(self):
         self.world = gamestate.world.World(master=True)
         self.world.object_added += self.on_world_object_added
         self.world.object_removed += self.on_world_object_removed
 
-        self.server = net.server.GameServer(self.world, self.port)
+        if self.backend == "asyncio":
+            # Only imported when used so that asyncio (or trollius) doesn't
+            # have to be installed otherwise.
+            from net.asyncserver import AsyncGameServer
+            self.server = AsyncGameServer(self.world, self.port)
+        elif self.backend == "udp":
+            from net.udp import UdpGameServer
+            self.server = UdpGameServer(self.world, self.port)
+        else:
+            self.server = net.server.GameServer(self.world, self.port)
         self.server.client_connected += self.on_client_connected
         self.server.client_disconnected += self.on_client_disconnected
-        self.server_thread = threading.Thread(target=self.server.go)
-        self.server_thread.start()
+        self.server.packet_received += self.process_packet
 
         self.last_updates = { }
 
-        # A set of players who's status updates need to be sent out.
-        self.status_updates = set()
+        # The world states sent out as WorldSnapshots and the sequence number
+        # of the last snapshot each client has acknowledged.
+        quantization = None
+        if self.quantize:
+            quantization = net.quantization.get_default_quantization()
+        self.snapshots = net.snapshots.SnapshotEncoder(quantization=quantization)
+        self.snapshot_acks = { }
+        self.next_snapshot_time = 0
+        # The world times each client was first sent the recent snapshots
+        # and its round trip time, estimated from when it acknowledges them.
+        self.snapshot_send_times = { }
+        self.round_trip_times = { }
+        # The movement time each client's inputs have left and the world
+        # time it was last topped up.
+        self.input_times = { }
 
         self.scene = gamestate.scenes.TestScene(self.world)
 
         self.is_round_active = True
-        self.run = True
 
-        last = time.clock()
-        while self.run:
-            new = time.clock()
-            dt = new - last
-            self.update(dt)
-            last = new
+        # Everything runs on the server's event loop thread: the loop calls
+        # tick(), which updates the game state at a fixed rate, every tick
+        # and hands received packets straight to process_packet(). This runs
+        # until stop() is called or the process is interrupted.
+        self.server.call_repeatedly(self.timestep.dt, self.tick)
+        self.server.go()
+        print "Ran %d ticks (%d overran, %d dropped)." % (self.timestep.ticks,
+            self.timestep.overruns, self.timestep.dropped_ticks)
 
     def stop(self):
-        self.run = False
-        self.server.stop()
+        if self.server is not None:
+            self.server.stop()
+
+    def tick(self):
+        """
+        Runs the updates that are due and then writes out everything sent
+        since the last tick (including responses to the packets received in
+        between), a single write to each client.
+        """
+        self.timestep.advance()
+        self.server.flush()
 
     def update(self, dt):
         # Add time to schedulers.
         SchedulerManager.update(self, dt)
 
-        # Get buffered input from clients and process it.
-        while not self.server.input.empty():
-            (client, packet) = self.server.input.get_nowait()
-            self.process_packet(client, packet)
-
         # Update the game state world.
         self.world.update(dt)
 
-        # Send necessary ObjectUpdate packets.
-        for object in self.world.objects:
-            if object.type == "player":
-                self._send_update(object)
-
-        # Send necessary ObjectStatusUpdate packets.
-        for object in self.status_updates:
-            update = packets.ObjectStatusUpdate()
-            update.object_id = object.object_id
-            update.health, update.power = object.health, object.power
-            self.server.output_broadcast.put_nowait((update, None))
-        self.status_updates.clear()
-
-        # Send buffered output to clients.
-        reactor.callFromThread(self.server.send)
-
-        # Sleep some if we're updating too fast.
-        extra = 0.01 - dt
-        if extra >= 0.001:
-            time.sleep(extra)
+        if self.world.time >= self.next_snapshot_time:
+            self.next_snapshot_time = self.world.time + self.snapshot_interval
+            self._send_snapshots()
 
     def round_start(self):
         self.is_round_active = True
@@ -175,18 +209,18 @@ class ServerApplication(SchedulerManager):
                 client.player.score = 0
         # Tell everyone that the round is starting.
         start = packets.RoundStart()
-        self.server.output_broadcast.put_nowait((start, None))
+        self.server.broadcast(start)
 
     def round_end(self, winner_player):
         self.is_round_active = False
         # Send RoundEnd packet.
         end = packets.RoundEnd()
-        self.server.output_broadcast.put_nowait((end, None))
+        self.server.broadcast(end)
         # Send a message to everyone.
         m = packets.Message()
         m.message = "%s has won the round." % winner_player.name
         m.type = "success"
-        self.server.output_broadcast.put_nowait((m, None))
+        self.server.broadcast(m)
         # Kill everyone.
         for client in self.server.clients:
             if client.player is not None:
@@ -203,7 +237,7 @@ class ServerApplication(SchedulerManager):
             init.object_type = object.type
             init.element_type = object.element.type
             init.name = object.name
-            self.server.output_broadcast.put_nowait((init, object))
+            self.server.broadcast(init, object)
             # Send a ObjectUpdate for the new player object to everyone.
             self._send_update(object)
 
@@ -211,10 +245,7 @@ class ServerApplication(SchedulerManager):
         if object.type == "player":
             remove = packets.ObjectRemove()
             remove.object_id = object.object_id
-            self.server.output_broadcast.put_nowait((remove, None))
-
-    def on_player_status_changed(self, player, value):
-        self.status_updates.add(player)
+            self.server.broadcast(remove)
 
     def on_player_is_dead_changed(self, player):
         self._send_update(player, check_time=False)
@@ -233,7 +264,7 @@ class ServerApplication(SchedulerManager):
                 message = packets.Message()
                 message.message = m
                 message.type = "death"
-                self.server.output_broadcast.put_nowait((message, None))
+                self.server.broadcast(message)
             self.world.remove_object(player)
         else:
             self.world.add_object(player)
@@ -245,7 +276,7 @@ class ServerApplication(SchedulerManager):
         update = packets.ScoreUpdate()
         update.player_id = player.object_id
         update.score = player.score
-        self.server.output_broadcast.put_nowait((update, None))
+        self.server.broadcast(update)
         if player.score >= 10:
             # Schedule the round end to happen on the next frame. We need to do
             # this because otherwise there is some conflict with the order of
@@ -262,8 +293,13 @@ class ServerApplication(SchedulerManager):
             self.world.remove_object(client.player)
             cd = packets.ClientDisconnect()
             cd.player_id = client.player.object_id
-            self.server.output_broadcast.put_nowait((cd, None))
+            self.server.broadcast(cd)
             client.player = None
+        if self.snapshot_acks.has_key(client):
+            del self.snapshot_acks[client]
+        self.snapshot_send_times.pop(client, None)
+        self.round_trip_times.pop(client, None)
+        self.input_times.pop(client, None)
 
     def process_packet(self, client, packet):
         ptype = type(packet)
@@ -277,9 +313,10 @@ class ServerApplication(SchedulerManager):
             player.name = packet.player_name
             player.object_id = self.world.generate_id()
             player.is_dead = True
+            # The player only moves by the inputs in the client's
+            # PlayerUpdates.
+            player.is_input_driven = True
             # Listen to events.
-            player.health_changed += self.on_player_status_changed
-            player.power_changed += self.on_player_status_changed
             player.is_dead_changed += self.on_player_is_dead_changed
             player.score_changed += self.on_player_score_changed
             player.teleported += self.on_player_teleported
@@ -290,7 +327,7 @@ class ServerApplication(SchedulerManager):
             # Send the JoinResponse.
             response = packets.JoinResponse()
             response.player_id = player.object_id
-            self.server.output.put_nowait((client, response))
+            self.server.send(client, response)
 
             # Send ObjectUpdate and ObjectInit to the player for each object.
             for object in self.world.objects:
@@ -303,20 +340,20 @@ class ServerApplication(SchedulerManager):
                 init.object_type = object.type
                 init.element_type = object.element.type
                 init.name = object.name
-                self.server.output.put_nowait((client, init))
+                self.server.send(client, init)
                 update = self._get_update(object)
-                self.server.output.put_nowait((client, update))
+                self.server.send(client, update)
                 score = packets.ScoreUpdate()
                 score.player_id = object.object_id
                 score.score = object.score
-                self.server.output.put_nowait((client, score))
+                self.server.send(client, score)
 
         # SpawnRequest
         elif ptype is packets.SpawnRequest:
             if self.is_round_active:
                 # @todo: more deny conditions
                 client.player.change_element(packet.element_type)
-                client.player.position = self.scene.generate_spawn_position()
+                client.player.position = self.scene.generate_spawn_position(client.player)
                 client.player.rotation = 1.5707963267948966
                 client.player.health = client.player.max_health
                 client.player.health = client.player.max_power
@@ -324,12 +361,14 @@ class ServerApplication(SchedulerManager):
                 response = packets.SpawnResponse()
                 response.element_type = packet.element_type
                 response.x, response.z = client.player.position
-                self.server.output.put_nowait((client, response))
+                self.server.send(client, response)
                 self._send_update(client.player, check_time=False)
 
         # PlayerUpdate
         elif ptype is packets.PlayerUpdate:
-            client.player.position = (packet.x, packet.z)
+            # Apply the input's movement rather than taking the client's
+            # position, so the server stays authoritative, and let the
+            # client know it has been applied (see _get_state()).
             client.player.rotation = packet.rotation
             if packet.move_speed > 0:
                 client.player.is_moving = True
@@ -337,10 +376,28 @@ class ServerApplication(SchedulerManager):
                 client.player.move_direction = packet.move_direction
             else:
                 client.player.is_moving = False
+            duration = self._get_input_duration(client, packet.duration)
+            if client.player.is_active:
+                client.player.apply_input(duration)
+            client.player.input_sequence = packet.input_sequence
+
+        # SnapshotAck
+        elif ptype is packets.SnapshotAck:
+            self.snapshot_acks[client] = packet.sequence
+            send_times = self.snapshot_send_times.get(client)
+            if send_times is not None and send_times.has_key(packet.sequence):
+                sample = self.world.time - send_times.pop(packet.sequence)
+                rtt = self.round_trip_times.get(client)
+                if rtt is None:
+                    self.round_trip_times[client] = sample
+                else:
+                    self.round_trip_times[client] = rtt + (sample - rtt) / 10
 
         # AbilityRequest
         elif ptype is packets.AbilityRequest:
             # @todo: deny conditions
+            # Compensate for the client's lag in the ability's hit tests.
+            client.player.latency = self._get_latency(client)
             if client.player.use_ability(packet.ability_id):
                 used = packets.AbilityUsed()
                 used.object_id = client.player.object_id
@@ -348,12 +405,82 @@ class ServerApplication(SchedulerManager):
                 # Send an ObjectUpdate for this player so clients have most recent
                 # data when using the ability.
                 self._send_update(client.player, ignore=client.player, check_time=False)
-                self.server.output_broadcast.put_nowait((used, None))
+                self.server.broadcast(used)
+
+    def _send_snapshots(self):
+        """
+        Sends each client a WorldSnapshot of the players in the world as a
+        delta against the last snapshot it acknowledged, so that only what
+        changed since then is sent. Clients that have acknowledged the
+        current state already aren't sent anything.
+        """
+        state = { }
+        for object in self.world.objects:
+            if object.type == "player":
+                state[object.object_id] = self._get_state(object)
+        sequence = self.snapshots.add(self.world.time, state)
+        for client in self.server.clients:
+            baseline_sequence = self.snapshot_acks.get(client)
+            if baseline_sequence != sequence:
+                self.server.send(client, self.snapshots.get_packet(baseline_sequence))
+                send_times = self.snapshot_send_times.setdefault(client, OrderedDict())
+                if not send_times.has_key(sequence):
+                    send_times[sequence] = self.world.time
+                    if len(send_times) > net.snapshots.HISTORY_SIZE:
+                        send_times.popitem(last=False)
+
+    def _get_input_duration(self, client, duration):
+        """
+        Returns how long to apply a client's input for, given the duration
+        it asked for. Each client has a movement time that fills up with the
+        world's time (up to max_input_time) and that its inputs use up, so
+        that sending inputs more often than it moves doesn't move its player
+        any faster.
+        """
+        now = self.world.time
+        available, last_time = self.input_times.get(client,
+            (self.max_input_time, now))
+        available = min(available + now - last_time, self.max_input_time)
+        duration = min(max(duration, 0), packets.PlayerUpdate.max_duration,
+                       available)
+        self.input_times[client] = (available - duration, now)
+        return duration
+
+    def _get_latency(self, client):
+        """
+        Returns how far behind the world's time a client sees the other
+        objects: its round trip time (the snapshots it is shown were sent
+        half of it ago, and what it does arrives half of it later) plus the
+        delay it shows them at (see net.interpolation).
+        """
+        rtt = self.round_trip_times.get(client, 0)
+        return rtt + net.interpolation.RENDER_DELAY
+
+    def _get_state(self, object):
+        """
+        Helper method to get the state of a game object to send in a
+        WorldSnapshot (see net.snapshots).
+        """
+        update = self._get_update(object)
+        return (update.x, update.z, update.rotation, update.move_speed,
+            update.move_direction, update.force_x, update.force_z,
+            int(update.is_dead), object.health, object.power,
+            object.input_sequence)
 
     def _send_update(self, object, ignore=None, check_time=True, check_data=True, forced=False):
+        update = self._get_new_update(object, check_time, check_data, forced)
+        if update is not None:
+            # print "Broadcasting update for object id=%s." % object.object_id
+            self.server.broadcast(update, ignore)
+
+    def _get_new_update(self, object, check_time=True, check_data=True, forced=False):
+        """
+        Returns an ObjectUpdate packet for a game object if one needs to be
+        sent (and records it as sent), otherwise None.
+        """
         # Only send updates for MobileObjects.
         if not isinstance(object, gamestate.objects.MobileObject):
-            return
+            return None
 
         update = self._get_update(object)
         update.forced = forced
@@ -363,7 +490,7 @@ class ServerApplication(SchedulerManager):
 
             # Only send if update threshold has expired.
             if check_time and last_update_time + 0.05 > self.world.time:
-                return
+                return None
 
             # Only send if there is new information to be sent.
             if check_data and update.object_id == last_update.object_id and \
@@ -373,11 +500,10 @@ class ServerApplication(SchedulerManager):
                 update.move_direction == last_update.move_direction and \
                 update.force_x == last_update.force_x and update.force_z == last_update.force_z and \
                 update.is_dead == last_update.is_dead:
-                return
+                return None
 
-        # print "Broadcasting update for object id=%s." % object.object_id
-        self.server.output_broadcast.put_nowait((update, ignore))
         self.last_updates[object] = (self.world.time, update)
+        return update
 
     def _get_update(self, object):
         """ Helper method to create an ObjectUpdate packet from a game object. """
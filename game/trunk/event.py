@@ -21,6 +21,8 @@ class Event:
         return self
 
     def fire(self, *args, **kargs):
+        if not self.handlers:
+            return
         self._is_firing = True
         for handler in self.handlers:
             if handler in self._to_remove:
@@ -28,9 +30,10 @@ class Event:
             if handler(*args, **kargs) is False:
                 self._to_remove.append(handler)
         self._is_firing = False
-        for handler in self._to_remove:
-            self.unhandle(handler)
-        self._to_remove = []
+        if self._to_remove:
+            for handler in self._to_remove:
+                self.unhandle(handler)
+            self._to_remove = []
 
     def getHandlerCount(self):
         return len(self.handlers)
@@ -7,8 +7,10 @@ The gamestate package contains everything relating to the game state.
 
 import abilities
 import collision
+import distancefield
 import elements
 import event
 import objects
 import scenes
+import spatial
 import world
\ No newline at end of file
@@ -5,7 +5,6 @@ from collision import CollisionDetector
 import objects
 import math
 from event import Event, Scheduler
-from collections import defaultdict
 
 
 class AbilityInstance(object):
@@ -15,6 +14,7 @@ class AbilityInstance(object):
         self.expired = Event()
         self.is_active = False
         self.type = ""
+        self.zones = []
 
     def run(self):
         self.is_active = True
@@ -26,8 +26,40 @@ class AbilityInstance(object):
 
     def expire(self):
         self.is_active = False
+        for zone in self.zones:
+            zone.remove()
         self.expired(self)
 
+    def create_zone(self, bounding_shape, position, tick_interval=None):
+        """
+        Creates an area-effect zone (see objects.ZoneObject) with the given
+        shape at the given position that players other than the caster can
+        occupy and adds it to the world. The zone is removed when the ability
+        expires.
+        """
+        zone = objects.ZoneObject(self.player.world, bounding_shape,
+                                  collision.CATEGORY_PLAYER, [self.player],
+                                  tick_interval)
+        zone.owner = self.player
+        zone.position = position
+        self.player.world.add_object(zone)
+        self.zones.append(zone)
+        return zone
+
+    def get_colliders(self, bounding_shape, position,
+                      mask=collision.CATEGORY_PLAYER):
+        """
+        Returns the objects other than the caster colliding with the given
+        shape at the given position, with the moving objects rewound to
+        where the caster saw them: the caster's latency ago (see
+        World.get_colliders_at()). This is for abilities that hit as soon
+        as they are used.
+        """
+        world = self.player.world
+        return world.get_colliders_at(bounding_shape, position,
+                                      world.time - self.player.latency,
+                                      [self.player], mask)
+
 
 class EarthPrimaryInstance(AbilityInstance):
     power_cost = 0
@@ -47,25 +79,35 @@ class EarthPrimaryInstance(AbilityInstance):
             self.expire()
         else:
             self.range = self.player.bounding_shape.radius + 16
-            self.bounding_shape = collision.BoundingCone(self.range,
+            self.bounding_shape = collision.BoundingCone.get(self.range,
                 self.player.rotation, self.hit_angle)
             self.hit_players = []
+            # The swing's area follows the player for the whole swing.
+            zone = self.create_zone(self.bounding_shape, self.player.position)
+            zone.anchor = self.player
+            # Hit whoever was in the swing's area where the caster saw them
+            # at the start, then whoever enters it. The players in it now are
+            # taken as its occupants, so that they are only hit if they were
+            # in it where the caster saw them (or leave it and come back).
+            zone.seed_occupants()
+            zone.entered += self.on_zone_entered
+            for player in self.get_colliders(self.bounding_shape,
+                                             self.player.position):
+                self.on_zone_entered(zone, player)
         
     def update(self, dt):
         AbilityInstance.update(self, dt)
         if not self.player.world.is_master:
             return
-        colliders = self.player.world.get_colliders(self.bounding_shape,
-            self.player.position, [self.player], objects.Player)
-        for player in colliders:
-            if player not in self.hit_players:
-                # print "Earth Primary ability collided with %s players." % (len(colliders))
-                player.apply_damage(self.damage, self.player, 101)
-                self.hit_players.append(player)
         self.duration -= dt
         if self.duration <= 0:
             self.expire()
     
+    def on_zone_entered(self, zone, player):
+        if player not in self.hit_players:
+            player.apply_damage(self.damage, self.player, 101)
+            self.hit_players.append(player)
+    
 class EarthHookInstance(AbilityInstance):
     power_cost = 50
     damage = 10
@@ -89,7 +131,7 @@ class EarthHookInstance(AbilityInstance):
         self.hook_projectile = objects.ProjectileObject(self.player,
             self.projectile_radius, self.projectile_duration)
         self.hook_projectile.position = self.start_position
-        self.hook_projectile.bounding_shape = collision.BoundingCircle(self.projectile_radius)
+        self.hook_projectile.bounding_shape = collision.BoundingCircle.get(self.projectile_radius)
         self.hook_projectile.rotation = self.start_rotation
         self.hook_projectile.move_speed = self.projectile_velocity
         self.hook_projectile.is_moving = True
@@ -104,7 +146,7 @@ class EarthHookInstance(AbilityInstance):
         if self.player.world.is_master:
             if self.player_hooked is None:
                 return
-            if collision.CollisionDetector.check_collision(collision.BoundingCircle(8), 
+            if collision.CollisionDetector.check_collision(collision.BoundingCircle.get(8), 
                                                            self.player_hooked.position,
                                                            self.player.bounding_shape, 
                                                            self.player.position):
@@ -141,7 +183,7 @@ class EarthEarthquakeInstance(AbilityInstance):
         AbilityInstance.__init__(self, player)
         self.type = "EarthEarthQuakeInstance"
         self.position = self.player.position
-        self.bounding_circle = collision.BoundingCircle(self.radius)
+        self.bounding_circle = collision.BoundingCircle.get(self.radius)
         self.time_lived = 0
         self.ticks_done = 0
         self.slowed_players = []
@@ -149,6 +191,11 @@ class EarthEarthquakeInstance(AbilityInstance):
         
     def run(self):
         AbilityInstance.run(self)
+        if self.player.world.is_master:
+            # The earthquake hits the players in its area every tick.
+            zone = self.create_zone(self.bounding_circle, self.position,
+                                    self.tick_time)
+            zone.ticked += self.on_zone_ticked
             
     def update(self, dt):
         AbilityInstance.update(self, dt)
@@ -159,14 +206,10 @@ class EarthEarthquakeInstance(AbilityInstance):
             # print "Earthquake effect destroyed"
             self.expire()
             return
-        if self.player.world.is_master:
-            #otherwise each teach
-            if self.time_lived >= self.ticks_done * self.tick_time:
-                self.ticks_done += 1
-                # get a list of players that were hit by the earthquake
-                colliders = self.player.world.get_colliders(self.bounding_circle, self.position,
-                                                            [self.player], objects.Player)
-                self.master(colliders)
+    
+    def on_zone_ticked(self, zone, players):
+        self.ticks_done += 1
+        self.master(players)
 
                 
     class EarthQuakeScheduler(Scheduler):
@@ -185,7 +228,6 @@ class EarthEarthquakeInstance(AbilityInstance):
         self.slowed_players.remove(slow_scheduler)
         if not self.player_already_slowed(player):
             player.move_speed /= self.slow_speed_multiplier
-            print "Run speed returned to normal."
             
     def player_already_slowed(self, player):
         still_in_list = False
@@ -200,7 +242,6 @@ class EarthEarthquakeInstance(AbilityInstance):
             return self.is_active
     
     def master(self, colliders):
-        print "Earthquake collided with another player!"
         for player in colliders:
             player.apply_damage(self.damage_per_tick, self.player, 103)
             if not self.player_already_slowed(player):
@@ -228,24 +269,34 @@ class EarthPowerSwingInstance(AbilityInstance):
             self.expire()
         else:
             self.range = self.player.bounding_shape.radius + 16
-            self.bounding_shape = collision.BoundingCone(self.range,
+            self.bounding_shape = collision.BoundingCone.get(self.range,
                 self.player.rotation, self.hit_angle)
             self.hit_players = []
+            # The swing's area follows the player for the whole swing.
+            zone = self.create_zone(self.bounding_shape, self.player.position)
+            zone.anchor = self.player
+            # Hit whoever was in the swing's area where the caster saw them
+            # at the start, then whoever enters it. The players in it now are
+            # taken as its occupants, so that they are only hit if they were
+            # in it where the caster saw them (or leave it and come back).
+            zone.seed_occupants()
+            zone.entered += self.on_zone_entered
+            for player in self.get_colliders(self.bounding_shape,
+                                             self.player.position):
+                self.on_zone_entered(zone, player)
     
     def update(self, dt):
         AbilityInstance.update(self, dt)
         if not self.player.world.is_master:
             return
-        colliders = self.player.world.get_colliders(self.bounding_shape,
-            self.player.position, [self.player], objects.Player)
-        for player in colliders:
-            if player not in self.hit_players:
-                print "Earth Power Swing ability collided with %s players." % (len(colliders))
-                player.apply_damage(self.damage, self.player, 104)
-                self.hit_players.append(player)
         self.duration -= dt
         if self.duration <= 0:
             self.expire()
+    
+    def on_zone_entered(self, zone, player):
+        if player not in self.hit_players:
+            player.apply_damage(self.damage, self.player, 104)
+            self.hit_players.append(player)
 
 
 class FirePrimaryInstance(AbilityInstance):
@@ -264,24 +315,26 @@ class FirePrimaryInstance(AbilityInstance):
             self.expire()
         else:
             self.range = self.player.bounding_shape.radius + 16
-            self.bounding_shape = collision.BoundingCone(self.range,
+            self.bounding_shape = collision.BoundingCone.get(self.range,
                 self.player.rotation, 2*math.pi/3)
             self.hit_players = []
+            # The swing's area follows the player for the whole swing.
+            zone = self.create_zone(self.bounding_shape, self.player.position)
+            zone.anchor = self.player
+            zone.entered += self.on_zone_entered
         
     def update(self, dt):
         AbilityInstance.run(self)
         if not self.player.world.is_master:
             return
-        colliders = self.player.world.get_colliders(self.bounding_shape,
-            self.player.position, [self.player], objects.Player)
-        for player in colliders:
-            if player not in self.hit_players:
-                print "Fire Primary ability collided with %s game objects." % (len(colliders))
-                player.apply_damage(self.damage, self.player, 201)
-                self.hit_players.append(player)
         self.duration -= dt
         if self.duration <= 0:
             self.expire()
+    
+    def on_zone_entered(self, zone, player):
+        if player not in self.hit_players:
+            player.apply_damage(self.damage, self.player, 201)
+            self.hit_players.append(player)
         
         
 class FireFlameRushInstance(AbilityInstance):
@@ -312,11 +365,11 @@ class FireFlameRushInstance(AbilityInstance):
         if not object.isPassable or object.type == "player":
             self.collided(self.player)
             # create the bounding circle to check collision against
-            bounding_circle = collision.BoundingCircle(self.radius) 
+            bounding_circle = collision.BoundingCircle.get(self.radius) 
             
             # get a list of colliding players
             colliders = self.player.world.get_colliders(bounding_circle, self.player.position,
-                                                        [self.player], objects.Player)
+                                                        [self.player], collision.CATEGORY_PLAYER)
             
             # for each player, apply effects
             if self.player.world.is_master:
@@ -327,7 +380,6 @@ class FireFlameRushInstance(AbilityInstance):
     def master(self, colliders):
          for player in colliders:
             player.apply_damage(self.damage, self.player, 202)
-            print "Flame Rush collided with some other object!"
 
     def update(self, dt):
         AbilityInstance.update(self, dt)
@@ -351,11 +403,11 @@ class FireLavaSplashInstance(AbilityInstance):
     def run(self):
         AbilityInstance.run(self)
         # create the bounding circle to check collision against
-        bounding_circle = collision.BoundingCircle(self.radius) 
+        bounding_circle = collision.BoundingCircle.get(self.radius) 
         
         # get a list of colliding players
         colliders = self.player.world.get_colliders(bounding_circle, self.player.position,
-                                                    [self.player], objects.Player)
+                                                    [self.player], collision.CATEGORY_PLAYER)
         
         # for each player, apply effects
         if self.player.world.is_master:
@@ -367,7 +419,6 @@ class FireLavaSplashInstance(AbilityInstance):
     def master(self, colliders):
         for player in colliders:
             player.apply_damage(self.damage, self.player, 203)
-            print "Lava Splash collided with another player!"
         
 class FireRingOfFireInstance(AbilityInstance):
     power_cost = 50
@@ -376,24 +427,27 @@ class FireRingOfFireInstance(AbilityInstance):
     radius = 96
     ring_thickness = 8
     tick_time = 1
-    last_player_hit_times = defaultdict(int)
     
     def __init__(self, player):
         AbilityInstance.__init__(self, player)
         self.type = "FireRingOfFireInstance"
         self.time_to_live = self.duration
-        self.ring_of_fire = objects.ProjectileObject(self.player, self.radius,
-                                                     self.duration)
-        self.ring_of_fire.position = self.player.position
-        self.ring_of_fire.bounding_shape = collision.BoundingCircle(self.radius, True)
-        self.ring_of_fire.outer_bounding_circle = collision.BoundingCircle(self.radius + self.ring_thickness, True)
-        self.ring_of_fire.inner_bounding_circle = collision.BoundingCircle(self.radius - self.ring_thickness, True)
-        self.ring_of_fire.move_speed = 0
-        self.ring_of_fire.is_moving = False
+        self.position = self.player.position
+        self.last_player_hit_times = { }
+        self.ring_of_fire = None
         
     def run(self):
         AbilityInstance.run(self)
-        # nothing to do here really
+        if self.player.world.is_master:
+            # The ring's area is the ring of fire itself, thickened on both
+            # sides.
+            self.ring_of_fire = self.create_zone(
+                collision.BoundingAnnulus.get(self.radius - self.ring_thickness,
+                                              self.radius + self.ring_thickness),
+                self.position)
+            # The players in the ring are hit once the zone has brought its
+            # occupants up to date each update.
+            self.ring_of_fire.updated += self.on_zone_updated
   
     def update(self, dt):
         AbilityInstance.update(self, dt)
@@ -402,22 +456,9 @@ class FireRingOfFireInstance(AbilityInstance):
         self.duration -= dt
         if self.duration <= 0:
             self.expire()
-            return
-        
-        # otherwise do our updates
-        colliders = self.player.world.get_colliders(self.ring_of_fire.bounding_shape, self.ring_of_fire.position,
-                                                    [self.player], objects.Player)
-        inner_colliders = self.player.world.get_colliders(self.ring_of_fire.inner_bounding_circle, self.ring_of_fire.position,
-                                                    [self.player], objects.Player)
-        outer_colliders = self.player.world.get_colliders(self.ring_of_fire.outer_bounding_circle, self.ring_of_fire.position,
-                                                          [self.player], objects.Player)
-        for collider in inner_colliders:
-            colliders.append(collider)
-        for collider in outer_colliders:
-            colliders.append(collider)
-            
-        if self.player.world.is_master:
-            self.master(colliders)
+    
+    def on_zone_updated(self, zone, players):
+        self.master(players)
      
     def master(self, colliders):   
         for collider in colliders:
@@ -428,14 +469,12 @@ class FireRingOfFireInstance(AbilityInstance):
                 # check to see if the player was hit long ago enough to hit him again
                 dt = self.player.world.time - self.last_player_hit_times[collider]
                 if dt >= self.tick_time:
-                    print "A player was hit by Ring of Fire again!"
                     self.last_player_hit_times[collider] = self.player.world.time
                     collider.apply_damage(self.damage_per_tick, self.player, 204)
                     
             # if the player has not already been hit
             else:
                 self.last_player_hit_times[collider] = self.player.world.time
-                print "A new player was hit by Ring of Fire!"
                 collider.apply_damage(self.damage_per_tick, self.player, 204)
     
 class AirPrimaryInstance(AbilityInstance):
@@ -474,7 +513,6 @@ class AirPrimaryInstance(AbilityInstance):
     def master(self, player):
         damage = int(self.projectile.move_speed / self.damage_divisor)
         player.apply_damage(damage, self.player, 301)
-        print "Air Shot collided with another player for " + str(damage) + " damage!"
         
 class AirGustOfWindInstance(AbilityInstance):
     power_cost = 30
@@ -493,11 +531,10 @@ class AirGustOfWindInstance(AbilityInstance):
         AbilityInstance.run(self)
         if self.player.world.is_master:
             # create the bounding circle to check collision against
-            bounding_cone = collision.BoundingCone(self.hit_radius, self.player.rotation, self.hit_angle) 
+            bounding_cone = collision.BoundingCone.get(self.hit_radius, self.player.rotation, self.hit_angle) 
             
             # get a list of colliding players
-            self.targets = self.player.world.get_colliders(bounding_cone, self.player.position,
-                                                        [self.player], objects.Player)
+            self.targets = self.get_colliders(bounding_cone, self.player.position)
             
             # for each player, apply effects
             for player in self.targets:
@@ -535,11 +572,6 @@ class AirWindWhiskInstance(AbilityInstance):
     power_cost = 30
     teleport_distance = 100
     
-    # increasing move_samples increases collision detection accuracy (no jumping over stuff etc)
-    # at the cost of extra calculation time. Each sample will be tested at intervals of length
-    # (teleport_distance / move_samples).
-    move_samples = 30 
-    
     def __init__(self, player):
         AbilityInstance.__init__(self, player)
         self.type = "AirGustOfWindInstance"
@@ -548,23 +580,16 @@ class AirWindWhiskInstance(AbilityInstance):
         
     def run(self):
         AbilityInstance.run(self)
-        # hackish implementation
-        # @todo: make this less hackish
-        if self.player.world.is_master:    
-            i = 0
-            while i < self.move_samples:
-                sample_position = (self.player.position[0] + (self.teleport_distance /  self.move_samples) * math.cos(self.player.rotation),
-                                   self.player.position[1] + (self.teleport_distance /  self.move_samples) * math.sin(self.player.rotation))
-                colliders = self.player.world.get_colliders(self.player.bounding_shape, sample_position,
-                                                       [self.player])
-                for collider in colliders:
-                    if collider.type == "player" or collider.type == "projectile":
-                        continue
-                    else:
-                        self.has_collided = True
-                move_vector = (sample_position[0] - self.player.position[0], sample_position[1] - self.player.position[1])
-                self.player._move(move_vector) # <-- this is why it's hackish
-                i += 1
+        if self.player.world.is_master:
+            # Dash forward in a single (swept) move so that the player stops
+            # at the first wall or obstacle in the way.
+            colliders = self.player._move_towards(self.teleport_distance,
+                                                  self.player.rotation)
+            for collider in colliders:
+                if collider.type == "player" or collider.type == "projectile":
+                    continue
+                else:
+                    self.has_collided = True
             self.player.teleported(self.player)
         # end the effect
         self.expire()
@@ -581,35 +606,23 @@ class AirLightningBoltInstance(AbilityInstance):
     def run(self):
         AbilityInstance.run(self)
         
-        bounding_circle = collision.BoundingCircle(self.range) 
-        
-        # find a target
-        colliders = self.player.world.get_colliders(bounding_circle, self.player.position,
-                                                    [self.player], objects.Player)
-        if len(colliders) == 0:
+        # find the closest target in range
+        targets = self.player.world.nearest(self.player.position, self.range,
+                                            collision.CATEGORY_PLAYER, 1,
+                                            [self.player])
+        if len(targets) == 0:
             # no targets in range
             return
         
-        self.target = colliders[0]
-        min_distance = self._square_of_distance(self.player, colliders[0])
-        
-        for collider in colliders:
-            distance_to_collider = self._square_of_distance(self.player, collider)
-            if distance_to_collider < min_distance:
-                min_distance = distance_to_collider
-                self.target = collider
+        self.target = targets[0]
                 
         # target found, cast spell
         # @todo: apply damage to self.target here 
         if self.player.world.is_master:
             self.master(self.target)
         
-    def _square_of_distance(self, player1, player2):
-        return (player2.position[0] - player1.position[0]) * (player2.position[0] - player1.position[0]) + (player2.position[1] - player1.position[1]) * (player2.position[1] - player1.position[1])
-                
     def master(self, target):
         target.apply_damage(self.damage, self.player, 304)
-        print "Another player was hit by lightning bolt!"
         
     def update(self, dt):
         AbilityInstance.update(self, dt)
@@ -651,7 +664,6 @@ class WaterPrimaryInstance(AbilityInstance):
     def master(self, object_collided_with):
         if object_collided_with.type == "player":
             object_collided_with.apply_damage(self.damage, self.player, 401)
-            print "Ice Shot collided with another player!"
 
 
 class WaterWaterGushInstance(AbilityInstance):  
@@ -659,11 +671,6 @@ class WaterWaterGushInstance(AbilityInstance):
     damage = 25
     teleport_distance = 100
     
-    # increasing move_samples increases collision detection accuracy (no jumping over stuff etc)
-    # at the cost of extra calculation time. Each sample will be tested at intervals of length
-    # (teleport_distance / move_samples).
-    move_samples = 30 
-    
     def __init__(self, player):
         AbilityInstance.__init__(self, player)
         self.type = "WaterWaterGushInstance"
@@ -673,30 +680,20 @@ class WaterWaterGushInstance(AbilityInstance):
     
     def run(self):
         AbilityInstance.run(self)
-        # hackish implementation
-        # @todo: make this less hackish
-        
         if self.player.world.is_master:
-            i = 0
-            already_collided = defaultdict(int)
-            while i < self.move_samples:
-                sample_position = (self.player.position[0] + (self.teleport_distance /  self.move_samples) * math.cos(self.player.rotation),
-                                   self.player.position[1] + (self.teleport_distance /  self.move_samples) * math.sin(self.player.rotation))
-                colliders = self.player.world.get_colliders(self.player.bounding_shape, sample_position,
-                                                       [self.player])
-                for collider in colliders:
-                    if collider.type == "projectile":
-                        continue
-                    elif collider.type == "player":
-                        if not already_collided[collider]:
-                            collider.apply_damage(self.damage, self.player, 402)
-                            already_collided[collider] = True
-                            # print "Water Gush collided with another player!"
-                    else:
-                        self.has_collided = True
-                move_vector = (sample_position[0] - self.player.position[0], sample_position[1] - self.player.position[1])
-                self.player._move(move_vector) # <-- this is why it's hackish
-                i += 1
+            # Dash forward in a single (swept) move, damaging every player we
+            # pass through on the way (each only once) and stopping at the
+            # first wall or obstacle in the way.
+            colliders = self.player._move_towards(self.teleport_distance,
+                                                  self.player.rotation)
+            for collider in colliders:
+                if collider.type == "projectile":
+                    continue
+                elif collider.type == "player":
+                    collider.apply_damage(self.damage, self.player, 402)
+                    # print "Water Gush collided with another player!"
+                else:
+                    self.has_collided = True
             self.player.teleported(self.player)
         # end the effect
         self.expire()      
@@ -720,14 +717,12 @@ class WaterTidalWaveInstance(AbilityInstance):
     
     def master(self):
         # create the bounding circle to check collision against
-        bounding_cone = collision.BoundingCone(self.hit_radius, self.player.rotation, self.hit_angle) 
+        bounding_cone = collision.BoundingCone.get(self.hit_radius, self.player.rotation, self.hit_angle) 
         # get a list of colliding players
-        colliders = self.player.world.get_colliders(bounding_cone, self.player.position,
-                                                    [self.player], objects.Player)
+        colliders = self.get_colliders(bounding_cone, self.player.position)
         # for each player, apply effects
         for player in colliders:
             player.apply_damage(self.damage, self.player, 403)
-            print "Tidal Wave collided with another player!"
         
 class WaterIceBurstInstance(AbilityInstance):
     power_cost = 50
@@ -761,15 +756,14 @@ class WaterIceBurstInstance(AbilityInstance):
         self.expire()
     
     def master(self):
-        bounding_circle = collision.BoundingCircle(self.shard_radius) 
+        bounding_circle = collision.BoundingCircle.get(self.shard_radius) 
         
         # get a list of colliding players
         colliders = self.player.world.get_colliders(bounding_circle, self.player.position,
-                                                    [self.player], objects.Player)
+                                                    [self.player], collision.CATEGORY_PLAYER)
         # for each player, apply effects
         for player in colliders:
             player.apply_damage(self.shard_damage, self.player, 404)
-            print "Ice Burst collided with another player!"
 
 abilityinstances = {
     101: EarthPrimaryInstance,
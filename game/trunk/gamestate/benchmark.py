@@ -0,0 +1,459 @@
+"""
+The benchmark module times the gamestate package's collision detection and
+movement code on generated scenarios: every CollisionDetector pair routine,
+World.get_colliders() and MobileObject._move() with 2 to 256 players and up
+to 1000 projectiles on the real arena (its level bounds and volcanos), and
+whole world updates. It needs no OGRE or display; when OGRE isn't installed
+a stand-in ogre.Vector3 is used for the reference ogrecollision routines.
+
+Run it from the game's directory with:
+
+    python -m gamestate.benchmark [--baseline FILE] [--save] [--quick]
+
+Results are reported in ns per call (and ticks per second for the world
+updates). They are compared against the JSON baseline file if it exists so
+that regressions show up, and --save replaces the baseline with them.
+
+The server's budget for a tick is 10 ms, so the world updates need to run
+at 100 ticks per second or more.
+"""
+
+from __future__ import division
+import sys
+import os
+import math
+import random
+import json
+import timeit
+import types
+from optparse import OptionParser
+
+import gamestate
+
+# The default file the baseline results are stored in.
+BASELINE_FILEPATH = "benchmark.json"
+
+# Results slower than the baseline by more than this fraction are reported as
+# regressions.
+TOLERANCE = 0.15
+
+# The (players, projectiles) of each generated scenario.
+SCENARIOS = [(2, 0), (8, 0), (32, 100), (64, 250), (128, 500), (256, 1000)]
+
+# The (left, top, right, bottom) area of the arena that players and
+# projectiles are placed in.
+ARENA_BOUNDS = (-600, -600, 590, 600)
+
+# The length of a game tick in seconds.
+TICK_TIME = 0.01
+
+
+class Vector3(object):
+    """
+    A minimal pure Python stand-in for ogre.Vector3, with just what the
+    ogrecollision module uses.
+    """
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __add__(self, other):
+        return Vector3(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return Vector3(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __mul__(self, scalar):
+        return Vector3(self.x * scalar, self.y * scalar, self.z * scalar)
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return Vector3(-self.x, -self.y, -self.z)
+
+    def dotProduct(self, other):
+        return self.x * other.x + self.y * other.y + self.z * other.z
+
+    def normalise(self):
+        """ Normalises the vector in place and returns its old length. """
+        length = math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+        if length > 1e-08:
+            self.x /= length
+            self.y /= length
+            self.z /= length
+        return length
+
+
+def _import_ogrecollision():
+    """
+    Imports and returns the ogrecollision module, first registering a
+    stand-in ogre.renderer.OGRE module (providing only Vector3) if OGRE is not
+    installed.
+    """
+    try:
+        import ogre.renderer.OGRE
+    except ImportError:
+        OGRE = types.ModuleType("ogre.renderer.OGRE")
+        OGRE.Vector3 = Vector3
+        renderer = types.ModuleType("ogre.renderer")
+        renderer.OGRE = OGRE
+        package = types.ModuleType("ogre")
+        package.renderer = renderer
+        sys.modules["ogre"] = package
+        sys.modules["ogre.renderer"] = renderer
+        sys.modules["ogre.renderer.OGRE"] = OGRE
+    import gamestate.ogrecollision
+    return gamestate.ogrecollision
+
+
+def time_calls(function, arguments, repeat=3):
+    """
+    Calls function(*args) for each args in the given list of argument tuples
+    and returns the average time of a call in nanoseconds (the best of repeat
+    runs).
+    """
+    best = None
+    for i in xrange(repeat):
+        start = timeit.default_timer()
+        for args in arguments:
+            function(*args)
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(arguments) * 1e9
+
+
+def _get_pair_arguments(count, rng, rect_extent=None):
+    """
+    Returns count random (position1, position2) pairs of positions close
+    enough together for most shape pairs to be tested past their bounding
+    boxes (about half of them collide). If rect_extent is given, pairs where
+    position1 is within that distance of position2 are left out (a circle's
+    center may not be inside a rectangle).
+    """
+    pairs = []
+    while len(pairs) < count:
+        position1 = (rng.uniform(-50, 50), rng.uniform(-50, 50))
+        position2 = (rng.uniform(-50, 50), rng.uniform(-50, 50))
+        if rect_extent is not None:
+            dx = position1[0] - position2[0]
+            dz = position1[1] - position2[1]
+            if math.sqrt(dx * dx + dz * dz) <= rect_extent:
+                continue
+        pairs.append((position1, position2))
+    return pairs
+
+
+def benchmark_pair_routines(calls, seed=0):
+    """
+    Times every CollisionDetector pair routine (and the equivalent
+    ogrecollision reference routines) and returns a dictionary of ns per call
+    by routine name.
+    """
+    collision = gamestate.collision
+    detector = collision.CollisionDetector
+    ogrecollision = _import_ogrecollision()
+    reference = ogrecollision.OgreCollisionDetector
+    to_vector = ogrecollision._vector
+
+    rng = random.Random(seed)
+    circle = collision.BoundingCircle.get(12)
+    hollow_circle = collision.BoundingCircle.get(30, True)
+    line = collision.BoundingLineSegment((0, 0), (40, 25), (-0.53, 0.85))
+    line2 = collision.BoundingLineSegment((0, 0), (-30, 35), (0.76, 0.65))
+    rectangle = collision.BoundingRectangle.get(30, 20, 30)
+    cone = collision.BoundingCone.get(40, 0.5, 2 * math.pi / 3)
+    annulus = collision.BoundingAnnulus.get(20, 36)
+    pairs = _get_pair_arguments(calls, rng)
+    rect_pairs = _get_pair_arguments(calls, rng, rectangle.max_distance)
+    moves = [(rng.uniform(-20, 20), rng.uniform(-20, 20)) for i in xrange(calls)]
+
+    def with_shapes(shape1, shape2, pairs):
+        return [(shape1, p1, shape2, p2) for p1, p2 in pairs]
+    def with_old_position(shape1, shape2, pairs):
+        # The old positions are a little further from position2.
+        arguments = []
+        for p1, p2 in pairs:
+            dx = p1[0] - p2[0]
+            dz = p1[1] - p2[1]
+            scale = 4 / max(math.sqrt(dx * dx + dz * dz), 1e-08)
+            arguments.append((shape1, p1, (p1[0] + dx * scale, p1[1] + dz * scale),
+                              shape2, p2))
+        return arguments
+    def as_vectors(arguments):
+        return [tuple(to_vector(value) if isinstance(value, tuple) else value
+                      for value in args) for args in arguments]
+
+    routines = [
+        ("check_aabb_collision", detector.check_aabb_collision,
+         with_shapes(circle, line, pairs)),
+        ("is_between", detector.is_between,
+         [(circle, p1, line) for p1, p2 in pairs]),
+        ("_check_circle_circle", detector._check_circle_circle,
+         with_shapes(circle, circle, pairs)),
+        ("_check_circle_circle_hollow", detector._check_circle_circle_hollow,
+         with_shapes(hollow_circle, circle, pairs)),
+        ("_check_circle_line", detector._check_circle_line,
+         with_shapes(circle, line, pairs)),
+        ("_is_circle_intersecting_line", detector._is_circle_intersecting_line,
+         with_shapes(circle, line, pairs)),
+        ("_check_circle_rect", detector._check_circle_rect,
+         with_shapes(circle, rectangle, rect_pairs)),
+        ("_check_cone_circle", detector._check_cone_circle,
+         with_shapes(cone, circle, pairs)),
+        ("_check_annulus_circle", detector._check_annulus_circle,
+         with_shapes(annulus, circle, pairs)),
+        ("_check_line_line", detector._check_line_line,
+         with_shapes(line, line2, pairs)),
+        ("_check_line_rect", detector._check_line_rect,
+         with_shapes(line, rectangle, pairs)),
+        ("_resolve_circle_line", detector._resolve_circle_line,
+         with_old_position(circle, line, pairs)),
+        ("_resolve_circle_circle", detector._resolve_circle_circle,
+         with_shapes(circle, circle, pairs)),
+        ("_resolve_circle_rectangle", detector._resolve_circle_rectangle,
+         with_old_position(circle, rectangle, rect_pairs)),
+        ("get_time_of_impact circle", detector.get_time_of_impact,
+         [(circle, p1, move, circle, p2) for (p1, p2), move in zip(pairs, moves)]),
+        ("get_time_of_impact linesegment", detector.get_time_of_impact,
+         [(circle, p1, move, line, p2) for (p1, p2), move in zip(pairs, moves)]),
+    ]
+    reference_routines = [
+        ("_check_circle_circle", reference._check_circle_circle,
+         with_shapes(circle, circle, pairs)),
+        ("_check_circle_circle_hollow", reference._check_circle_circle_hollow,
+         with_shapes(hollow_circle, circle, pairs)),
+        ("_check_circle_line", reference._check_circle_line,
+         with_shapes(circle, line, pairs)),
+        ("_check_circle_rect", reference._check_circle_rect,
+         with_shapes(circle, rectangle, rect_pairs)),
+        ("_check_cone_circle", reference._check_cone_circle,
+         with_shapes(cone, circle, pairs)),
+        ("_check_line_line", reference._check_line_line,
+         with_shapes(line, line2, pairs)),
+        ("_resolve_circle_line", reference._resolve_circle_line,
+         with_old_position(circle, line, pairs)),
+        ("_resolve_circle_circle", reference._resolve_circle_circle,
+         with_shapes(circle, circle, pairs)),
+    ]
+
+    results = { }
+    for name, function, arguments in routines:
+        results["pair %s" % name] = time_calls(function, arguments)
+    for name, function, arguments in reference_routines:
+        results["ogre pair %s" % name] = time_calls(function, as_vectors(arguments))
+    return results
+
+
+def _get_free_position(world, radius, rng):
+    """
+    Returns a random position in the arena at least radius away from the
+    level's walls and volcanos.
+    """
+    left, top, right, bottom = ARENA_BOUNDS
+    field = world.distance_field
+    while True:
+        position = (rng.uniform(left, right), rng.uniform(top, bottom))
+        if field is None:
+            return position
+        sample = field.sample(position)
+        if sample is not None and sample[0] - field.max_error > radius:
+            return position
+
+
+class Scenario(object):
+    """
+    A generated master world on the arena with the given number of players
+    and projectiles at random free positions, moving in random directions.
+    """
+    def __init__(self, player_count, projectile_count, seed=0):
+        self.rng = random.Random(seed)
+        self.world = gamestate.world.World(True)
+        self.scene = gamestate.scenes.TestScene(self.world)
+        self.players = []
+        self.projectiles = []
+        for i in xrange(player_count):
+            player = gamestate.objects.Player(self.world)
+            player.name = "player%d" % i
+            player.change_element(("earth", "fire", "air", "water")[i % 4])
+            player.position = _get_free_position(self.world, 8, self.rng)
+            player.rotation = self.rng.uniform(-math.pi, math.pi)
+            self.world.add_object(player)
+            self.players.append(player)
+        for i in xrange(projectile_count):
+            self.add_projectile()
+
+    def add_projectile(self):
+        """ Adds a projectile fired by a random player. """
+        if len(self.players) == 0:
+            return
+        player = self.rng.choice(self.players)
+        projectile = gamestate.objects.ProjectileObject(player, 4, 1e9)
+        projectile.position = _get_free_position(self.world, 6, self.rng)
+        projectile.rotation = self.rng.uniform(-math.pi, math.pi)
+        projectile.move_speed = 300
+        projectile.is_moving = True
+        projectile.expired += self.on_projectile_expired
+        self.projectiles.append(projectile)
+
+    def on_projectile_expired(self, projectile):
+        self.projectiles.remove(projectile)
+
+    def update(self):
+        """
+        Updates the world for a tick with every player moving (turning now
+        and then) and replaces the projectiles that hit something.
+        """
+        rng = self.rng
+        for player in self.players:
+            if rng.random() < 0.05:
+                player.rotation = rng.uniform(-math.pi, math.pi)
+            player.is_moving = True
+        self.world.update(TICK_TIME)
+
+
+def benchmark_scenario(player_count, projectile_count, calls, ticks, seed=0):
+    """
+    Times World.get_colliders(), MobileObject._move() and whole world updates
+    in a generated scenario. Returns a dictionary of results (ns per call, or
+    ticks per second for the updates) by name.
+    """
+    collision = gamestate.collision
+    scenario = Scenario(player_count, projectile_count, seed)
+    world = scenario.world
+    rng = scenario.rng
+    name = "%d players %d projectiles" % (player_count, projectile_count)
+    results = { }
+
+    # get_colliders() with the shapes the abilities use, at the players.
+    positions = [rng.choice(scenario.players).position for i in xrange(calls)]
+    circle = collision.BoundingCircle.get(50)
+    cone = collision.BoundingCone.get(22, 0.5, 2 * math.pi / 3)
+    results["get_colliders circle %s" % name] = time_calls(world.get_colliders,
+        [(circle, position, [], collision.CATEGORY_PLAYER) for position in positions])
+    results["get_colliders cone %s" % name] = time_calls(world.get_colliders,
+        [(cone, position, [], collision.CATEGORY_PLAYER) for position in positions])
+
+    # _move() by a tick's worth of movement. Every move is undone straight
+    # away so each run moves the players from the same positions.
+    movers = [rng.choice(scenario.players) for i in xrange(calls)]
+    moves = []
+    for player in movers:
+        direction = rng.uniform(-math.pi, math.pi)
+        distance = player.move_speed * TICK_TIME
+        moves.append((player, (distance * math.cos(direction),
+                               distance * math.sin(direction))))
+    def move(player, move_vector):
+        position = player.position
+        player._move(move_vector)
+        player.position = position
+    results["_move %s" % name] = time_calls(move, moves)
+
+    # Whole world updates, replacing projectiles that hit something between
+    # ticks (outside of the timing).
+    elapsed = 0
+    for i in xrange(ticks):
+        start = timeit.default_timer()
+        scenario.update()
+        elapsed += timeit.default_timer() - start
+        while len(scenario.projectiles) < projectile_count:
+            scenario.add_projectile()
+    results["ticks/s %s" % name] = ticks / elapsed
+    return results
+
+
+def run(quick=False):
+    """ Runs every benchmark and returns a dictionary of the results. """
+    calls = 2000 if quick else 20000
+    scenario_calls = 200 if quick else 2000
+    ticks = 20 if quick else 200
+    results = benchmark_pair_routines(calls)
+    for player_count, projectile_count in SCENARIOS:
+        results.update(benchmark_scenario(player_count, projectile_count,
+                                          scenario_calls, ticks))
+    return results
+
+
+def compare(results, baseline):
+    """
+    Returns a list of (name, result, baseline result, change) tuples for the
+    results that are in the baseline, where change is how much worse (as a
+    fraction of the baseline) the result is. Ticks per second are better
+    when higher and everything else when lower.
+    """
+    comparison = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        result = results[name]
+        old = baseline[name]
+        if name.startswith("ticks/s"):
+            change = (old - result) / old
+        else:
+            change = (result - old) / old
+        comparison.append((name, result, old, change))
+    return comparison
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    parser = OptionParser(usage="python -m gamestate.benchmark [options]")
+    parser.add_option("--baseline", default=BASELINE_FILEPATH,
+                      help="the JSON baseline file to compare against")
+    parser.add_option("--save", action="store_true", default=False,
+                      help="save the results as the new baseline")
+    parser.add_option("--quick", action="store_true", default=False,
+                      help="make fewer calls (noisier results)")
+    parser.add_option("--tolerance", type="float", default=TOLERANCE,
+                      help="the fraction a result can be worse than the baseline by")
+    options, arguments = parser.parse_args(argv[1:])
+
+    # The scenarios are loaded from the game's directory (where the media
+    # directory is).
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    results = run(options.quick)
+
+    baseline = None
+    if os.path.exists(options.baseline):
+        baseline_file = open(options.baseline, "r")
+        try:
+            baseline = json.load(baseline_file)
+        finally:
+            baseline_file.close()
+
+    regressions = 0
+    if baseline is None:
+        for name in sorted(results):
+            print "%-56s %14.1f" % (name, results[name])
+    else:
+        for name, result, old, change in compare(results, baseline):
+            flag = ""
+            if change > options.tolerance:
+                flag = "  REGRESSION"
+                regressions += 1
+            print "%-56s %14.1f %14.1f %+7.1f%%%s" % (name, result, old,
+                                                       change * 100, flag)
+        for name in sorted(set(results) - set(baseline)):
+            print "%-56s %14.1f %14s" % (name, results[name], "(new)")
+
+    if options.save:
+        baseline_file = open(options.baseline, "w")
+        try:
+            json.dump(results, baseline_file, indent=4, sort_keys=True)
+        finally:
+            baseline_file.close()
+        print "Saved the results to %s." % options.baseline
+
+    if regressions > 0:
+        print "%d results regressed by more than %.0f%%." % (
+            regressions, options.tolerance * 100)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,121 +1,247 @@
+from __future__ import division
 import math
-import ogre.renderer.OGRE as ogre
-                                             
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is optional. Without it the batch routines are not available and
+    # shapes are tested one at a time.
+    numpy = None
+
+# Collision categories. Every game object belongs to one category (its
+# collision_category) and only collides with objects whose category is in its
+# collision_mask (and whose collision_mask contains its category). These are
+# checked before any of the collision detection routines are used.
+CATEGORY_DEFAULT = 0x1
+CATEGORY_PLAYER = 0x2
+CATEGORY_PROJECTILE = 0x4
+CATEGORY_WALL = 0x8
+CATEGORY_ZONE = 0x10
+CATEGORY_ALL = 0xFFFF
+
+# All points and vectors used by the collision detection routines are plain
+# (x, z) tuples so that no ogre.Vector3 objects have to be created (and so
+# that the server does not need OGRE installed). The original ogre.Vector3
+# based routines can be found in the ogrecollision module.
+
+# The maximum number of interned shapes kept for each shape class. Shapes with
+# float parameters (such as a cone's orientation) are rarely asked for twice,
+# so once a class' cache is full its oldest shapes are dropped.
+SHAPE_CACHE_SIZE = 256
+
 class BoundingObject(object):
+    """
+    The base class of the bounding shapes. Shapes can't be changed once they
+    are constructed, so one shape can be shared by any number of objects and
+    anything derived from a shape's parameters is computed only once. Use a
+    shape class' get() method to get the shared (interned) shape with the
+    given parameters instead of constructing a new one.
+    """
     def __init__(self, type):
         self.type = type
-        
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get("_is_frozen", False):
+            raise AttributeError("Bounding shapes are immutable.")
+        object.__setattr__(self, name, value)
+
+    def _freeze(self):
+        """ Makes the shape immutable. Called at the end of __init__. """
+        self._is_frozen = True
+
+    @classmethod
+    def _intern(cls, parameters):
+        """
+        Returns the interned shape of this class constructed with the given
+        tuple of parameters, constructing it if it isn't in the cache.
+        """
+        cache = cls.__dict__.get("_cache")
+        if cache is None:
+            cache = OrderedDict()
+            cls._cache = cache
+        shape = cache.get(parameters)
+        if shape is None:
+            shape = cls(*parameters)
+            if len(cache) >= SHAPE_CACHE_SIZE:
+                cache.popitem(last=False)
+            cache[parameters] = shape
+        return shape
+
     def setup_AABB(self, top, right, bottom, left):
         self.aabb_top = top
         self.aabb_right = right
         self.aabb_bottom = bottom
         self.aabb_left = left
 
+    def get_AABB(self, position):
+        """
+        Returns the (left, top, right, bottom) absolute bounds of the shape's
+        axis-aligned bounding box when the shape is at the given position.
+        """
+        return (self.aabb_left + position[0], self.aabb_top + position[1],
+                self.aabb_right + position[0], self.aabb_bottom + position[1])
+
 class BoundingCircle(BoundingObject):
     def __init__(self, radius, is_hollow = False):
         BoundingObject.__init__(self, "circle")
         self.radius = radius
+        self.radius_squared = radius * radius
         self.is_hollow = is_hollow
-        
+
         self.setup_AABB(-radius, radius, radius, -radius)
+        self._freeze()
+
+    @classmethod
+    def get(cls, radius, is_hollow=False):
+        """ Returns the interned circle with the given parameters. """
+        return cls._intern((radius, is_hollow))
 
 class BoundingLineSegment(BoundingObject):
     def __init__(self, point1, point2, normal=None):
         BoundingObject.__init__(self, "linesegment")
-        self.point1 = ogre.Vector3(point1[0], 0, point1[1])
-        self.point2 = ogre.Vector3(point2[0], 0, point2[1])
-        self.vector = ogre.Vector3(self.point2.x - self.point1.x, 0, self.point2.z - self.point1.z)
+        self.point1 = (point1[0], point1[1])
+        self.point2 = (point2[0], point2[1])
+        self.vector = (point2[0] - point1[0], point2[1] - point1[1])
         if normal is not None:
-            self.normal = ogre.Vector3(normal[0], 0, normal[1])
+            self.normal = (normal[0], normal[1])
         #@todo: if normal == None, calculate it from p1, p2
-        
+
         top = min((point1[1], point2[1])) - point1[1]
         right = max((point1[0], point2[0])) - point1[0]
         bottom = max((point1[1], point2[1])) - point1[1]
         left = min((point1[0], point2[0])) - point1[0]
-        
+
         self.setup_AABB(top, right, bottom, left)
+        self._freeze()
 
 class BoundingRectangle(BoundingObject):
     def __init__(self, width, height, rotation):
         BoundingObject.__init__(self, "rectangle")
-        
+
         self.width = width
         self.height = height
         self.rotation = math.radians(rotation)
-        
+
         w = width/2
         h = height/2
-        
+
         c = math.sqrt(w*w + h*h)
         self.max_distance = c
-        
+
         # calculate rectangle vertices as relative offsets from center
-        
+
         theta = math.atan2(height, width)
 
         #DONT CHANGE THIS - order of points is important
-        point1 = ogre.Vector3(c * math.cos(self.rotation + theta), 0, c * math.sin(self.rotation + theta))
-        point2 = ogre.Vector3(c * math.cos(self.rotation + (math.pi - theta)), 0, c * math.sin(self.rotation + (math.pi - theta)))
-        point3 = ogre.Vector3(c * math.cos(self.rotation + (math.pi + theta)), 0, c * math.sin(self.rotation + (math.pi + theta)))
-        point4 = ogre.Vector3(c * math.cos(self.rotation + (-theta)), 0, c * math.sin(self.rotation + (-theta)))        
-        
-        # calculate normals
-        mp1 = ogre.Vector3.midPoint(point1, point2)
-        mp2 = ogre.Vector3.midPoint(point2, point3)
-        mp3 = ogre.Vector3.midPoint(point3, point4)
-        mp4 = ogre.Vector3.midPoint(point4, point1)
-        
-        normalp1p2 = ogre.Vector3(mp1.x, 0, mp1.z).normalisedCopy()
-        normalp2p3 = ogre.Vector3(mp2.x, 0, mp2.z).normalisedCopy()
-        normalp3p4 = ogre.Vector3(mp3.x, 0, mp3.z).normalisedCopy()
-        normalp4p1 = ogre.Vector3(mp4.x, 0, mp4.z).normalisedCopy()
+        point1 = (c * math.cos(self.rotation + theta), c * math.sin(self.rotation + theta))
+        point2 = (c * math.cos(self.rotation + (math.pi - theta)), c * math.sin(self.rotation + (math.pi - theta)))
+        point3 = (c * math.cos(self.rotation + (math.pi + theta)), c * math.sin(self.rotation + (math.pi + theta)))
+        point4 = (c * math.cos(self.rotation + (-theta)), c * math.sin(self.rotation + (-theta)))
+
+        # calculate normals (the normalised midpoints of each side)
+        normalp1p2 = _normalise(((point1[0] + point2[0]) * 0.5, (point1[1] + point2[1]) * 0.5))
+        normalp2p3 = _normalise(((point2[0] + point3[0]) * 0.5, (point2[1] + point3[1]) * 0.5))
+        normalp3p4 = _normalise(((point3[0] + point4[0]) * 0.5, (point3[1] + point4[1]) * 0.5))
+        normalp4p1 = _normalise(((point4[0] + point1[0]) * 0.5, (point4[1] + point1[1]) * 0.5))
 
         # create component BoundingLineSegments that make up this BoundingRectangle
-        side1 = BoundingLineSegment((point1.x, point1.z), (point2.x, point2.z), (normalp1p2.x, normalp1p2.z))
-        side2 = BoundingLineSegment((point2.x, point2.z), (point3.x, point3.z), (normalp2p3.x, normalp2p3.z))
-        side3 = BoundingLineSegment((point3.x, point3.z), (point4.x, point4.z), (normalp3p4.x, normalp3p4.z))
-        side4 = BoundingLineSegment((point4.x, point4.z), (point1.x, point1.z), (normalp4p1.x, normalp4p1.z))
-        
-        
+        side1 = BoundingLineSegment(point1, point2, normalp1p2)
+        side2 = BoundingLineSegment(point2, point3, normalp2p3)
+        side3 = BoundingLineSegment(point3, point4, normalp3p4)
+        side4 = BoundingLineSegment(point4, point1, normalp4p1)
+
+
         # store the BoundingLineSegments
         self.sides = (side1, side2, side3, side4)
-        
+
         # store axis-aligned bounding box for collision optimization
         # @todo: for optimization for all shapes, we can have all boundingshapes store their axis-aligned bounding boxes
         # the advantage would be most collision checking (when there is no collision) would run MUCH MUCH faster
         # IMPLEMENT THIS AS AN OPTIMIZATION STEP ONLY IF NEEDED
-        xCoords = [point1.x, point2.x, point3.x, point4.x]
-        zCoords = [point1.z, point2.z, point3.z, point4.z]
+        xCoords = [point1[0], point2[0], point3[0], point4[0]]
+        zCoords = [point1[1], point2[1], point3[1], point4[1]]
         right = max(xCoords)
         left = min(xCoords)
         bottom = max(zCoords)
         top = min(zCoords)
-        
+
         self.setup_AABB(top, right, bottom, left)
+        self._freeze()
+
+    @classmethod
+    def get(cls, width, height, rotation):
+        """
+        Returns the interned rectangle with the given parameters (rotation
+        is in degrees), whose sides are only calculated once.
+        """
+        return cls._intern((width, height, rotation))
+
+class BoundingAnnulus(BoundingObject):
+    def __init__(self, inner_radius, outer_radius):
+        BoundingObject.__init__(self, "annulus")
+        self.inner_radius = inner_radius
+        self.outer_radius = outer_radius
+
+        self.setup_AABB(-outer_radius, outer_radius, outer_radius, -outer_radius)
+        self._freeze()
+
+    @classmethod
+    def get(cls, inner_radius, outer_radius):
+        """ Returns the interned annulus with the given parameters. """
+        return cls._intern((inner_radius, outer_radius))
 
 class BoundingCone(BoundingObject):
     def __init__(self, radius, orientation, width):
         BoundingObject.__init__(self, "cone")
         self.radius = radius
+        self.radius_squared = radius * radius
         self.orientation = orientation
         self.width = width
-        
+        # The range of angles (as returned by math.atan2) inside the cone.
+        self.min_angle = orientation - width/2
+        self.max_angle = orientation + width/2
+        # The unit vector the cone points along and the cosine and sine of
+        # half the cone's width.
+        self.direction = (math.cos(orientation), math.sin(orientation))
+        self.cos_half_width = math.cos(width/2)
+        self.sin_half_width = math.sin(width/2)
+
         self.setup_AABB(-radius, radius, radius, -radius)
+        self._freeze()
+
+    @classmethod
+    def get(cls, radius, orientation, width):
+        """ Returns the interned cone with the given parameters. """
+        return cls._intern((radius, orientation, width))
 
 
 class UnsupportedShapesException(Exception):
     def __init__(self, shape1, shape2):
         self.shape1 = shape1
         self.shape2 = shape2
-        
+
     def __str__(self):
         return "Collision between the following shapes is not supported: %s, %s" % \
             (self.shape1.type, self.shape2.type)
 
 
+def _normalise(vector):
+    """
+    Returns the given (x, z) vector scaled to unit length. Vectors too short to
+    be normalised are returned unchanged (like ogre.Vector3.normalise()).
+    """
+    length = math.sqrt(vector[0] * vector[0] + vector[1] * vector[1])
+    if length > 1e-08:
+        return (vector[0] / length, vector[1] / length)
+    return vector
+
+
 class CollisionDetector(object):
     SPACING = 0.1
+    # Whether the batch routines (check_circles, check_segments and
+    # resolve_circles) can be used.
+    BATCH_SUPPORTED = numpy is not None
 
     @staticmethod
     def check_aabb_collision(shape1, pos1, shape2, pos2):
@@ -135,10 +261,10 @@ class CollisionDetector(object):
         # no collision is possible
         if shape1.aabb_bottom + pos1[1] < shape2.aabb_top + pos2[1]:
             return False
-        
+
         # otherwise, return true
         return True
-        
+
 
     @staticmethod
     def is_between(shape, position, line):
@@ -149,30 +275,27 @@ class CollisionDetector(object):
         Raises an UnsupportedShapesException if the given shape type is not
         supported.
         """
-        
+
         # @todo: optimize this function so it no longer lags the game to death
         # for the meantime, the conditions this function protects against are so rare
         # they are not worth the performance hit
-        
-        
+
+
         # first check axis-aligned bounding box collision for speed increase
-        if CollisionDetector.check_aabb_collision(shape, position, line, (line.point1.x, line.point1.z)) is False:
+        if CollisionDetector.check_aabb_collision(shape, position, line, line.point1) is False:
             return False
-        
-        shape_position = ogre.Vector3(position[0], 0, position[1])
-        
+
         # If the line has lenght 0 it cannot possibly collide with anything.
-        if(line.vector.x == 0. and line.vector.y == 0.):
-            return False;
-        
+        if line.vector[0] == 0. and line.vector[1] == 0.:
+            return False
+
         if shape.type == "circle":
-            return CollisionDetector._check_circle_line(shape, shape_position, line, line.point1) is not False
+            return CollisionDetector._check_circle_line(shape, position, line, line.point1) is not False
         elif shape.type == "linesegment":
-            return CollisionDetector._check_line_line(shape, shape_position, line, line.point1) is not False
+            return CollisionDetector._check_line_line(shape, position, line, line.point1) is not False
         elif shape.type == "rectangle":
-            return CollisionDetector._check_line_rect(shape, shape_position, line, line.point1) is not False
-            return False
-            
+            return CollisionDetector._check_line_rect(shape, position, line, line.point1) is not False
+
         raise UnsupportedShapesException(shape, line)
 
     @staticmethod
@@ -183,15 +306,11 @@ class CollisionDetector(object):
         Raises an UnsupportedShapesException if collision detection between
         the given shapes is not supported.
         """
-        
+
         # first check axis-aligned bounding box collision for speed increase
         if CollisionDetector.check_aabb_collision(shape1,position1, shape2, position2) is False:
             return False
-        
-        # convert tuples to ogre.Vector3
-        position1 = ogre.Vector3(position1[0], 0, position1[1])
-        position2 = ogre.Vector3(position2[0], 0, position2[1])
-        
+
         if shape1.type == "circle" and shape2.type == "linesegment":
             return CollisionDetector._check_circle_line(shape1, position1, shape2, position2) is not False
         elif shape1.type == "circle" and shape2.type == "circle":
@@ -203,9 +322,13 @@ class CollisionDetector(object):
             return CollisionDetector._check_circle_rect(shape1, position1, shape2, position2) is not False
         elif shape1.type == "cone" and shape2.type == "circle":
             return CollisionDetector._check_cone_circle(shape1, position1, shape2, position2) is not False
+        elif shape1.type == "linesegment" and shape2.type == "circle":
+            return CollisionDetector._check_circle_line(shape2, position2, shape1, position1) is not False
+        elif shape1.type == "annulus" and shape2.type == "circle":
+            return CollisionDetector._check_annulus_circle(shape1, position1, shape2, position2)
 
         raise UnsupportedShapesException(shape1, shape2)
-            
+
     @staticmethod
     def check_collision_and_resolve(shape1, position1, old_position1, shape2, position2):
         """
@@ -214,25 +337,335 @@ class CollisionDetector(object):
         vector shape1 would have to move from position1 to no longer be
         overlapping with shape2 at position2.
         """
-        
+
         # first check axis-aligned bounding box collision for speed increase
         if CollisionDetector.check_aabb_collision(shape1,position1, shape2, position2) is False:
             return False
-        
-        # convert tuples to ogre.Vector3
-        position1 = ogre.Vector3(position1[0], 0, position1[1])
-        position2 = ogre.Vector3(position2[0], 0, position2[1])
-        old_position1 = ogre.Vector3(old_position1[0], 0, old_position1[1])
-        
+
         if shape1.type == "circle" and shape2.type == "linesegment":
             return CollisionDetector._resolve_circle_line(shape1, position1, old_position1, shape2, position2)
         elif shape1.type == "circle" and shape2.type == "circle":
             return CollisionDetector._resolve_circle_circle(shape1, position1, shape2, position2)
         elif shape1.type == "circle" and shape2.type == "rectangle":
             return CollisionDetector._resolve_circle_rectangle(shape1, position1, old_position1, shape2, position2)
-            
+
         raise UnsupportedShapesException(shape1, shape2)
 
+    @staticmethod
+    def sweep_circle(circle, start, move_vector, objects, ignored=[]):
+        """
+        Sweeps a circle from start along move_vector through the given objects
+        in a single pass. Returns a (blocking hit, crossed) tuple where the
+        blocking hit is a (time, object, normal) tuple for the first
+        impassable object the circle runs into (or None if the whole move is
+        clear) and crossed is a list of (time, object) tuples, ordered by
+        time, for every passable object the circle touches before that.
+
+        Times are fractions of move_vector (0 to 1) and the normal is the unit
+        vector pointing from the blocking object towards the circle at the
+        time of impact. Impassable objects the circle is already overlapping
+        only block the move if it is heading further into them, so that
+        objects are always free to move out of each other.
+
+        Arguments:
+        circle -- The BoundingCircle being moved.
+        start -- The (x, z) position the circle starts at.
+        move_vector -- The (x, z) vector the circle is moved by.
+        objects -- The game objects to sweep through (normally those returned
+            by World.get_nearby_objects()).
+        ignored -- Objects to leave out of the sweep.
+        """
+        if not objects:
+            return None, []
+        blocking_hit = None
+        crossed = []
+        # The axis-aligned bounding box of the whole sweep, used to quickly
+        # skip objects that are nowhere near it.
+        end = (start[0] + move_vector[0], start[1] + move_vector[1])
+        left = min(start[0], end[0]) - circle.radius
+        top = min(start[1], end[1]) - circle.radius
+        right = max(start[0], end[0]) + circle.radius
+        bottom = max(start[1], end[1]) + circle.radius
+        for object in objects:
+            shape = object.bounding_shape
+            if shape is None or object in ignored:
+                continue
+            position = object.position
+            x, z = position
+            if shape.aabb_left + x > right or shape.aabb_right + x < left or \
+                shape.aabb_top + z > bottom or shape.aabb_bottom + z < top:
+                continue
+            hit = CollisionDetector.get_time_of_impact(circle, start, move_vector,
+                                                       shape, position)
+            if hit is False:
+                continue
+            time, normal = hit
+            if object.isPassable:
+                crossed.append((time, object))
+                continue
+            if time == 0 and move_vector[0] * normal[0] + move_vector[1] * normal[1] >= 0:
+                # Already overlapping but moving out of the object.
+                continue
+            if blocking_hit is None or time < blocking_hit[0]:
+                blocking_hit = (time, object, normal)
+
+        if blocking_hit is not None:
+            crossed = [entry for entry in crossed if entry[0] <= blocking_hit[0]]
+        crossed.sort(key=lambda entry: entry[0])
+        return blocking_hit, crossed
+
+    @staticmethod
+    def get_time_of_impact(circle, start, move_vector, shape, position):
+        """
+        Returns the first time (as a fraction of move_vector from 0 to 1) at
+        which the circle moving from start along move_vector touches the given
+        shape at the given position, along with the unit normal pointing from
+        the shape towards the circle at that time, as a (time, normal) tuple.
+        Returns False if the circle does not touch the shape during the move.
+        A circle that is already touching the shape at start has a time of 0.
+
+        Circles are treated as solid (as check_collision does for a solid
+        circle against any circle) and line segments as having rounded ends.
+        Raises an UnsupportedShapesException for any other shapes.
+        """
+        if circle.type != "circle":
+            raise UnsupportedShapesException(circle, shape)
+        if shape.type == "circle":
+            return CollisionDetector._sweep_circle_point(
+                start, move_vector, position, circle.radius + shape.radius)
+        elif shape.type == "linesegment":
+            return CollisionDetector._sweep_circle_line(
+                circle.radius, start, move_vector, shape.vector, position)
+
+        raise UnsupportedShapesException(circle, shape)
+
+    @staticmethod
+    def _sweep_circle_point(start, move_vector, point, radius):
+        """
+        Returns the (time, normal) at which a point moving from start along
+        move_vector first comes within radius of the given point, or False if
+        it never does. (A circle of radius r1 swept against a circle of radius
+        r2 is the same as a point swept against a circle of radius r1 + r2.)
+        """
+        rx = start[0] - point[0]
+        rz = start[1] - point[1]
+        c = rx * rx + rz * rz - radius * radius
+        if c <= 0:
+            # Already touching.
+            if rx == 0 and rz == 0:
+                return 0, (1.0, 0.0)
+            return 0, _normalise((rx, rz))
+
+        vx, vz = move_vector
+        a = vx * vx + vz * vz
+        b = 2 * (rx * vx + rz * vz)
+        if a == 0 or b >= 0:
+            # Not moving, or moving away from the point.
+            return False
+        discrim = b * b - 4 * a * c
+        if discrim < 0:
+            return False
+        time = (-b - math.sqrt(discrim)) / (2 * a)
+        if time > 1:
+            return False
+        return time, _normalise((rx + vx * time, rz + vz * time))
+
+    @staticmethod
+    def _sweep_circle_line(radius, start, move_vector, vector, line_position):
+        """
+        Returns the (time, normal) at which a circle of the given radius moving
+        from start along move_vector first touches the line segment starting
+        at line_position with the given vector, or False if it never does.
+        This is a point swept against the segment's capsule (the segment grown
+        by radius on every side).
+        """
+        wx, wz = vector
+        length_squared = wx * wx + wz * wz
+        if length_squared == 0:
+            return CollisionDetector._sweep_circle_point(
+                start, move_vector, line_position, radius)
+
+        px = start[0] - line_position[0]
+        pz = start[1] - line_position[1]
+        vx, vz = move_vector
+
+        # Check if the circle already touches the segment.
+        u = (px * wx + pz * wz) / length_squared
+        u = min(max(u, 0.), 1.)
+        dx = px - u * wx
+        dz = pz - u * wz
+        if dx * dx + dz * dz <= radius * radius:
+            if dx == 0 and dz == 0:
+                # The center is on the segment so push back against the move.
+                normal = _normalise((-wz, wx))
+                if normal[0] * vx + normal[1] * vz > 0:
+                    normal = (-normal[0], -normal[1])
+                return 0, normal
+            return 0, _normalise((dx, dz))
+
+        # Check the sides of the capsule using the segment's normal on the
+        # side the circle starts on.
+        length = math.sqrt(length_squared)
+        nx = -wz / length
+        nz = wx / length
+        distance = px * nx + pz * nz
+        if distance < 0:
+            nx, nz, distance = -nx, -nz, -distance
+        approach = vx * nx + vz * nz
+        if approach < 0 and distance > radius:
+            time = (distance - radius) / -approach
+            if time <= 1:
+                hx = px + vx * time
+                hz = pz + vz * time
+                u = (hx * wx + hz * wz) / length_squared
+                if 0 <= u <= 1:
+                    return time, (nx, nz)
+
+        # Otherwise the circle can only hit one of the rounded ends.
+        hit1 = CollisionDetector._sweep_circle_point(
+            start, move_vector, line_position, radius)
+        hit2 = CollisionDetector._sweep_circle_point(
+            start, move_vector,
+            (line_position[0] + wx, line_position[1] + wz), radius)
+        if hit1 is False:
+            return hit2
+        if hit2 is False or hit1[0] <= hit2[0]:
+            return hit1
+        return hit2
+
+    @staticmethod
+    def check_circles(shape, position, centers, radii):
+        """
+        Tests one shape at the given position against many circles at once.
+        Returns a NumPy boolean array that is True for every circle the shape
+        collides with (giving the same results as check_collision would for
+        each circle).
+
+        Arguments:
+        shape -- The query shape (a circle, cone or line segment).
+        position -- The position of the query shape.
+        centers -- An (n, 2) array of the circles' (x, z) centers.
+        radii -- An (n,) array of the circles' radii.
+        """
+        centers = numpy.asarray(centers, dtype=float).reshape(-1, 2)
+        radii = numpy.asarray(radii, dtype=float)
+        dx = centers[:, 0] - position[0]
+        dz = centers[:, 1] - position[1]
+
+        if shape.type == "circle":
+            distance = numpy.sqrt(dx * dx + dz * dz)
+            hits = distance <= shape.radius + radii
+            if shape.is_hollow:
+                # Circles entirely inside the other circle don't collide.
+                larger = numpy.maximum(radii, shape.radius)
+                smaller = numpy.minimum(radii, shape.radius)
+                hits &= larger <= distance + smaller
+            return hits
+        elif shape.type == "cone":
+            distance = numpy.sqrt(dx * dx + dz * dz)
+            theta = numpy.arctan2(dz, dx)
+            return ((distance - radii) <= shape.radius) & \
+                (shape.min_angle < theta) & (theta < shape.max_angle)
+        elif shape.type == "linesegment":
+            return CollisionDetector._check_circles_line(
+                radii, centers, shape.vector, position)
+
+        raise UnsupportedShapesException(shape, BoundingObject("circle"))
+
+    @staticmethod
+    def check_segments(shape, position, points, vectors):
+        """
+        Tests one shape at the given position against many line segments at
+        once. Returns a NumPy boolean array that is True for every segment the
+        shape collides with.
+
+        Arguments:
+        shape -- The query shape (a circle or line segment).
+        position -- The position of the query shape.
+        points -- An (n, 2) array of the segments' first (x, z) endpoints.
+        vectors -- An (n, 2) array of the (x, z) vectors from each segment's
+            first endpoint to its second.
+        """
+        points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+        vectors = numpy.asarray(vectors, dtype=float).reshape(-1, 2)
+
+        if shape.type == "circle":
+            return CollisionDetector._check_circles_line(
+                shape.radius, position, (vectors[:, 0], vectors[:, 1]), points)
+        elif shape.type == "linesegment":
+            # Vectorized _check_line_line with the query segment as line1.
+            ax, az = shape.vector
+            bx = vectors[:, 0]
+            bz = vectors[:, 1]
+            offset_x = position[0] - points[:, 0]
+            offset_z = position[1] - points[:, 1]
+            denom = (bz * ax) - (bx * az)
+            parallel = denom == 0
+            denom = numpy.where(parallel, 1.0, denom)
+            ua = ((bx * offset_z) - (bz * offset_x)) / denom
+            ub = ((ax * offset_z) - (az * offset_x)) / denom
+            return ~parallel & (ua >= 0) & (ua <= 1) & (ub >= 0) & (ub <= 1)
+
+        raise UnsupportedShapesException(shape, BoundingObject("linesegment"))
+
+    @staticmethod
+    def resolve_circles(circle, position, centers, radii):
+        """
+        Vectorized _resolve_circle_circle of one circle against many circles.
+        Returns a (hits, rtvs) tuple where hits is a NumPy boolean array that is
+        True for every circle overlapping the given circle and rtvs is an
+        (n, 2) array of the RTV (the vector that must be applied to the given
+        circle to no longer overlap) for each circle. The RTVs of circles that
+        don't overlap are (0, 0).
+        """
+        centers = numpy.asarray(centers, dtype=float).reshape(-1, 2)
+        radii = numpy.asarray(radii, dtype=float)
+        dx = position[0] - centers[:, 0]
+        dz = position[1] - centers[:, 1]
+        distance = numpy.sqrt(dx * dx + dz * dz)
+        hits = distance <= circle.radius + radii
+
+        # Resolve along the x axis if the centers are on top of each other.
+        overlapping_centers = distance == 0
+        safe_distance = numpy.where(overlapping_centers, 1.0, distance)
+        direction_x = numpy.where(overlapping_centers, 1.0, dx / safe_distance)
+        direction_z = numpy.where(overlapping_centers, 0.0, dz / safe_distance)
+
+        move_distance = circle.radius + radii + CollisionDetector.SPACING
+        rtvs = numpy.empty((len(radii), 2))
+        rtvs[:, 0] = centers[:, 0] + move_distance * direction_x - position[0]
+        rtvs[:, 1] = centers[:, 1] + move_distance * direction_z - position[1]
+        rtvs[~hits] = 0
+        return hits, rtvs
+
+    @staticmethod
+    def _check_circles_line(radius, circle_position, vector, line_position):
+        """
+        Vectorized _check_circle_line. Any of the arguments may be arrays (of
+        matching lengths) so that either many circles can be tested against
+        one line or one circle against many lines. Zero length lines never
+        collide.
+        """
+        circle_position = numpy.asarray(circle_position, dtype=float)
+        line_position = numpy.asarray(line_position, dtype=float)
+        vx, vz = vector
+        local = line_position - circle_position
+        if local.ndim == 1:
+            local_x, local_z = local[0], local[1]
+        else:
+            local_x, local_z = local[:, 0], local[:, 1]
+
+        a = (vx * vx) + (vz * vz)
+        b = 2 * ((vx * local_x) + (vz * local_z))
+        c = (local_x * local_x) + (local_z * local_z) - (radius * radius)
+        discrim = b * b - 4 * a * c
+
+        # With one intersection point u is the intersection point and with two
+        # u is the average of both, which must fall between the endpoints.
+        safe_a = numpy.where(a == 0, 1.0, a)
+        u = -b / (2 * safe_a)
+        return (a != 0) & (discrim >= 0) & (u >= 0) & (u <= 1)
+
     @staticmethod
     def _check_circle_line(circle, circle_position, line, line_position):
         """
@@ -240,22 +673,18 @@ class CollisionDetector(object):
         Returns a tuple containing the 'u' values of intersection points if collision occurred, False if not.
         The resulting tuple can contain either 1 or 2 elements.
         """
-        
-        # get the absolute position of the line segment vertices
-        point1 = line_position
-        point2 = line_position + line.vector
 
-        # first transform the segment vertices to coordinates relative to the circle's center
-        localP1 = ogre.Vector3(point1.x - circle_position.x, 0, point1.z - circle_position.z)
-        localP2 = ogre.Vector3(point2.x - circle_position.x, 0, point2.z - circle_position.z)
+        # the segment's vector (point2 - point1)
+        vx, vz = line.vector
 
-        # pre-calculate p1-p2 for easy reference
-        p2Minusp1 = ogre.Vector3(point2.x - point1.x, 0, point2.z - point1.z) # same as segment.vector?
+        # transform the segment's first vertex to coordinates relative to the circle's center
+        local_x = line_position[0] - circle_position[0]
+        local_z = line_position[1] - circle_position[1]
 
         # get quadratic coefficients
-        a = (p2Minusp1.x * p2Minusp1.x) + (p2Minusp1.z * p2Minusp1.z)
-        b = 2 * ((p2Minusp1.x * localP1.x) + (p2Minusp1.z * localP1.z))
-        c = (localP1.x * localP1.x) + (localP1.z * localP1.z) - (circle.radius * circle.radius)
+        a = (vx * vx) + (vz * vz)
+        b = 2 * ((vx * local_x) + (vz * local_z))
+        c = (local_x * local_x) + (local_z * local_z) - (circle.radius * circle.radius)
 
         discrim = b * b - 4 * a * c
 
@@ -264,47 +693,42 @@ class CollisionDetector(object):
         elif discrim == 0: # perfect collision
             # u is the % of the distance from p1 to p2 the intersection point falls at
             u = -b / (2 * a)
-            collisionPoint = ogre.Vector3(point1.x + u * p2Minusp1.x, 0, point1.z + u * p2Minusp1.z)
             if u < 0 or u > 1:
-                return False   
+                return False
             else:
                 # now we're sure the collision is valid, so we'll return the collision point
                 return (u,)
-        elif discrim > 0: # collision with 2 intersection points
-            u1 = (-b + math.sqrt(discrim)) / (2 * a)
-            u2 = (-b - math.sqrt(discrim)) / (2 * a)
+        else: # collision with 2 intersection points
+            root = math.sqrt(discrim)
+            u1 = (-b + root) / (2 * a)
+            u2 = (-b - root) / (2 * a)
 
             # check to make sure the collision point falls between point1 and point2 on the line
             avg = (u1 + u2)/2
             if avg < 0 or avg > 1:
                 return False
-            
+
             # now we're sure the collision is valid, so we'll return the 2 collision points
             return (u1, u2)
-        
+
     @staticmethod
     def _is_circle_intersecting_line(circle, circle_position, line, line_position):
         """
-        Checks to see if a BoundingCircle collides with a BoundingLineSegment.
-        Returns a tuple containing the 'u' values of intersection points if collision occurred, False if not.
-        The resulting tuple can contain either 1 or 2 elements.
+        Checks to see if a BoundingCircle's edge intersects a BoundingLineSegment.
+        Returns True if it does, False if not.
         """
-        
-        # get the absolute position of the line segment vertices
-        point1 = line_position
-        point2 = line_position + line.vector
 
-        # first transform the segment vertices to coordinates relative to the circle's center
-        localP1 = ogre.Vector3(point1.x - circle_position.x, 0, point1.z - circle_position.z)
-        localP2 = ogre.Vector3(point2.x - circle_position.x, 0, point2.z - circle_position.z)
+        # the segment's vector (point2 - point1)
+        vx, vz = line.vector
 
-        # pre-calculate p1-p2 for easy reference
-        p2Minusp1 = ogre.Vector3(point2.x - point1.x, 0, point2.z - point1.z) # same as segment.vector?
+        # transform the segment's first vertex to coordinates relative to the circle's center
+        local_x = line_position[0] - circle_position[0]
+        local_z = line_position[1] - circle_position[1]
 
         # get quadratic coefficients
-        a = (p2Minusp1.x * p2Minusp1.x) + (p2Minusp1.z * p2Minusp1.z)
-        b = 2 * ((p2Minusp1.x * localP1.x) + (p2Minusp1.z * localP1.z))
-        c = (localP1.x * localP1.x) + (localP1.z * localP1.z) - (circle.radius * circle.radius)
+        a = (vx * vx) + (vz * vz)
+        b = 2 * ((vx * local_x) + (vz * local_z))
+        c = (local_x * local_x) + (local_z * local_z) - (circle.radius * circle.radius)
 
         discrim = b * b - 4 * a * c
 
@@ -313,15 +737,15 @@ class CollisionDetector(object):
         elif discrim == 0: # perfect collision
             # u is the % of the distance from p1 to p2 the intersection point falls at
             u = -b / (2 * a)
-            collisionPoint = ogre.Vector3(point1.x + u * p2Minusp1.x, 0, point1.z + u * p2Minusp1.z)
             if u < 0 or u > 1:
-                return False   
+                return False
             else:
                 # now we're sure the collision is valid, so we'll return True
                 return True,
-        elif discrim > 0: # collision with 2 intersection points
-            u1 = (-b + math.sqrt(discrim)) / (2 * a)
-            u2 = (-b - math.sqrt(discrim)) / (2 * a)
+        else: # collision with 2 intersection points
+            root = math.sqrt(discrim)
+            u1 = (-b + root) / (2 * a)
+            u2 = (-b - root) / (2 * a)
 
             if u1 > 0 and u1 < 1:
                 return True
@@ -336,62 +760,71 @@ class CollisionDetector(object):
         centered about circle2_position. If there is no overlap, False is returned. If
         there is an overlap, True is returned.
         """
-        
+
         # Calculate the distance between the center points of the two circles.
         distance = CollisionDetector._get_xz_distance(circle1_position, circle2_position)
-        
+
         if distance > circle1.radius + circle2.radius:
             # If the distance is greater than the sum of the two circles' radii
             # then the circles are not overlapping and there is no collision.
             return False
         else:
             return True
-        
+
     @staticmethod
     def _check_circle_circle_hollow(circle1, circle1_position, circle2, circle2_position):
         """
         NOTE: The difference between hollow collision and non-hollow collision is this will
         ONLY return true if there are actual point(s) of intersection. This method will
         return false if one circle is inside the other and not intersecting.
-        
+
         Checks if circle1 centered about circle1_position is overlapping with circle2
         centered about circle2_position. If there is no overlap, False is returned. If
         there is an overlap, True is returned.
         """
         # if one circle is inside the other, then return False
         if circle1.radius > circle2.radius:
-            larger_circle = circle1
-            larger_circle_position = circle1_position
-            smaller_circle = circle2
-            smaller_circle_position = circle2_position
+            larger_radius = circle1.radius
+            smaller_radius = circle2.radius
         else:
-            larger_circle = circle2
-            larger_circle_position = circle2_position
-            smaller_circle = circle1
-            smaller_circle_position = circle1_position
-            
+            larger_radius = circle2.radius
+            smaller_radius = circle1.radius
+
         distance = CollisionDetector._get_xz_distance(circle1_position, circle2_position)
-        
-        if larger_circle.radius > distance + smaller_circle.radius:
+
+        if larger_radius > distance + smaller_radius:
             return False
-        
+
         if distance > circle1.radius + circle2.radius:
             # If the distance is greater than the sum of the two circles' radii
             # then the circles are not overlapping and there is no collision.
             return False
         else:
             return True
-        
+
+    @staticmethod
+    def _check_annulus_circle(annulus, annulus_position, circle, circle_position):
+        """
+        Checks if the ring of the annulus centered about annulus_position is
+        overlapping with the circle centered about circle_position. Returns
+        True if it is, False if not (including when the circle is entirely
+        inside the annulus' hole).
+        """
+        distance = CollisionDetector._get_xz_distance(annulus_position, circle_position)
+        return distance - circle.radius <= annulus.outer_radius and \
+            distance + circle.radius >= annulus.inner_radius
+
     @staticmethod
     def _check_circle_rect(circle, circle_position, rect, rect_position):
         """
         Checks collision between a circle and a rectangle. If a collision exists, it will return True.
         If a collision does not exist, it returns False.
         """
-        # determine if circle is in voroni region or not, and if it is, determine which segment's voroni 
-        segments = []       
+        # determine if circle is in voroni region or not, and if it is, determine which segment's voroni
+        segments = []
         for side in rect.sides:
-            axis_pos = CollisionDetector._get_position_on_axis(circle_position, side.normal, side.point1 + rect_position)
+            side_position = (side.point1[0] + rect_position[0], side.point1[1] + rect_position[1])
+            axis_pos = CollisionDetector._get_position_on_axis(circle_position, side.normal, side_position)
             if axis_pos >= 0:
                 segments.append(side)
         if len(segments) == 0:
@@ -399,32 +832,18 @@ class CollisionDetector(object):
         # if in voroni region...
         elif len(segments) == 1:
             # check for voroni region collision
-            distance_to_edge = CollisionDetector._get_position_on_axis(circle_position, segments[0].normal, segments[0].point1 + rect_position)
+            side = segments[0]
+            side_position = (side.point1[0] + rect_position[0], side.point1[1] + rect_position[1])
+            distance_to_edge = CollisionDetector._get_position_on_axis(circle_position, side.normal, side_position)
             if distance_to_edge <= circle.radius:
                 return True
             else:
                 return False
         # else if not in voroni region, check for non-voroni region collision
         elif len(segments) == 2:
-            # get the axis
-            axis = circle_position - rect_position
-            axis.normalise()
-            
-            # get the corner closest to the circle
-            point1 = segments[0].point1 + rect_position
-            point2 = segments[0].point1 + segments[0].vector + rect_position
-            
-            dp1 = CollisionDetector._get_position_on_axis(point1, axis, rect_position)
-            dp2 = CollisionDetector._get_position_on_axis(point2, axis, rect_position)
-            
-            if dp1 > dp2:
-                corner = point1
-            else:
-                corner = point2
-                
-            
+            corner = CollisionDetector._get_closest_corner(segments[0], circle_position, rect_position)
             distance = CollisionDetector._get_xz_distance(circle_position, corner)
-            
+
             # check for collision
             circle_edge_pos = distance - circle.radius
             if circle_edge_pos <= 0:
@@ -432,8 +851,8 @@ class CollisionDetector(object):
                 return True
             else:
                 return False
-        
-        return False  
+
+        return False
 
     @staticmethod
     def _check_cone_circle(cone, cone_position, circle, circle_position):
@@ -443,49 +862,45 @@ class CollisionDetector(object):
         """
         # first check to see if there is a circle collision
         distance = CollisionDetector._get_xz_distance(cone_position, circle_position)
-        
+
         # if it's too far away to collide than we can return before doing any other calculations
         if (distance - circle.radius ) > cone.radius:
             return False
-        
+
         # now we need to check angles... first get the angle from conePos to pointToCheck
-        theta = math.atan2(circle_position.z - cone_position.z, circle_position.x - cone_position.x)
-        
-        # get the max and min values of theta in order for a collision to occur
-        min = cone.orientation - cone.width/2
-        max = cone.orientation + cone.width/2
-        
-        # check to see if theta is in that range
-        if min < theta and theta < max:
+        theta = math.atan2(circle_position[1] - cone_position[1], circle_position[0] - cone_position[0])
+
+        # check to see if theta is in the cone's range of angles
+        if cone.min_angle < theta and theta < cone.max_angle:
             # if so, collision
             return True
         else:
             # otherwise, no collision
             return False
-        
+
     @staticmethod
     def _check_line_line(line1, line1_position, line2, line2_position):
         """
         Checks to see if the BoundingLineSegments line1 and line2 collide.
         Returns True on collision, False on no collision.
         """
-        # a1 and a2 are the endpoints of line1
-        a1 = line1_position
-        a2 = line1_position + line1.vector
+        # a1 is the first endpoint of line1 and (ax, az) is the vector to its second
+        a1x, a1z = line1_position
+        ax, az = line1.vector
 
-        # b1 and b2 are the endpoints of line2
-        b1 = line2_position
-        b2 = line2_position + line2.vector
+        # b1 is the first endpoint of line2 and (bx, bz) is the vector to its second
+        b1x, b1z = line2_position
+        bx, bz = line2.vector
 
         # calculate denominator
-        denom = ((b2.z - b1.z) * (a2.x - a1.x)) - ((b2.x - b1.x) * (a2.z - a1.z))
+        denom = (bz * ax) - (bx * az)
 
         if denom == 0: # the segments are parallel
             return False # no collision
         else:
             # otherwise we have to solve for the intersection points
-            ua = (((b2.x - b1.x) * (a1.z - b1.z)) - ((b2.z - b1.z) * (a1.x - b1.x))) / denom
-            ub = (((a2.x - a1.x) * (a1.z - b1.z)) - ((a2.z - a1.z) * (a1.x - b1.x))) / denom
+            ua = ((bx * (a1z - b1z)) - (bz * (a1x - b1x))) / denom
+            ub = ((ax * (a1z - b1z)) - (az * (a1x - b1x))) / denom
 
             # ua and ub represent the % along the corresponding segment the intersection happens
             # if ua or ub is less than 0 (0%) or greater than 1 (100%) then segments did not collide, return False
@@ -493,161 +908,189 @@ class CollisionDetector(object):
                 return False
             else:
                 return True
-        
+
     @staticmethod
     def _check_line_rect(line, line_position, rect, rect_position):
         """
         Determines whether or not a line segment intersects a rectangle.
         Returns True for collision, False for no collision.
-        """ 
+        """
         # call check_line_line() on each side of rect
         for side in rect.sides:
-            res = CollisionDetector._check_line_line(line, line_position, side, side.point1 + rect_position)
+            side_position = (side.point1[0] + rect_position[0], side.point1[1] + rect_position[1])
+            res = CollisionDetector._check_line_line(line, line_position, side, side_position)
             if res == True:
                 return True
         return False
-    
+
     @staticmethod
     def _resolve_circle_line(circle, circle_position_new, circle_position_old, line, line_position):
         """
         Returns the Resolution Translation Vector (RTV) that must be applied to the object that owns
         circle in order to resolve the collision, or False if no collision occurred.
         """
-        
-        # find the distance to the edge from the circle's new position 
+
+        # find the distance to the edge from the circle's new position
         new_distance_to_edge = CollisionDetector._get_position_on_axis(circle_position_new, line.normal, line.point1)
-        
+
         # if we are positive and farther away than radius, then no collision occurred for sure
         if new_distance_to_edge > circle.radius or new_distance_to_edge < 0:
             return False
         # otherwise
         else:
             # determine if a collision occurred in the voroni region
-            segment_vector = line.point2 - line.point1
+            segment_vector = line.vector
             segment_vector_length = CollisionDetector._get_position_on_axis(line.point2, segment_vector, line.point1)
             segment_axis_pos = CollisionDetector._get_position_on_axis(circle_position_new, segment_vector, line.point1)
-            
+
             # if we are in a voroni region
             if segment_axis_pos > 0 and segment_axis_pos < segment_vector_length:
                 # a collision must have occurred in this voroni region since we already know
                 # that new_distance_to_edge <= circle.radius
-                
+
                 #calcualte rtv
                 rtv_magnitude = circle.radius - new_distance_to_edge + CollisionDetector.SPACING
-                rtv = rtv_magnitude * line.normal
-                return (rtv.x, rtv.z)
+                return (rtv_magnitude * line.normal[0], rtv_magnitude * line.normal[1])
             # if we are not in a voroni region, we have to check to see if a collision occurred with either corner
             else:
                 p1_axis_pos = 0
-                p2_axis_pos = CollisionDetector._get_position_on_axis(line.point2, segment_vector, line.point1)
-                
+                p2_axis_pos = segment_vector_length
+
                 dp1 = p1_axis_pos - segment_axis_pos
                 dp2 = p2_axis_pos - segment_axis_pos
-                
+
                 if dp1 < -circle.radius:
                     return False
                 if dp2 > p2_axis_pos + circle.radius:
                     return False
-                
+
                 if dp1 < dp2:
                     corner = line.point1
                 else:
                     corner = line.point2
-                
-                rtv_axis = circle_position_new - corner
-                distance_to_corner = CollisionDetector._get_position_on_axis(circle_position_new, rtv_axis, corner)
-                circle_edge_pos = distance_to_corner - circle.radius
-                
-                if circle_edge_pos <=0:
-                    # corner collision occurred
-                    rtv_axis.normalise()
-                    rtv_magnitude = -circle_edge_pos
-                    rtv_magnitude += CollisionDetector.SPACING
-                    rtv = rtv_axis * rtv_magnitude
-                    # return rtv as tuple
-                    return (rtv.x, rtv.z)
+
+                return CollisionDetector._resolve_circle_corner(circle, circle_position_new, corner)
         return False
-                 
-    
+
+
     @staticmethod
     def _resolve_circle_circle(circle1, circle1_position, circle2, circle2_position):
         """
         Returns the Resolution Translation Vector (RTV) that must be applied to the object that owns
         circle1 in order to resolve the collision, or False if no collision occurred.
         """
-        # data is the RTV tuple or False
-        data = CollisionDetector._check_circle_circle(circle1, circle1_position, circle2, circle2_position)
-        
-        # no collision occurred if data is False
-        if data is False:
-            return False      
-        # if there was a collision, return the RTV tuple
+        # Calculate the x and z differences between circle1 and circle2.
+        dx = circle1_position[0] - circle2_position[0]
+        dz = circle1_position[1] - circle2_position[1]
+        distance = math.sqrt(dx*dx + dz*dz)
+
+        if distance > circle1.radius + circle2.radius:
+            # If the distance is greater than the sum of the two circles' radii
+            # then the circles are not overlapping and there is no collision.
+            return False
+
+        # Otherwise the circles are overlapping and we have collision and we
+        # must calculate the resolution vector (how much to backtrack to not be
+        # in collision).
+
+        # Calculate how far away we need to move the center of circle1 from the
+        # center of circle2 overlapping with anymore.
+        move_distance = circle1.radius + circle2.radius + CollisionDetector.SPACING
+
+        # Calculate the direction from circle2 to circle1. If the centers are
+        # on top of each other, resolve along the x axis.
+        if distance > 0:
+            direction_x = dx / distance
+            direction_z = dz / distance
         else:
-            # Otherwise the circles are overlapping and we have collision and we
-            # must calculate the resolution vector (how much to backtrack to not be
-            # in collision).
-          
-            # Calculate the x and z differences between circle1 and circle2.
-            dx = circle1_position.x - circle2_position.x
-            dz = circle1_position.z - circle2_position.z
-            
-            # Calculate circle2's angle relative to circle1.
-            theta = math.atan2(-dz, dx)
-            
-            # Calculate how far away we need to move the center of circle1 from the
-            # center of circle2 overlapping with anymore.
-            move_distance = circle1.radius + circle2.radius + CollisionDetector.SPACING
-            
-            # Calculate the point (absolute map coordinates) where we need to be
-            # to not be overlapping.
-            resolutionPoint = ogre.Vector3(circle2_position.x + move_distance * math.cos(theta),
-                                           0,
-                                           circle2_position.z + move_distance * -math.sin(theta))
-            
-            # Calculate the backtrack vector required used to move from our current
-            # position to get to our resolution point (where we are no longer
-            # overlapping).
-            rtv = (resolutionPoint.x - circle1_position.x, resolutionPoint.z - circle1_position.z)
-            
-            # return our value
-            return rtv
-    
+            direction_x, direction_z = 1.0, 0.0
+
+        # Calculate the backtrack vector required used to move from our current
+        # position to the point (absolute map coordinates) where we are no
+        # longer overlapping.
+        return (circle2_position[0] + move_distance * direction_x - circle1_position[0],
+                circle2_position[1] + move_distance * direction_z - circle1_position[1])
+
+    @staticmethod
+    def _resolve_circle_corner(circle, circle_position, corner):
+        """
+        Returns the RTV that moves the circle centered at circle_position
+        away from the given corner point so it is no longer overlapping, or
+        False if the corner is not inside the circle.
+        """
+        rtv_x = circle_position[0] - corner[0]
+        rtv_z = circle_position[1] - corner[1]
+        distance_to_corner = math.sqrt(rtv_x * rtv_x + rtv_z * rtv_z)
+        circle_edge_pos = distance_to_corner - circle.radius
+
+        if circle_edge_pos <= 0:
+            # corner collision occurred
+            if distance_to_corner > 1e-08:
+                rtv_x /= distance_to_corner
+                rtv_z /= distance_to_corner
+            rtv_magnitude = -circle_edge_pos + CollisionDetector.SPACING
+            return (rtv_x * rtv_magnitude, rtv_z * rtv_magnitude)
+        return False
+
+    @staticmethod
+    def _get_closest_corner(side, circle_position, rect_position):
+        """
+        Returns the endpoint of the given rectangle side (at rect_position)
+        that is closest to the circle along the axis from the rectangle's
+        center to the circle's center.
+        """
+        # get the axis
+        axis = (circle_position[0] - rect_position[0], circle_position[1] - rect_position[1])
+
+        # get the corner closest to the circle
+        point1 = (side.point1[0] + rect_position[0], side.point1[1] + rect_position[1])
+        point2 = (point1[0] + side.vector[0], point1[1] + side.vector[1])
+
+        dp1 = CollisionDetector._get_position_on_axis(point1, axis, rect_position)
+        dp2 = CollisionDetector._get_position_on_axis(point2, axis, rect_position)
+
+        if dp1 > dp2:
+            return point1
+        else:
+            return point2
+
     @staticmethod
     def _get_position_on_axis(point, axis_vector, axis_vector_pos):
         """
         returns the scalar position of "point" along the axis specified by
         axis_vector originating from position axis_vector_pos
-        
+
         the axis_vector does not need to be normalised before passing it to
         this function
         """
-        axis_vector.normalise()
-        point_vector = point - axis_vector_pos
-        return point_vector.dotProduct(axis_vector)
-    
+        ax, az = _normalise(axis_vector)
+        return (point[0] - axis_vector_pos[0]) * ax + (point[1] - axis_vector_pos[1]) * az
+
     @staticmethod
     def _is_between_on_axis(point_to_check, endpoint_1, endpoint_2, axis_vector):
         """
         determines whether point_to_check lies between endpoint_1 and endpoint_2
         on an arbitrary axis defined by axis_vector
         """
-        res_dp = _get_position_on_axis(point_to_check, axis_vector)
-        res_ep1 = _get_position_on_axis(endpoint_1, axis_vector)
-        res_ep2 = _get_position_on_axis(endpoint_2, axis_vector)
-        
+        origin = (0, 0)
+        res_dp = CollisionDetector._get_position_on_axis(point_to_check, axis_vector, origin)
+        res_ep1 = CollisionDetector._get_position_on_axis(endpoint_1, axis_vector, origin)
+        res_ep2 = CollisionDetector._get_position_on_axis(endpoint_2, axis_vector, origin)
+
         return (res_dp > res_ep1 and res_dp < res_ep2) or (res_dp < res_ep1 and res_dp > res_ep2)
-        
-        
+
+
     @staticmethod
     def _resolve_circle_rectangle(circle, circle_position_new, circle_position_old, rect, rect_position):
         """
         Checks collision between a circle and a rectangle. If a collision exists, it will return the
         correction vector for the circle. If a collision does not exist, it returns False.
         """
-        # determine if circle is in voroni region or not, and if it is, determine which segment's voroni 
-        segments = []       
+        # determine if circle is in voroni region or not, and if it is, determine which segment's voroni
+        segments = []
         for side in rect.sides:
-            axis_pos = CollisionDetector._get_position_on_axis(circle_position_old, side.normal, side.point1 + rect_position)
+            side_position = (side.point1[0] + rect_position[0], side.point1[1] + rect_position[1])
+            axis_pos = CollisionDetector._get_position_on_axis(circle_position_old, side.normal, side_position)
             if axis_pos >= 0:
                 segments.append(side)
         if len(segments) == 0:
@@ -655,64 +1098,30 @@ class CollisionDetector(object):
         # if in voroni region...
         elif len(segments) == 1:
             # calculate the rtv for this voroni region
-            distance_to_edge = CollisionDetector._get_position_on_axis(circle_position_new, segments[0].normal, segments[0].point1 + rect_position)
+            side = segments[0]
+            side_position = (side.point1[0] + rect_position[0], side.point1[1] + rect_position[1])
+            distance_to_edge = CollisionDetector._get_position_on_axis(circle_position_new, side.normal, side_position)
             if distance_to_edge < circle.radius:
                 # return the rtv
-                rtv_magnitude = circle.radius - distance_to_edge
-                rtv = segments[0].normal * (math.fabs(rtv_magnitude) + CollisionDetector.SPACING)
-                res = circle_position_new + rtv            
-                return  (rtv.x, rtv.z)
-            
+                rtv_magnitude = math.fabs(circle.radius - distance_to_edge) + CollisionDetector.SPACING
+                return (side.normal[0] * rtv_magnitude, side.normal[1] * rtv_magnitude)
+
         # else if not in voroni region...
         elif len(segments) == 2:
-            # get the axis
-            axis = circle_position_new - rect_position
-            axis.normalise()
-            
-            # get the corner closest to the circle
-            point1 = segments[0].point1 + rect_position
-            point2 = segments[0].point1 + segments[0].vector + rect_position
-            
-            dp1 = CollisionDetector._get_position_on_axis(point1, axis, rect_position)
-            dp2 = CollisionDetector._get_position_on_axis(point2, axis, rect_position)
-            
-            if dp1 > dp2:
-                corner = point1
-            else:
-                corner = point2
-                
-            
-            distance = CollisionDetector._get_xz_distance(circle_position_new, corner)
-            
-            # check for collision
-            circle_edge_pos = distance - circle.radius
-            if circle_edge_pos <= 0:
-                # collision occurred
-                
-                # calculate rtv
-                rtv_axis = circle_position_new - corner
-                rtv_axis.normalise()
-                rtv_magnitude = -circle_edge_pos
-                rtv_magnitude += CollisionDetector.SPACING
-                rtv = rtv_axis * rtv_magnitude
-                # return rtv as tuple
-                return (rtv.x, rtv.z)
-            else:
-                return False
-        
-        return False  
+            corner = CollisionDetector._get_closest_corner(segments[0], circle_position_new, rect_position)
+            return CollisionDetector._resolve_circle_corner(circle, circle_position_new, corner)
+
+        return False
 
     @staticmethod
     def _get_xz_distance(point1, point2):
         """
-        Returns the distance between two ogre.Vector3 objects.
+        Returns the distance between two (x, z) points.
         """
-        dx = point2.x - point1.x
-        dz = point2.z - point1.z
+        dx = point2[0] - point1[0]
+        dz = point2[1] - point1[1]
         return math.sqrt(dx*dx + dz*dz)
-    
+
     @staticmethod
     def normalise_vector(tuple_vector):
-        vector = ogre.Vector3(tuple_vector[0], 0, tuple_vector[1])
-        vector.normalise()
-        return (vector.x, vector.z)
\ No newline at end of file
+        return _normalise(tuple_vector)
@@ -0,0 +1,330 @@
+"""
+The distancefield module contains the DistanceField, a precomputed grid of
+the distance from points in the level to the nearest static obstacle (level
+walls and volcanos), which lets MobileObjects check how far they are from the
+level's geometry with a single lookup.
+"""
+
+from __future__ import division
+import math
+import os
+import hashlib
+import cPickle as pickle
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is optional. Without it the field is built one sample at a time,
+    # which is slow but only has to be done once (the field is cached).
+    numpy = None
+
+# The directory built distance fields are cached in: the cache directory in
+# the game's directory, whatever the working directory is.
+CACHE_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache")
+
+# The default spacing of a field's samples. This must be less than the
+# radius of the smallest moving object for the field to be accurate around
+# line segments.
+CELL_SIZE = 4
+
+# Increase this whenever the way fields are built or stored changes so that
+# old cached fields are not used.
+FORMAT_VERSION = 1
+
+
+def get_cache_key(bounds_filepath, obstacles):
+    """
+    Returns the key a distance field is cached under: a hash of the level's
+    bounds file and the given list of obstacles.
+
+    Arguments:
+    bounds_filepath -- The path of the level's .bounds file.
+    obstacles -- A list of (position, radius) tuples of the level's circular
+        static obstacles.
+    """
+    key = hashlib.sha1()
+    bounds_file = open(bounds_filepath, "rb")
+    try:
+        key.update(bounds_file.read())
+    finally:
+        bounds_file.close()
+    key.update(repr([((float(position[0]), float(position[1])), float(radius))
+                     for position, radius in obstacles]))
+    key.update(repr((float(CELL_SIZE), FORMAT_VERSION)))
+    return key.hexdigest()
+
+
+class DistanceField(object):
+    """
+    A 2D signed distance field over the level's static obstacles. The field
+    stores, at points spaced cell_size apart on a grid covering the level,
+    the distance to the closest obstacle surface (negative inside a circular
+    obstacle; line segments have no inside) along with the unit gradient of
+    the distance (the direction pointing directly away from that obstacle).
+    Values between the samples are bilinearly interpolated.
+
+    Interpolated distances are never more than max_error larger than the
+    true distance, so a point whose sampled distance is d is at least
+    d - max_error away from every obstacle.
+    """
+    def __init__(self, left, top, columns, rows, cell_size, distances,
+                 gradients_x, gradients_z):
+        self.left = left
+        self.top = top
+        self.columns = columns
+        self.rows = rows
+        self.cell_size = cell_size
+        self.max_error = cell_size * math.sqrt(2)
+        # Samples are stored row by row (z major) in flat arrays.
+        self._distances = distances
+        self._gradients_x = gradients_x
+        self._gradients_z = gradients_z
+
+    @staticmethod
+    def build(objects, cell_size=CELL_SIZE, padding=64):
+        """
+        Builds the distance field for the given static objects. Only objects
+        with circle or line segment bounding shapes are included.
+
+        Arguments:
+        objects -- The static objects to build the field from.
+        cell_size -- The spacing of the field's samples.
+        padding -- How far past the objects' bounding boxes the field extends.
+        """
+        segments = []
+        circles = []
+        for object in objects:
+            shape = object.bounding_shape
+            if shape is None:
+                continue
+            if shape.type == "linesegment":
+                segments.append((object.position, shape.vector))
+            elif shape.type == "circle":
+                circles.append((object.position, shape.radius))
+
+        if len(segments) + len(circles) == 0:
+            return None
+
+        aabbs = [object.bounding_shape.get_AABB(object.position)
+                 for object in objects if object.bounding_shape is not None]
+        left = min(aabb[0] for aabb in aabbs) - padding
+        top = min(aabb[1] for aabb in aabbs) - padding
+        right = max(aabb[2] for aabb in aabbs) + padding
+        bottom = max(aabb[3] for aabb in aabbs) + padding
+        columns = int(math.ceil((right - left) / cell_size)) + 1
+        rows = int(math.ceil((bottom - top) / cell_size)) + 1
+
+        if numpy is not None:
+            fields = DistanceField._compute_numpy(left, top, columns, rows,
+                                                  cell_size, segments, circles)
+        else:
+            fields = DistanceField._compute(left, top, columns, rows,
+                                            cell_size, segments, circles)
+        return DistanceField(left, top, columns, rows, cell_size, *fields)
+
+    @staticmethod
+    def _compute(left, top, columns, rows, cell_size, segments, circles):
+        """
+        Returns the (distances, gradients x, gradients z) arrays of the field
+        samples, computed one sample at a time.
+        """
+        distances = array("d")
+        gradients_x = array("d")
+        gradients_z = array("d")
+        for row in xrange(rows):
+            z = top + row * cell_size
+            for column in xrange(columns):
+                x = left + column * cell_size
+                best = None
+                for (px, pz), (vx, vz) in segments:
+                    # Find the closest point on the segment.
+                    length_squared = vx * vx + vz * vz
+                    u = 0
+                    if length_squared > 0:
+                        u = ((x - px) * vx + (z - pz) * vz) / length_squared
+                        u = min(max(u, 0), 1)
+                    dx = x - (px + u * vx)
+                    dz = z - (pz + u * vz)
+                    distance = math.sqrt(dx * dx + dz * dz)
+                    if best is None or distance < best[0]:
+                        if distance > 0:
+                            best = (distance, dx / distance, dz / distance)
+                        else:
+                            best = (distance,) + _get_segment_normal(vx, vz)
+                for (cx, cz), radius in circles:
+                    dx = x - cx
+                    dz = z - cz
+                    center_distance = math.sqrt(dx * dx + dz * dz)
+                    distance = center_distance - radius
+                    if best is None or distance < best[0]:
+                        if center_distance > 0:
+                            best = (distance, dx / center_distance, dz / center_distance)
+                        else:
+                            best = (distance, 1.0, 0.0)
+                distances.append(best[0])
+                gradients_x.append(best[1])
+                gradients_z.append(best[2])
+        return distances, gradients_x, gradients_z
+
+    @staticmethod
+    def _compute_numpy(left, top, columns, rows, cell_size, segments, circles):
+        """
+        Returns the (distances, gradients x, gradients z) arrays of the field
+        samples, computed for all samples at once with NumPy.
+        """
+        x = left + numpy.arange(columns) * cell_size
+        z = top + numpy.arange(rows) * cell_size
+        x, z = numpy.meshgrid(x, z)
+        x = x.ravel()
+        z = z.ravel()
+        distances = numpy.empty(x.shape)
+        distances.fill(numpy.inf)
+        gradients_x = numpy.zeros(x.shape)
+        gradients_z = numpy.zeros(x.shape)
+
+        def update(distance, dx, dz, default_gradient):
+            closer = distance < distances
+            norm = numpy.sqrt(dx * dx + dz * dz)
+            on_feature = norm == 0
+            safe_norm = numpy.where(on_feature, 1.0, norm)
+            distances[closer] = distance[closer]
+            gradients_x[closer] = numpy.where(on_feature, default_gradient[0],
+                                              dx / safe_norm)[closer]
+            gradients_z[closer] = numpy.where(on_feature, default_gradient[1],
+                                              dz / safe_norm)[closer]
+
+        for (px, pz), (vx, vz) in segments:
+            length_squared = vx * vx + vz * vz
+            if length_squared > 0:
+                u = numpy.clip(((x - px) * vx + (z - pz) * vz) / length_squared, 0, 1)
+            else:
+                u = numpy.zeros(x.shape)
+            dx = x - (px + u * vx)
+            dz = z - (pz + u * vz)
+            update(numpy.sqrt(dx * dx + dz * dz), dx, dz,
+                   _get_segment_normal(vx, vz))
+        for (cx, cz), radius in circles:
+            dx = x - cx
+            dz = z - cz
+            update(numpy.sqrt(dx * dx + dz * dz) - radius, dx, dz, (1.0, 0.0))
+
+        return (array("d", distances.tolist()), array("d", gradients_x.tolist()),
+                array("d", gradients_z.tolist()))
+
+    @staticmethod
+    def load(filepath):
+        """
+        Loads a distance field saved with save(). Returns None if the file
+        does not exist or is not a saved distance field.
+        """
+        if not os.path.exists(filepath):
+            return None
+        field_file = open(filepath, "rb")
+        try:
+            try:
+                header = pickle.load(field_file)
+                if header.get("version") != FORMAT_VERSION:
+                    return None
+                count = header["columns"] * header["rows"]
+                fields = []
+                for i in range(3):
+                    values = array("d")
+                    values.fromfile(field_file, count)
+                    fields.append(values)
+            except (pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+                return None
+        finally:
+            field_file.close()
+        return DistanceField(header["left"], header["top"], header["columns"],
+                             header["rows"], header["cell_size"], *fields)
+
+    def save(self, filepath):
+        """ Saves the distance field to the given file. """
+        header = { "version": FORMAT_VERSION,
+                   "left": self.left,
+                   "top": self.top,
+                   "columns": self.columns,
+                   "rows": self.rows,
+                   "cell_size": self.cell_size }
+        field_file = open(filepath, "wb")
+        try:
+            pickle.dump(header, field_file, pickle.HIGHEST_PROTOCOL)
+            self._distances.tofile(field_file)
+            self._gradients_x.tofile(field_file)
+            self._gradients_z.tofile(field_file)
+        finally:
+            field_file.close()
+
+    @staticmethod
+    def load_or_build(objects, key):
+        """
+        Returns the distance field cached under the given key (see
+        get_cache_key()), or builds the field for the given static objects
+        and caches it under the key if it has not been cached yet.
+        """
+        filepath = os.path.join(CACHE_DIRECTORY, "%s.sdf" % key)
+        field = DistanceField.load(filepath)
+        if field is not None:
+            return field
+        field = DistanceField.build(objects)
+        if field is not None:
+            try:
+                if not os.path.isdir(CACHE_DIRECTORY):
+                    os.makedirs(CACHE_DIRECTORY)
+                field.save(filepath)
+            except (IOError, OSError), e:
+                # The field can still be used, it will just be rebuilt the
+                # next time.
+                print "Could not cache the distance field: %s" % e
+        return field
+
+    def sample(self, position):
+        """
+        Returns the interpolated (distance, gradient) of the field at the
+        given (x, z) position, where gradient is an (x, z) unit vector, or
+        None if the position is outside of the field.
+        """
+        column = (position[0] - self.left) / self.cell_size
+        row = (position[1] - self.top) / self.cell_size
+        column1 = int(column)
+        row1 = int(row)
+        if column < 0 or row < 0 or column1 >= self.columns - 1 or row1 >= self.rows - 1:
+            return None
+
+        # Interpolate between the four samples surrounding the position.
+        fx = column - column1
+        fz = row - row1
+        index1 = row1 * self.columns + column1
+        index2 = index1 + self.columns
+        w1 = (1 - fx) * (1 - fz)
+        w2 = fx * (1 - fz)
+        w3 = (1 - fx) * fz
+        w4 = fx * fz
+        values = self._distances
+        distance = values[index1] * w1 + values[index1 + 1] * w2 + \
+            values[index2] * w3 + values[index2 + 1] * w4
+        values = self._gradients_x
+        gx = values[index1] * w1 + values[index1 + 1] * w2 + \
+            values[index2] * w3 + values[index2 + 1] * w4
+        values = self._gradients_z
+        gz = values[index1] * w1 + values[index1 + 1] * w2 + \
+            values[index2] * w3 + values[index2 + 1] * w4
+
+        length = math.sqrt(gx * gx + gz * gz)
+        if length > 0:
+            gx /= length
+            gz /= length
+        return distance, (gx, gz)
+
+
+def _get_segment_normal(vx, vz):
+    """
+    Returns a unit normal of a line segment with the given vector (or (1, 0)
+    for a segment of length 0).
+    """
+    length = math.sqrt(vx * vx + vz * vz)
+    if length == 0:
+        return (1.0, 0.0)
+    return (-vz / length, vx / length)
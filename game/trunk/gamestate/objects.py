@@ -15,9 +15,18 @@ class GameObject(object):
         self.rotation_changed = Event()
         self._position = (0, 0)
         self.isPassable = True
-        self.bounding_shape = None
+        self._bounding_shape = None
         self.type = ""
         self.is_active = False
+        # Static objects never move once they are added to the world.
+        self.is_static = False
+        self.collision_category = collision.CATEGORY_DEFAULT
+        self.collision_mask = collision.CATEGORY_ALL
+        # The object that created this object (e.g., the player that fired a
+        # projectile), which it never collides with.
+        self.owner = None
+        # The zones (see ZoneObject) the object is in.
+        self.zones = set()
 
     def _get_rotation(self):
         """ Gets or sets the object's current orientation angle in radians. """
@@ -36,8 +45,35 @@ class GameObject(object):
         return self._position
     def _set_position(self, value):
         self._position = value
+        if self.is_active:
+            # Keep the world's spatial index up to date.
+            self.world.index_object(self)
     position = property(_get_position, _set_position)
 
+    def _get_bounding_shape(self):
+        """
+        Gets or sets the shape used for collision detection or None if the
+        object does not collide with anything.
+        """
+        return self._bounding_shape
+    def _set_bounding_shape(self, value):
+        self._bounding_shape = value
+        if self.is_active:
+            # Keep the world's spatial index up to date.
+            self.world.index_object(self)
+    bounding_shape = property(_get_bounding_shape, _set_bounding_shape)
+
+    def can_collide_with(self, object):
+        """
+        Returns True if this object and the given object can collide with
+        each other based on their collision categories, masks and owners
+        (without looking at their bounding shapes at all).
+        """
+        if not self.collision_category & object.collision_mask or \
+            not object.collision_category & self.collision_mask:
+            return False
+        return self.owner is not object and object.owner is not self
+
     def update(self, dt):
         pass
         
@@ -46,6 +82,10 @@ class GameObject(object):
 
 
 class MobileObject(GameObject):
+    # The most impassable objects a single _move() will slide along before
+    # stopping.
+    max_solver_iterations = 4
+    
     def __init__(self, world):
         GameObject.__init__(self, world)
         self.type = "mobile"
@@ -55,6 +95,15 @@ class MobileObject(GameObject):
         self.move_speed = 0
         self.move_direction = 0
         self._force_vector = (0, 0)
+        # Whether the object's own movement comes from apply_input() (as a
+        # player's does on the server) rather than from update(), and the
+        # sequence number of the last input applied.
+        self.is_input_driven = False
+        self.input_sequence = 0
+        # How far the object was known to be from the level's geometry, as
+        # (clearance, position, bounding shape), so that the distance field
+        # doesn't have to be sampled on every move (see _move()).
+        self._static_clearance = None
         
         self.position_changed = Event()
         self.force_vector_changed = Event()
@@ -89,163 +138,342 @@ class MobileObject(GameObject):
         GameObject.update(self, dt)
 
         # if a force is applied to this mobileobject
-        if self.force_vector[0] != 0 or self.force_vector[1] != 0:
+        force_vector = self._force_vector
+        if force_vector[0] != 0 or force_vector[1] != 0:
             # move this object based on the force
-            self._move((self.force_vector[0] * dt,
-                        self.force_vector[1] * dt))
+            self._move((force_vector[0] * dt, force_vector[1] * dt))
                
-        if self.is_moving:
-            movespd = self.move_speed * dt
-            movedir = self.rotation + self.move_direction
-            self._move_towards(movespd, movedir)
+        if not self.is_input_driven:
+            self.apply_input(dt)
+
+    def apply_input(self, duration):
+        """
+        Moves the object as it moves itself (if is_moving) over duration
+        seconds, but without any force applied to it. Returns the objects
+        collided with (see _move()).
+        """
+        if not self.is_moving:
+            return []
+        movespd = self.move_speed * duration
+        movedir = self.rotation + self.move_direction
+        return self._move_towards(movespd, movedir)
+
+    def replay_moves(self, position, moves):
+        """
+        Puts the object at position and replays the given moves, a sequence
+        of (distance, direction) tuples, from there. The moves have already
+        been made, so they don't collide with anything again (see _move()).
+        """
+        self.position = position
+        for distance, direction in moves:
+            self._move_towards(distance, direction, collide=False)
 
-    def _move_towards(self, distance, direction, already_collided=None):
+    def _move_towards(self, distance, direction, already_collided=None,
+                      collide=True):
         """
         Moves the object by distance amount in the given direction (radians)
-        and performs collision detection and resolution.
+        and performs collision detection and resolution. Returns the objects
+        collided with (see _move()).
         
         Arguments:
         distance -- The distance (as distance units) to move the object.
         direction -- The direction (as radians where 0 is north) to move in.
-        already_collided -- A set of objects previously collided with in this
+        already_collided -- A list of objects previously collided with in this
             gamestate update that need to persist through _move() calls.
+        collide -- Whether to perform collision resolution (see _move()).
         """
 
         # If the distance we are moving is 0, we don't have to do anything.
         if distance == 0:
-            return
+            return []
 
         # Calculate the movement vector for this move.
         move_vector = (distance * math.cos(direction),
                        distance * math.sin(direction))
 
         # And call _move to perform the move with the calculated vector.
-        self._move(move_vector, already_collided)
+        return self._move(move_vector, already_collided, collide)
     
-    def _move(self, move_vector, already_collided=None):
+    def _move(self, move_vector, already_collided=None, collide=True):
         """
         Moves the object by the given movement vector (relative to the current
-        position and performs collision detection and resolution.
+        position and performs collision detection and resolution. Returns a
+        list of the objects collided with during the move, in the order they
+        were hit.
+        
+        The object's bounding shape is swept along the movement vector so
+        that nothing can be jumped over, however far the object moves. If an
+        impassable object is in the way the object stops against it and
+        slides along it with whatever is left of the move. This is repeated
+        for each impassable object slid into, at most max_solver_iterations
+        times, after which the object stops where it is.
         
         Arguments:
         move_vector -- The vector containing the x and z components to move the
             object in (relative to the current position).
-        already_collided -- A set of objects previously collided with in this
+        already_collided -- A list of objects previously collided with in this
             gamestate update that need to persist through _move() calls.
+        collide -- If False, the object only ends up where the move takes it:
+            collision resolution isn't performed (so no collided events are
+            fired), the solver's iterations aren't recorded and an empty list
+            is returned. This is for replaying moves that have already been
+            made, such as the client's inputs when it reconciles.
         """
         
-        # If the movement vector is 0, we don't have to do anything.
+        # If the movement vector is 0, we only have to collide with any
+        # objects collided with earlier in this move.
         if move_vector == (0, 0):
-            return
-
-        # Calculate the new position we want to move to.
-        new_pos = (self._position[0] + move_vector[0],
-                   self._position[1] + move_vector[1])
+            if not collide:
+                return []
+            return self._collide_all(already_collided)
         
         # If the object doesn't have a bounding shape then we don't need to
         # worry about collision detection & resolution and can simply update
         # the position and return.
-        if self.bounding_shape is None:
-            self.position = new_pos
-            return
+        shape = self._bounding_shape
+        if shape is None:
+            self.position = (self._position[0] + move_vector[0],
+                             self._position[1] + move_vector[1])
+            return []
         
         # Otherwise we need to do collision detection.
         
-        # @todo: possible optimizations:
-        #   - Check un-passable objects first so we can restart _move sooner (if needed).
-        #   - Check only against nearby objects (quadtree?)
-        
-        # Initialize the set of objects we collide with in this object's
+        # Initialize the list of objects we collide with in this object's
         # update (for later use in collision resolution).
         if already_collided is None:
             # If already_collided (a function argument) was not pased then no
             # objects have already collided with this object during this
-            # object's update, so initialize it to an empty set.
-            collided_objects = set()
+            # object's update, so initialize it to an empty list.
+            collided_objects = []
         else:
             # Otherwise we already have some objects we have collided with (but
-            # not performed resolution on), so initialize our set to those
+            # not performed resolution on), so initialize our list to those
             # previously collided with objects.
             collided_objects = already_collided
         
-        # Create a BoundingLineSegment that represents the player's move vector
-        # We do this here so that we only have to do it ONCE to check against all
-        # objects in the world.
-        move_segment = collision.BoundingLineSegment(self.position, new_pos)
+        move_length = math.sqrt(move_vector[0] * move_vector[0] +
+                                move_vector[1] * move_vector[1])
         
-        # Loop over all objects in the world to test against.
-        for object in self.world.objects:
-            if self == object:
-                # Can't collide with ourself.
-                continue
-                
-            if object.bounding_shape is None:
-                # Can't collide with an object that has no bounding shape.
-                continue
-
-            # Cast a ray from where we are to where we are moving to and check
-            # if this ray collides with the object. This is to look for any
-            # objects that may be between our old position and our new
-            # position. This result will be True if the ray collides with the
-            # object and False if not.
-            rayResult = CollisionDetector.is_between(object.bounding_shape, object.position, move_segment)
+        # Look up how far we are from the level's walls and obstacles in the
+        # world's distance field (if it has one).
+        check_static = True
+        field = self.world.distance_field
+        if field is not None and shape.type == "circle":
+            # No point is further from the geometry than any other point is
+            # plus the distance between them, so a clearance found earlier
+            # still holds, less the distance moved since.
+            sample = None
+            known = self._static_clearance
+            if known is not None and known[2] is shape:
+                dx = self._position[0] - known[1][0]
+                dz = self._position[1] - known[1][1]
+                if known[0] - math.sqrt(dx * dx + dz * dz) > move_length:
+                    check_static = False
+            if check_static:
+                sample = field.sample(self._position)
+            if sample is not None:
+                distance, gradient = sample
+                clearance = distance - shape.radius
+                if clearance < 0:
+                    # We are overlapping the level's geometry (e.g., we were
+                    # spawned inside a wall), so we have run into it already.
+                    # Note what we are touching before we push ourself out
+                    # of it along the field's gradient (leaving a little
+                    # space), as the move won't run into it again.
+                    if collide:
+                        self._add_static_contacts(collided_objects)
+                    push = CollisionDetector.SPACING - clearance
+                    self.position = (self._position[0] + gradient[0] * push,
+                                     self._position[1] + gradient[1] * push)
+                elif clearance - field.max_error > move_length:
+                    # The level's geometry is too far away to reach in this
+                    # move, so there is no need to check against it.
+                    check_static = False
+                    self._static_clearance = (clearance - field.max_error,
+                                              self._position, shape)
+        
+        # Collect every object we could reach during this move once (from
+        # the world's static index, if needed, and its spatial index).
+        # Sliding never takes us further than the length of the move, so
+        # only objects near the area within that distance of our current
+        # position can collide with us. A long move (such as a dash) is
+        # usually not blocked though, so for those only the objects along
+        # the straight path of the move are collected at first, with a walk
+        # of the world's grid, and the rest only if we have to slide.
+        origin = self._position
+        is_along_path = move_length > self.world.spatial_index.cell_size
+        if is_along_path:
+            nearby_objects = self.world.get_nearby_objects_along(
+                shape, origin,
+                (origin[0] + move_vector[0], origin[1] + move_vector[1]),
+                check_static)
+        else:
+            left, top, right, bottom = shape.get_AABB(origin)
+            nearby_objects = self.world.get_nearby_objects(
+                left - move_length, top - move_length,
+                right + move_length, bottom + move_length, check_static)
+        impassable_objects, passable_objects = \
+            self._split_move_candidates(nearby_objects)
+        
+        if not impassable_objects and not passable_objects:
+            # There is nothing to run into or pass through (as is the case
+            # for most moves), so the whole move is clear.
+            self.position = (origin[0] + move_vector[0],
+                             origin[1] + move_vector[1])
+            if not collide:
+                return []
+            self.world.record_solver_iterations(1, False)
+            if len(collided_objects) == 0:
+                return collided_objects
+            return self._collide_all(collided_objects)
+        
+        # Work out the path we take first by sweeping our bounding shape
+        # through the impassable objects only. Each time we run into one we
+        # stop against it and slide along it with the rest of the move,
+        # removing the part of the move that heads into it (or into any of
+        # the objects we have already run into during this move, in which
+        # case we are stuck in a corner and stop).
+        spacing = CollisionDetector.SPACING
+        position = self._position
+        remaining = move_vector
+        path = []
+        normals = []
+        iterations = 0
+        capped = False
+        while True:
+            iterations += 1
+            blocking_hit, crossed = CollisionDetector.sweep_circle(
+                shape, position, remaining, impassable_objects)
+            if blocking_hit is None:
+                path.append((position, remaining, None))
+                position = (position[0] + remaining[0],
+                            position[1] + remaining[1])
+                break
             
-            # Check if our bounding shape at our new position would overlap
-            # with the object's bounding shape. The result will be None if
-            # there is no overlap, or if there is a collision it will be the
-            # position we should reset to if the object is not passable as a
-            # part of collision resolution.
-            shapeResult = CollisionDetector.check_collision_and_resolve(self.bounding_shape, new_pos, self.position, 
-                                                                        object.bounding_shape, object.position)
+            time, object, normal = blocking_hit
+            path.append((position, (remaining[0] * time, remaining[1] * time),
+                         object))
+            normals.append(normal)
             
-            if rayResult is not False and shapeResult is False:
-                # The object collided with our ray, but not with our shape,
-                # so we must have jumped over it.
-                
-                # If the object is not passable, then this is a critical error
-                # and we will completely deny the move by returning.
-                if not object.isPassable:
-                    print "*Player movement was denied."
-                    
-                    # must collide these two objects to throw the proper events
-                    self.collide(object)
-                    object.collide(self)
-                    return
-                    
-                # Otherwise add the object to our set of collided objects.
-                collided_objects.add(object)
-                
-            if shapeResult is not False:
-                # Our new bounding shape will be overlapping with another
-                # object's bounding shape.
-                
-                # Add the object to our set of collided objects.
-                collided_objects.add(object)
-                
-                # If the object is not passable, then we need to move to the
-                # new position that is provided by the result and redo the
-                # collision detection based on that new position. Call
-                # self._move() to do this and then return.
-                
-                if not object.isPassable:
-                    # We will use the shapeResult value (a corrected movement
-                    # vector) returned from check_collision to move ourself
-                    # flush against the object we collided with.
-                    move_mm = (move_vector[0] + shapeResult[0],move_vector[1] + shapeResult[1])
-                    self._move((move_vector[0] + shapeResult[0],
-                                move_vector[1] + shapeResult[1]),
-                               set([object]))
-                    return
+            # Move up to the point of contact (leaving a little space between
+            # us and the object).
+            position = (position[0] + remaining[0] * time + normal[0] * spacing,
+                        position[1] + remaining[1] * time + normal[1] * spacing)
+            
+            if iterations >= self.max_solver_iterations:
+                # We have slid into too many objects in one move so stop here.
+                capped = True
+                break
+            
+            # Slide along the object with the rest of the move.
+            remaining = (remaining[0] * (1 - time), remaining[1] * (1 - time))
+            into = remaining[0] * normal[0] + remaining[1] * normal[1]
+            remaining = (remaining[0] - into * normal[0],
+                         remaining[1] - into * normal[1])
+            if remaining[0] * remaining[0] + remaining[1] * remaining[1] < spacing * spacing:
+                # Too little is left of the move to bother sliding.
+                break
+            is_cornered = False
+            for other_normal in normals[:-1]:
+                if remaining[0] * other_normal[0] + remaining[1] * other_normal[1] < 0:
+                    # Sliding along this object would take us back into one
+                    # we already ran into.
+                    is_cornered = True
+            if is_cornered:
+                break
+            
+            if is_along_path:
+                # Sliding takes us off the straight path of the move so we
+                # need every object we could reach now.
+                is_along_path = False
+                impassable_objects, passable_objects = \
+                    self._split_move_candidates(self._get_reachable_objects(
+                        move_length, check_static, origin))
+        
+        if not collide:
+            self.position = position
+            return []
+        
+        self.world.record_solver_iterations(iterations, capped)
+        
+        # Now sweep along each part of our path through the passable objects
+        # to find every one we passed through, in the order we hit them.
+        for start, vector, blocking_object in path:
+            if len(passable_objects) > 0:
+                blocking_hit, crossed = CollisionDetector.sweep_circle(
+                    shape, start, vector, passable_objects)
+                for time, object in crossed:
+                    if object not in collided_objects:
+                        collided_objects.append(object)
+            if blocking_object is not None and blocking_object not in collided_objects:
+                collided_objects.append(blocking_object)
 
         # Now that collision detection is complete, update our position to the
-        # previously calculated new position.
-        self.position = new_pos
+        # end of our path.
+        self.position = position
 
-        # We now have a set of objects that we have collided with. Call
-        # .collide() on each of those objects to perform collision resolution.
+        return self._collide_all(collided_objects)
+    
+    def _add_static_contacts(self, collided_objects):
+        """
+        Adds the impassable static objects (from the world's static index)
+        that our bounding shape overlaps at our current position, and that we
+        can collide with, to the given list of objects collided with.
+        """
+        shape = self._bounding_shape
+        position = self._position
+        for object in self.world.static_index.query_shape(shape, position):
+            if object.isPassable or object in collided_objects or \
+                not self.can_collide_with(object):
+                continue
+            if CollisionDetector.check_collision(shape, position,
+                    object.bounding_shape, object.position) is not False:
+                collided_objects.append(object)
+    
+    def _get_reachable_objects(self, distance, include_static, position=None):
+        """
+        Returns the objects that may be within the given distance of our
+        bounding shape at the given position (our current position by
+        default), from the world's spatial and (if include_static is True)
+        static indexes.
+        """
+        if position is None:
+            position = self._position
+        left, top, right, bottom = self.bounding_shape.get_AABB(position)
+        return self.world.get_nearby_objects(left - distance, top - distance,
+                                             right + distance, bottom + distance,
+                                             include_static)
+    
+    def _split_move_candidates(self, nearby_objects):
+        """
+        Returns the (impassable objects, passable objects) among the given
+        nearby objects that we can collide with.
+        """
+        impassable_objects = []
+        passable_objects = []
+        for object in nearby_objects:
+            if object is self or object.bounding_shape is None:
+                continue
+            if not self.can_collide_with(object):
+                continue
+            if object.isPassable:
+                passable_objects.append(object)
+            else:
+                impassable_objects.append(object)
+        return impassable_objects, passable_objects
+    
+    def _collide_all(self, collided_objects):
+        """
+        Calls .collide() on each of the given objects collided with during a
+        move (and on this object for each of them) to perform collision
+        resolution. Returns the list of objects.
+        """
+        if collided_objects is None:
+            return []
         for object in collided_objects:
             self.collide(object)
             object.collide(self)
+        return collided_objects
 
     def collide(self, object):
         GameObject.collide(self, object)
@@ -264,7 +492,8 @@ class Player(MobileObject):
     
     def __init__(self, world):
         MobileObject.__init__(self, world)
-        self.bounding_shape = collision.BoundingCircle(6)
+        self.bounding_shape = collision.BoundingCircle.get(6)
+        self.collision_category = collision.CATEGORY_PLAYER
         self.type = "player"
         self.name = ""
         self.move_speed = 100
@@ -275,6 +504,11 @@ class Player(MobileObject):
         self.teleported = Event()
         self.last_position = None
         self.last_combat_time = 0
+        # How far behind the world's time the player's client shows the
+        # other objects, which the server sets so that the abilities the
+        # player uses can be lag compensated (see
+        # abilities.AbilityInstance.get_colliders()).
+        self.latency = 0
         
         self._health = 100
         self._power = 100
@@ -421,7 +655,21 @@ class Player(MobileObject):
                     self.health += self.health_regen * (self.world.time - self.regen_last_time) * regen_scale
                     self.power += self.power_regen * (self.world.time - self.regen_last_time) * regen_scale
                     self.regen_last_time = self.world.time
-            
+        
+        self._update_is_moving()
+        MobileObject.update(self, dt)
+
+        for ability in self.active_abilities:
+            ability.update(dt)
+
+    def apply_input(self, duration):
+        # The input may have started the player moving when it can't.
+        self._update_is_moving()
+        return MobileObject.apply_input(self, duration)
+
+    def _update_is_moving(self):
+        """ Forces or prevents movement as the player's states require. """
+        if not self.is_dead:
             if self.is_charging:
                 # If the player is charging then force movement.
                 self.is_moving = True
@@ -430,11 +678,6 @@ class Player(MobileObject):
         
         if self.is_immobilized or self.is_dead:
             self.is_moving = False
-        
-        MobileObject.update(self, dt)
-
-        for ability in self.active_abilities:
-            ability.update(dt)
             
     def change_element(self, element_type):
         if self.element.type == element_type:
@@ -503,7 +746,10 @@ class ProjectileObject(MobileObject):
         MobileObject.__init__(self, player.world)
         self.time_to_live = duration
         self.owner = player
-        self.bounding_shape = collision.BoundingCircle(projectile_radius)
+        # Projectiles never collide with each other.
+        self.collision_category = collision.CATEGORY_PROJECTILE
+        self.collision_mask = collision.CATEGORY_ALL & ~collision.CATEGORY_PROJECTILE
+        self.bounding_shape = collision.BoundingCircle.get(projectile_radius)
         self.duration = duration
         self.expired = Event()
         self.type = "projectile"
@@ -522,10 +768,8 @@ class ProjectileObject(MobileObject):
         # @todo fix double call bug and remove is_active
         if not self.is_active:
             return
-        if object == self.owner:
-            return
-        if object.type == "projectile":
-            return
+        # (The owner and other projectiles are never collided with, see
+        # GameObject.can_collide_with().)
         MobileObject.collide(self, object)
         self.expire()
         
@@ -534,3 +778,179 @@ class ProjectileObject(MobileObject):
             return
         self.expired(self)
         self.world.remove_object(self)
+
+class ZoneObject(GameObject):
+    """
+    An area-effect zone, such as the area an ability damages over time. The
+    zone is kept in the world's zone index and is never collided with.
+    Instead it keeps its set of occupants (the objects inside its bounding
+    shape, a circle, cone or annulus) up to date, firing the entered and
+    exited events as objects come and go. If tick_interval is given the
+    ticked event is also fired on the zone's first update and then every
+    tick_interval seconds.
+    
+    The occupants are kept up to date incrementally: the world tells the zone
+    whenever an object that is in it, or that has moved near it, changes
+    position (see World.index_object()), and on its next update the zone
+    checks only those objects. Only when the zone itself moves (or is first
+    added) does it look for all of its occupants again, so a zone anchored
+    to a moving object does that every update it moves.
+    
+    A zone that ticks and has no entered, exited or updated handlers only
+    checks its occupants when it ticks. A zone with an owner removes itself
+    from the world when its owner leaves it.
+    
+    Events:
+    entered(zone, object) -- An object has entered the zone.
+    exited(zone, object) -- An object has left the zone (or the world).
+    ticked(zone, occupants) -- A tick has passed.
+    updated(zone, occupants) -- The occupants have been brought up to date
+        (at the end of every update).
+    """
+    def __init__(self, world, bounding_shape, mask=collision.CATEGORY_PLAYER,
+                 ignored=[], tick_interval=None):
+        """
+        Arguments:
+        world -- The world the zone is in.
+        bounding_shape -- The area of the zone.
+        mask -- The collision categories of the objects that can occupy the
+            zone.
+        ignored -- A list of objects that can never occupy the zone.
+        tick_interval -- The time between ticks or None if the zone does not
+            tick.
+        """
+        GameObject.__init__(self, world)
+        self.type = "zone"
+        self.bounding_shape = bounding_shape
+        self.collision_category = collision.CATEGORY_ZONE
+        # Zones never take part in collisions.
+        self.collision_mask = 0
+        self.occupant_mask = mask
+        self.ignored = ignored
+        self.tick_interval = tick_interval
+        # If set, the zone stays centered on this object.
+        self.anchor = None
+        self.time_lived = 0
+        self.ticks_done = 0
+        # The objects currently in the zone, in the order they entered.
+        self.occupants = []
+        # The objects that have moved since the zone last checked them, and
+        # the (position, bounding shape) the zone last looked for all of its
+        # occupants with.
+        self._moved = []
+        self._moved_set = set()
+        self._last_search = None
+        self.entered = Event()
+        self.exited = Event()
+        self.ticked = Event()
+        self.updated = Event()
+    
+    def update(self, dt):
+        GameObject.update(self, dt)
+        if not self.is_active:
+            return
+        if self.owner is not None and not self.owner.is_active:
+            self.remove()
+            return
+        if self.anchor is not None and self.anchor.position != self.position:
+            self.position = self.anchor.position
+        self.time_lived += dt
+        is_tick = self.tick_interval is not None and \
+            self.time_lived >= self.ticks_done * self.tick_interval
+        if not is_tick and self.tick_interval is not None and \
+            len(self.entered) == 0 and len(self.exited) == 0 and \
+            len(self.updated) == 0:
+            return
+        
+        previous = set(self.occupants)
+        if self._last_search != (self.position, self.bounding_shape):
+            # The zone has moved, so every object near it (found with the
+            # world's spatial index) has to be checked.
+            self._last_search = (self.position, self.bounding_shape)
+            colliders = self.world.get_colliders(self.bounding_shape,
+                self.position, self.ignored, self.occupant_mask)
+            current = set(colliders)
+            left = [object for object in self.occupants if object not in current]
+            arrived = [object for object in colliders if object not in previous]
+        else:
+            # Only the objects that have moved can have come or gone.
+            left = []
+            arrived = []
+            for object in self._moved:
+                if self.contains(object):
+                    if object not in previous:
+                        arrived.append(object)
+                elif object in previous:
+                    left.append(object)
+        self._moved = []
+        self._moved_set.clear()
+        
+        if len(left) > 0:
+            left_set = set(left)
+            self.occupants = [object for object in self.occupants
+                if object not in left_set]
+        self.occupants.extend(arrived)
+        for object in left:
+            object.zones.discard(self)
+        for object in arrived:
+            object.zones.add(self)
+        for object in left:
+            self.exited(self, object)
+        for object in arrived:
+            self.entered(self, object)
+        
+        if is_tick:
+            self.ticks_done += 1
+            self.ticked(self, list(self.occupants))
+        self.updated(self, list(self.occupants))
+    
+    def seed_occupants(self):
+        """
+        Takes the objects in the zone now as its occupants without firing
+        entered events for them, so that only the objects that enter it
+        after this are reported.
+        """
+        self._last_search = (self.position, self.bounding_shape)
+        self._moved = []
+        self._moved_set.clear()
+        for object in self.world.get_colliders(self.bounding_shape,
+                self.position, self.ignored, self.occupant_mask):
+            if self not in object.zones:
+                self.occupants.append(object)
+                object.zones.add(self)
+    
+    def contains(self, object):
+        """ Returns True if the given object can occupy the zone and is in it. """
+        return object.is_active and object.bounding_shape is not None and \
+            object.collision_category & self.occupant_mask != 0 and \
+            object not in self.ignored and \
+            CollisionDetector.check_collision(self.bounding_shape, self.position,
+                object.bounding_shape, object.position) is not False
+    
+    def object_moved(self, object):
+        """
+        Called by the world when an object that is in the zone, or that has
+        moved near it, has changed position (or bounding shape or left the
+        world), so that the zone checks it on its next update.
+        """
+        if object not in self._moved_set and \
+            object.collision_category & self.occupant_mask:
+            self._moved_set.add(object)
+            self._moved.append(object)
+    
+    def clear_occupants(self):
+        """
+        Forgets the zone's occupants without firing exited events, for when
+        the zone leaves the world.
+        """
+        for object in self.occupants:
+            object.zones.discard(self)
+        self.occupants = []
+        self._moved = []
+        self._moved_set.clear()
+        self._last_search = None
+    
+    def remove(self):
+        """ Removes the zone from the world if it is still in it. """
+        if self.is_active:
+            self.world.remove_object(self)
@@ -0,0 +1,631 @@
+"""
+The ogrecollision module contains the original ogre.Vector3 based collision
+detection routines. The game itself uses the plain float routines in the
+collision module, which do not need OGRE to be installed.
+"""
+
+import math
+import ogre.renderer.OGRE as ogre
+
+from collision import UnsupportedShapesException
+
+def _vector(point):
+    """ Converts an (x, z) tuple to an ogre.Vector3. """
+    return ogre.Vector3(point[0], 0, point[1])
+
+
+class OgreCollisionDetector(object):
+    """
+    The original ogre.Vector3 based implementation of the OgreCollisionDetector.
+    It is kept as a reference to check the results of the plain float
+    collision.CollisionDetector (which the game uses) against. The bounding
+    shapes store their points as (x, z) tuples, which are converted to
+    ogre.Vector3 here as they are used.
+    """
+    SPACING = 0.1
+
+    @staticmethod
+    def check_aabb_collision(shape1, pos1, shape2, pos2):
+        # if the left side of the collider shape is to the right of the right side of the collidee
+        # shape, no aabb collision is possible
+        if shape1.aabb_left + pos1[0] > shape2.aabb_right + pos2[0]:
+            return False
+        # if the top of the collider shape is below the bottom of the collidee shape
+        # no aabb collision is possible
+        if shape1.aabb_top + pos1[1] > shape2.aabb_bottom + pos2[1]:
+            return False
+        # if the right side of the collider shape is to the left of the left side of the collidee shape
+        # no aabb collision is possible
+        if shape1.aabb_right + pos1[0] < shape2.aabb_left + pos2[0]:
+            return False
+        # if the bottom of the collider shape is above the top of the collidee shape
+        # no collision is possible
+        if shape1.aabb_bottom + pos1[1] < shape2.aabb_top + pos2[1]:
+            return False
+        
+        # otherwise, return true
+        return True
+        
+
+    @staticmethod
+    def is_between(shape, position, line):
+        """
+        Returns True if the given shape at the given position is between the
+        two given points (i.e., if it collides with the line segment between
+        point1 and point2). Returns False otherwisel.
+        Raises an UnsupportedShapesException if the given shape type is not
+        supported.
+        """
+        
+        # @todo: optimize this function so it no longer lags the game to death
+        # for the meantime, the conditions this function protects against are so rare
+        # they are not worth the performance hit
+        
+        
+        # first check axis-aligned bounding box collision for speed increase
+        if OgreCollisionDetector.check_aabb_collision(shape, position, line, line.point1) is False:
+            return False
+        
+        shape_position = ogre.Vector3(position[0], 0, position[1])
+        
+        line_position = _vector(line.point1)
+        
+        # If the line has lenght 0 it cannot possibly collide with anything.
+        line_vector = _vector(line.vector)
+        if(line_vector.x == 0. and line_vector.y == 0.):
+            return False;
+        
+        if shape.type == "circle":
+            return OgreCollisionDetector._check_circle_line(shape, shape_position, line, line_position) is not False
+        elif shape.type == "linesegment":
+            return OgreCollisionDetector._check_line_line(shape, shape_position, line, line_position) is not False
+        elif shape.type == "rectangle":
+            return OgreCollisionDetector._check_line_rect(shape, shape_position, line, line_position) is not False
+            return False
+            
+        raise UnsupportedShapesException(shape, line)
+
+    @staticmethod
+    def check_collision(shape1, position1, shape2, position2):
+        """
+        Returns True if the two given shapes (at their respective positions)
+        are overlapping. Returns False otherwise.
+        Raises an UnsupportedShapesException if collision detection between
+        the given shapes is not supported.
+        """
+        
+        # first check axis-aligned bounding box collision for speed increase
+        if OgreCollisionDetector.check_aabb_collision(shape1,position1, shape2, position2) is False:
+            return False
+        
+        # convert tuples to ogre.Vector3
+        position1 = ogre.Vector3(position1[0], 0, position1[1])
+        position2 = ogre.Vector3(position2[0], 0, position2[1])
+        
+        if shape1.type == "circle" and shape2.type == "linesegment":
+            return OgreCollisionDetector._check_circle_line(shape1, position1, shape2, position2) is not False
+        elif shape1.type == "circle" and shape2.type == "circle":
+            if not shape1.is_hollow:
+                return OgreCollisionDetector._check_circle_circle(shape1, position1, shape2, position2) is not False
+            else:
+                return OgreCollisionDetector._check_circle_circle_hollow(shape1, position1, shape2, position2) is not False
+        elif shape1.type == "circle" and shape2.type == "rectangle":
+            return OgreCollisionDetector._check_circle_rect(shape1, position1, shape2, position2) is not False
+        elif shape1.type == "cone" and shape2.type == "circle":
+            return OgreCollisionDetector._check_cone_circle(shape1, position1, shape2, position2) is not False
+
+        raise UnsupportedShapesException(shape1, shape2)
+            
+    @staticmethod
+    def check_collision_and_resolve(shape1, position1, old_position1, shape2, position2):
+        """
+        Returns False if the two given shapes (at their respective positions)
+        are not overlapping. Otherwise a tuple is returned representing the
+        vector shape1 would have to move from position1 to no longer be
+        overlapping with shape2 at position2.
+        """
+        
+        # first check axis-aligned bounding box collision for speed increase
+        if OgreCollisionDetector.check_aabb_collision(shape1,position1, shape2, position2) is False:
+            return False
+        
+        # convert tuples to ogre.Vector3
+        position1 = ogre.Vector3(position1[0], 0, position1[1])
+        position2 = ogre.Vector3(position2[0], 0, position2[1])
+        old_position1 = ogre.Vector3(old_position1[0], 0, old_position1[1])
+        
+        if shape1.type == "circle" and shape2.type == "linesegment":
+            return OgreCollisionDetector._resolve_circle_line(shape1, position1, old_position1, shape2, position2)
+        elif shape1.type == "circle" and shape2.type == "circle":
+            return OgreCollisionDetector._resolve_circle_circle(shape1, position1, shape2, position2)
+        elif shape1.type == "circle" and shape2.type == "rectangle":
+            return OgreCollisionDetector._resolve_circle_rectangle(shape1, position1, old_position1, shape2, position2)
+            
+        raise UnsupportedShapesException(shape1, shape2)
+
+    @staticmethod
+    def _check_circle_line(circle, circle_position, line, line_position):
+        """
+        Checks to see if a BoundingCircle collides with a BoundingLineSegment.
+        Returns a tuple containing the 'u' values of intersection points if collision occurred, False if not.
+        The resulting tuple can contain either 1 or 2 elements.
+        """
+        
+        # get the absolute position of the line segment vertices
+        point1 = line_position
+        point2 = line_position + _vector(line.vector)
+
+        # first transform the segment vertices to coordinates relative to the circle's center
+        localP1 = ogre.Vector3(point1.x - circle_position.x, 0, point1.z - circle_position.z)
+        localP2 = ogre.Vector3(point2.x - circle_position.x, 0, point2.z - circle_position.z)
+
+        # pre-calculate p1-p2 for easy reference
+        p2Minusp1 = ogre.Vector3(point2.x - point1.x, 0, point2.z - point1.z) # same as segment.vector?
+
+        # get quadratic coefficients
+        a = (p2Minusp1.x * p2Minusp1.x) + (p2Minusp1.z * p2Minusp1.z)
+        b = 2 * ((p2Minusp1.x * localP1.x) + (p2Minusp1.z * localP1.z))
+        c = (localP1.x * localP1.x) + (localP1.z * localP1.z) - (circle.radius * circle.radius)
+
+        discrim = b * b - 4 * a * c
+
+        if discrim < 0: # no collision
+            return False
+        elif discrim == 0: # perfect collision
+            # u is the % of the distance from p1 to p2 the intersection point falls at
+            u = -b / (2 * a)
+            collisionPoint = ogre.Vector3(point1.x + u * p2Minusp1.x, 0, point1.z + u * p2Minusp1.z)
+            if u < 0 or u > 1:
+                return False   
+            else:
+                # now we're sure the collision is valid, so we'll return the collision point
+                return (u,)
+        elif discrim > 0: # collision with 2 intersection points
+            u1 = (-b + math.sqrt(discrim)) / (2 * a)
+            u2 = (-b - math.sqrt(discrim)) / (2 * a)
+
+            # check to make sure the collision point falls between point1 and point2 on the line
+            avg = (u1 + u2)/2
+            if avg < 0 or avg > 1:
+                return False
+            
+            # now we're sure the collision is valid, so we'll return the 2 collision points
+            return (u1, u2)
+        
+    @staticmethod
+    def _is_circle_intersecting_line(circle, circle_position, line, line_position):
+        """
+        Checks to see if a BoundingCircle collides with a BoundingLineSegment.
+        Returns a tuple containing the 'u' values of intersection points if collision occurred, False if not.
+        The resulting tuple can contain either 1 or 2 elements.
+        """
+        
+        # get the absolute position of the line segment vertices
+        point1 = line_position
+        point2 = line_position + _vector(line.vector)
+
+        # first transform the segment vertices to coordinates relative to the circle's center
+        localP1 = ogre.Vector3(point1.x - circle_position.x, 0, point1.z - circle_position.z)
+        localP2 = ogre.Vector3(point2.x - circle_position.x, 0, point2.z - circle_position.z)
+
+        # pre-calculate p1-p2 for easy reference
+        p2Minusp1 = ogre.Vector3(point2.x - point1.x, 0, point2.z - point1.z) # same as segment.vector?
+
+        # get quadratic coefficients
+        a = (p2Minusp1.x * p2Minusp1.x) + (p2Minusp1.z * p2Minusp1.z)
+        b = 2 * ((p2Minusp1.x * localP1.x) + (p2Minusp1.z * localP1.z))
+        c = (localP1.x * localP1.x) + (localP1.z * localP1.z) - (circle.radius * circle.radius)
+
+        discrim = b * b - 4 * a * c
+
+        if discrim < 0: # no collision
+            return False
+        elif discrim == 0: # perfect collision
+            # u is the % of the distance from p1 to p2 the intersection point falls at
+            u = -b / (2 * a)
+            collisionPoint = ogre.Vector3(point1.x + u * p2Minusp1.x, 0, point1.z + u * p2Minusp1.z)
+            if u < 0 or u > 1:
+                return False   
+            else:
+                # now we're sure the collision is valid, so we'll return True
+                return True,
+        elif discrim > 0: # collision with 2 intersection points
+            u1 = (-b + math.sqrt(discrim)) / (2 * a)
+            u2 = (-b - math.sqrt(discrim)) / (2 * a)
+
+            if u1 > 0 and u1 < 1:
+                return True
+            if u2 > 0 and u2 < 1:
+                return True
+            return False
+
+    @staticmethod
+    def _check_circle_circle(circle1, circle1_position, circle2, circle2_position):
+        """
+        Checks if circle1 centered about circle1_position is overlapping with circle2
+        centered about circle2_position. If there is no overlap, False is returned. If
+        there is an overlap, True is returned.
+        """
+        
+        # Calculate the distance between the center points of the two circles.
+        distance = OgreCollisionDetector._get_xz_distance(circle1_position, circle2_position)
+        
+        if distance > circle1.radius + circle2.radius:
+            # If the distance is greater than the sum of the two circles' radii
+            # then the circles are not overlapping and there is no collision.
+            return False
+        else:
+            return True
+        
+    @staticmethod
+    def _check_circle_circle_hollow(circle1, circle1_position, circle2, circle2_position):
+        """
+        NOTE: The difference between hollow collision and non-hollow collision is this will
+        ONLY return true if there are actual point(s) of intersection. This method will
+        return false if one circle is inside the other and not intersecting.
+        
+        Checks if circle1 centered about circle1_position is overlapping with circle2
+        centered about circle2_position. If there is no overlap, False is returned. If
+        there is an overlap, True is returned.
+        """
+        # if one circle is inside the other, then return False
+        if circle1.radius > circle2.radius:
+            larger_circle = circle1
+            larger_circle_position = circle1_position
+            smaller_circle = circle2
+            smaller_circle_position = circle2_position
+        else:
+            larger_circle = circle2
+            larger_circle_position = circle2_position
+            smaller_circle = circle1
+            smaller_circle_position = circle1_position
+            
+        distance = OgreCollisionDetector._get_xz_distance(circle1_position, circle2_position)
+        
+        if larger_circle.radius > distance + smaller_circle.radius:
+            return False
+        
+        if distance > circle1.radius + circle2.radius:
+            # If the distance is greater than the sum of the two circles' radii
+            # then the circles are not overlapping and there is no collision.
+            return False
+        else:
+            return True
+        
+    @staticmethod
+    def _check_circle_rect(circle, circle_position, rect, rect_position):
+        """
+        Checks collision between a circle and a rectangle. If a collision exists, it will return True.
+        If a collision does not exist, it returns False.
+        """
+        # determine if circle is in voroni region or not, and if it is, determine which segment's voroni 
+        segments = []       
+        for side in rect.sides:
+            axis_pos = OgreCollisionDetector._get_position_on_axis(circle_position, _vector(side.normal), _vector(side.point1) + rect_position)
+            if axis_pos >= 0:
+                segments.append(side)
+        if len(segments) == 0:
+            raise Exception("Circle moved from inside the rectangle.")
+        # if in voroni region...
+        elif len(segments) == 1:
+            # check for voroni region collision
+            distance_to_edge = OgreCollisionDetector._get_position_on_axis(circle_position, _vector(segments[0].normal), _vector(segments[0].point1) + rect_position)
+            if distance_to_edge <= circle.radius:
+                return True
+            else:
+                return False
+        # else if not in voroni region, check for non-voroni region collision
+        elif len(segments) == 2:
+            # get the axis
+            axis = circle_position - rect_position
+            axis.normalise()
+            
+            # get the corner closest to the circle
+            point1 = _vector(segments[0].point1) + rect_position
+            point2 = _vector(segments[0].point1) + _vector(segments[0].vector) + rect_position
+            
+            dp1 = OgreCollisionDetector._get_position_on_axis(point1, axis, rect_position)
+            dp2 = OgreCollisionDetector._get_position_on_axis(point2, axis, rect_position)
+            
+            if dp1 > dp2:
+                corner = point1
+            else:
+                corner = point2
+                
+            
+            distance = OgreCollisionDetector._get_xz_distance(circle_position, corner)
+            
+            # check for collision
+            circle_edge_pos = distance - circle.radius
+            if circle_edge_pos <= 0:
+                # collision occurred
+                return True
+            else:
+                return False
+        
+        return False  
+
+    @staticmethod
+    def _check_cone_circle(cone, cone_position, circle, circle_position):
+        """
+        Checks to see if a cone effect (actually represented by a circle sector)
+        collides with a circle. Returns True on collision, False on no collision.
+        """
+        # first check to see if there is a circle collision
+        distance = OgreCollisionDetector._get_xz_distance(cone_position, circle_position)
+        
+        # if it's too far away to collide than we can return before doing any other calculations
+        if (distance - circle.radius ) > cone.radius:
+            return False
+        
+        # now we need to check angles... first get the angle from conePos to pointToCheck
+        theta = math.atan2(circle_position.z - cone_position.z, circle_position.x - cone_position.x)
+        
+        # get the max and min values of theta in order for a collision to occur
+        min = cone.orientation - cone.width/2
+        max = cone.orientation + cone.width/2
+        
+        # check to see if theta is in that range
+        if min < theta and theta < max:
+            # if so, collision
+            return True
+        else:
+            # otherwise, no collision
+            return False
+        
+    @staticmethod
+    def _check_line_line(line1, line1_position, line2, line2_position):
+        """
+        Checks to see if the BoundingLineSegments line1 and line2 collide.
+        Returns True on collision, False on no collision.
+        """
+        # a1 and a2 are the endpoints of line1
+        a1 = line1_position
+        a2 = line1_position + _vector(line1.vector)
+
+        # b1 and b2 are the endpoints of line2
+        b1 = line2_position
+        b2 = line2_position + _vector(line2.vector)
+
+        # calculate denominator
+        denom = ((b2.z - b1.z) * (a2.x - a1.x)) - ((b2.x - b1.x) * (a2.z - a1.z))
+
+        if denom == 0: # the segments are parallel
+            return False # no collision
+        else:
+            # otherwise we have to solve for the intersection points
+            ua = (((b2.x - b1.x) * (a1.z - b1.z)) - ((b2.z - b1.z) * (a1.x - b1.x))) / denom
+            ub = (((a2.x - a1.x) * (a1.z - b1.z)) - ((a2.z - a1.z) * (a1.x - b1.x))) / denom
+
+            # ua and ub represent the % along the corresponding segment the intersection happens
+            # if ua or ub is less than 0 (0%) or greater than 1 (100%) then segments did not collide, return False
+            if (ua < 0) or (ua > 1) or (ub < 0) or (ub > 1):
+                return False
+            else:
+                return True
+        
+    @staticmethod
+    def _check_line_rect(line, line_position, rect, rect_position):
+        """
+        Determines whether or not a line segment intersects a rectangle.
+        Returns True for collision, False for no collision.
+        """ 
+        # call check_line_line() on each side of rect
+        for side in rect.sides:
+            res = OgreCollisionDetector._check_line_line(line, line_position, side, _vector(side.point1) + rect_position)
+            if res == True:
+                return True
+        return False
+    
+    @staticmethod
+    def _resolve_circle_line(circle, circle_position_new, circle_position_old, line, line_position):
+        """
+        Returns the Resolution Translation Vector (RTV) that must be applied to the object that owns
+        circle in order to resolve the collision, or False if no collision occurred.
+        """
+        
+        # find the distance to the edge from the circle's new position 
+        line_point1 = _vector(line.point1)
+        line_point2 = _vector(line.point2)
+        line_normal = _vector(line.normal)
+        new_distance_to_edge = OgreCollisionDetector._get_position_on_axis(circle_position_new, line_normal, line_point1)
+        
+        # if we are positive and farther away than radius, then no collision occurred for sure
+        if new_distance_to_edge > circle.radius or new_distance_to_edge < 0:
+            return False
+        # otherwise
+        else:
+            # determine if a collision occurred in the voroni region
+            segment_vector = line_point2 - line_point1
+            segment_vector_length = OgreCollisionDetector._get_position_on_axis(line_point2, segment_vector, line_point1)
+            segment_axis_pos = OgreCollisionDetector._get_position_on_axis(circle_position_new, segment_vector, line_point1)
+            
+            # if we are in a voroni region
+            if segment_axis_pos > 0 and segment_axis_pos < segment_vector_length:
+                # a collision must have occurred in this voroni region since we already know
+                # that new_distance_to_edge <= circle.radius
+                
+                #calcualte rtv
+                rtv_magnitude = circle.radius - new_distance_to_edge + OgreCollisionDetector.SPACING
+                rtv = line_normal * rtv_magnitude
+                return (rtv.x, rtv.z)
+            # if we are not in a voroni region, we have to check to see if a collision occurred with either corner
+            else:
+                p1_axis_pos = 0
+                p2_axis_pos = OgreCollisionDetector._get_position_on_axis(line_point2, segment_vector, line_point1)
+                
+                dp1 = p1_axis_pos - segment_axis_pos
+                dp2 = p2_axis_pos - segment_axis_pos
+                
+                if dp1 < -circle.radius:
+                    return False
+                if dp2 > p2_axis_pos + circle.radius:
+                    return False
+                
+                if dp1 < dp2:
+                    corner = line_point1
+                else:
+                    corner = line_point2
+                
+                rtv_axis = circle_position_new - corner
+                distance_to_corner = OgreCollisionDetector._get_position_on_axis(circle_position_new, rtv_axis, corner)
+                circle_edge_pos = distance_to_corner - circle.radius
+                
+                if circle_edge_pos <=0:
+                    # corner collision occurred
+                    rtv_axis.normalise()
+                    rtv_magnitude = -circle_edge_pos
+                    rtv_magnitude += OgreCollisionDetector.SPACING
+                    rtv = rtv_axis * rtv_magnitude
+                    # return rtv as tuple
+                    return (rtv.x, rtv.z)
+        return False
+                 
+    
+    @staticmethod
+    def _resolve_circle_circle(circle1, circle1_position, circle2, circle2_position):
+        """
+        Returns the Resolution Translation Vector (RTV) that must be applied to the object that owns
+        circle1 in order to resolve the collision, or False if no collision occurred.
+        """
+        # data is the RTV tuple or False
+        data = OgreCollisionDetector._check_circle_circle(circle1, circle1_position, circle2, circle2_position)
+        
+        # no collision occurred if data is False
+        if data is False:
+            return False      
+        # if there was a collision, return the RTV tuple
+        else:
+            # Otherwise the circles are overlapping and we have collision and we
+            # must calculate the resolution vector (how much to backtrack to not be
+            # in collision).
+          
+            # Calculate the x and z differences between circle1 and circle2.
+            dx = circle1_position.x - circle2_position.x
+            dz = circle1_position.z - circle2_position.z
+            
+            # Calculate circle2's angle relative to circle1.
+            theta = math.atan2(-dz, dx)
+            
+            # Calculate how far away we need to move the center of circle1 from the
+            # center of circle2 overlapping with anymore.
+            move_distance = circle1.radius + circle2.radius + OgreCollisionDetector.SPACING
+            
+            # Calculate the point (absolute map coordinates) where we need to be
+            # to not be overlapping.
+            resolutionPoint = ogre.Vector3(circle2_position.x + move_distance * math.cos(theta),
+                                           0,
+                                           circle2_position.z + move_distance * -math.sin(theta))
+            
+            # Calculate the backtrack vector required used to move from our current
+            # position to get to our resolution point (where we are no longer
+            # overlapping).
+            rtv = (resolutionPoint.x - circle1_position.x, resolutionPoint.z - circle1_position.z)
+            
+            # return our value
+            return rtv
+    
+    @staticmethod
+    def _get_position_on_axis(point, axis_vector, axis_vector_pos):
+        """
+        returns the scalar position of "point" along the axis specified by
+        axis_vector originating from position axis_vector_pos
+        
+        the axis_vector does not need to be normalised before passing it to
+        this function
+        """
+        axis_vector.normalise()
+        point_vector = point - axis_vector_pos
+        return point_vector.dotProduct(axis_vector)
+    
+    @staticmethod
+    def _is_between_on_axis(point_to_check, endpoint_1, endpoint_2, axis_vector):
+        """
+        determines whether point_to_check lies between endpoint_1 and endpoint_2
+        on an arbitrary axis defined by axis_vector
+        """
+        res_dp = _get_position_on_axis(point_to_check, axis_vector)
+        res_ep1 = _get_position_on_axis(endpoint_1, axis_vector)
+        res_ep2 = _get_position_on_axis(endpoint_2, axis_vector)
+        
+        return (res_dp > res_ep1 and res_dp < res_ep2) or (res_dp < res_ep1 and res_dp > res_ep2)
+        
+        
+    @staticmethod
+    def _resolve_circle_rectangle(circle, circle_position_new, circle_position_old, rect, rect_position):
+        """
+        Checks collision between a circle and a rectangle. If a collision exists, it will return the
+        correction vector for the circle. If a collision does not exist, it returns False.
+        """
+        # determine if circle is in voroni region or not, and if it is, determine which segment's voroni 
+        segments = []       
+        for side in rect.sides:
+            axis_pos = OgreCollisionDetector._get_position_on_axis(circle_position_old, _vector(side.normal), _vector(side.point1) + rect_position)
+            if axis_pos >= 0:
+                segments.append(side)
+        if len(segments) == 0:
+            raise Exception("Circle moved from inside the rectangle.")
+        # if in voroni region...
+        elif len(segments) == 1:
+            # calculate the rtv for this voroni region
+            distance_to_edge = OgreCollisionDetector._get_position_on_axis(circle_position_new, _vector(segments[0].normal), _vector(segments[0].point1) + rect_position)
+            if distance_to_edge < circle.radius:
+                # return the rtv
+                rtv_magnitude = circle.radius - distance_to_edge
+                rtv = _vector(segments[0].normal) * (math.fabs(rtv_magnitude) + OgreCollisionDetector.SPACING)
+                res = circle_position_new + rtv            
+                return  (rtv.x, rtv.z)
+            
+        # else if not in voroni region...
+        elif len(segments) == 2:
+            # get the axis
+            axis = circle_position_new - rect_position
+            axis.normalise()
+            
+            # get the corner closest to the circle
+            point1 = _vector(segments[0].point1) + rect_position
+            point2 = _vector(segments[0].point1) + _vector(segments[0].vector) + rect_position
+            
+            dp1 = OgreCollisionDetector._get_position_on_axis(point1, axis, rect_position)
+            dp2 = OgreCollisionDetector._get_position_on_axis(point2, axis, rect_position)
+            
+            if dp1 > dp2:
+                corner = point1
+            else:
+                corner = point2
+                
+            
+            distance = OgreCollisionDetector._get_xz_distance(circle_position_new, corner)
+            
+            # check for collision
+            circle_edge_pos = distance - circle.radius
+            if circle_edge_pos <= 0:
+                # collision occurred
+                
+                # calculate rtv
+                rtv_axis = circle_position_new - corner
+                rtv_axis.normalise()
+                rtv_magnitude = -circle_edge_pos
+                rtv_magnitude += OgreCollisionDetector.SPACING
+                rtv = rtv_axis * rtv_magnitude
+                # return rtv as tuple
+                return (rtv.x, rtv.z)
+            else:
+                return False
+        
+        return False  
+
+    @staticmethod
+    def _get_xz_distance(point1, point2):
+        """
+        Returns the distance between two ogre.Vector3 objects.
+        """
+        dx = point2.x - point1.x
+        dz = point2.z - point1.z
+        return math.sqrt(dx*dx + dz*dz)
+    
+    @staticmethod
+    def normalise_vector(tuple_vector):
+        vector = ogre.Vector3(tuple_vector[0], 0, tuple_vector[1])
+        vector.normalise()
+        return (vector.x, vector.z)
\ No newline at end of file
@@ -7,7 +7,11 @@ class Scene(object):
     def __init__(self, world):
         self.world = world
         
-    def generate_spawn_position(self):
+    def generate_spawn_position(self, player=None):
+        """
+        Returns the position the given player (or None if not known) should
+        spawn at.
+        """
         return (0, 0)
         
     def _setup_level_boundaries(self, filepath):
@@ -29,6 +33,10 @@ class Scene(object):
                 
                 boundary_wall = gamestate.objects.GameObject(self.world)
                 boundary_wall.isPassable = False
+                boundary_wall.is_static = True
+                boundary_wall.collision_category = gamestate.collision.CATEGORY_WALL
+                boundary_wall.collision_mask = gamestate.collision.CATEGORY_ALL & \
+                    ~gamestate.collision.CATEGORY_WALL
                 boundary_wall.position = point1
                 
                 boundary_wall.bounding_shape = gamestate.collision.BoundingLineSegment(point1, point2, normal)
@@ -61,7 +69,8 @@ class TestScene(Scene):
         self.spawn_locations.append((0, 80))
         
         # Add boundary lines for map walls.
-        self._setup_level_boundaries(os.path.join("media", "levelbounds.bounds"))
+        bounds_filepath = os.path.join("media", "levelbounds.bounds")
+        self._setup_level_boundaries(bounds_filepath)
         
         # Add static volcanos
         volcano_positions = [(0, 0), (440, 0), (-440, 440), (-200, -400),
@@ -70,9 +79,44 @@ class TestScene(Scene):
             v = gamestate.objects.GameObject(self.world)
             v.type = "volcano"
             v.isPassable = False
-            v.bounding_shape = gamestate.collision.BoundingCircle(30)
+            v.is_static = True
+            v.collision_category = gamestate.collision.CATEGORY_WALL
+            v.collision_mask = gamestate.collision.CATEGORY_ALL & \
+                ~gamestate.collision.CATEGORY_WALL
+            v.bounding_shape = gamestate.collision.BoundingCircle.get(30)
             v.position = pos
             self.world.add_object(v)
+        
+        # The walls and volcanos never move, so build the static index now
+        # that they have all been added.
+        self.world.build_static_index()
+        
+        # Load (or build and cache) the distance field of the walls and
+        # volcanos.
+        self.world.build_distance_field(gamestate.distancefield.get_cache_key(
+            bounds_filepath, [(pos, 30) for pos in volcano_positions]))
     
-    def generate_spawn_position(self):
-        return random.choice(self.spawn_locations)
\ No newline at end of file
+    def generate_spawn_position(self, player=None):
+        """
+        Returns the spawn location that is furthest from the closest living
+        enemy of the given player (or a random spawn location if there are no
+        living enemies).
+        """
+        best_locations = []
+        best_distance = None
+        for location in self.spawn_locations:
+            enemies = self.world.nearest(location, None,
+                                         gamestate.collision.CATEGORY_PLAYER, 1,
+                                         [player], lambda enemy: not enemy.is_dead)
+            if len(enemies) == 0:
+                # There are no living enemies anywhere.
+                return random.choice(self.spawn_locations)
+            dx = enemies[0].position[0] - location[0]
+            dz = enemies[0].position[1] - location[1]
+            distance = dx * dx + dz * dz
+            if best_distance is None or distance > best_distance:
+                best_locations = [location]
+                best_distance = distance
+            elif distance == best_distance:
+                best_locations.append(location)
+        return random.choice(best_locations)
\ No newline at end of file
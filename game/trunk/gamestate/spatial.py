@@ -0,0 +1,523 @@
+"""
+The spatial module contains the spatial indexes the World uses to find the
+game objects near a shape without having to look at every object in the
+world.
+"""
+
+from __future__ import division
+import math
+import heapq
+
+class SpatialHash(object):
+    """
+    A uniform grid spatial hash. Every indexed object is stored in each grid
+    cell that its bounding shape's axis-aligned bounding box (at the object's
+    current position) overlaps. Querying an area then only has to look at the
+    objects stored in the cells that area overlaps.
+
+    Query results are returned in the order objects were inserted so that
+    collision handling stays deterministic (i.e., the same order the objects
+    appear in World.objects).
+    """
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        # (cell x, cell z) -> set of objects in that cell
+        self._cells = { }
+        # object -> (cell range, insertion order)
+        self._entries = { }
+        # object -> insertion order, to sort query results by
+        self._orders = { }
+        self._insert_count = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, object):
+        return object in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def _get_cell_range(self, left, top, right, bottom):
+        """
+        Returns the (min x, min z, max x, max z) range of cells that the given
+        axis-aligned bounding box overlaps.
+        """
+        size = self.cell_size
+        return (int(left // size), int(top // size),
+                int(right // size), int(bottom // size))
+
+    def _get_object_cell_range(self, object):
+        return self._get_cell_range(
+            *object.bounding_shape.get_AABB(object.position))
+
+    def insert(self, object):
+        """
+        Adds an object to the index. The object must have a bounding shape.
+        """
+        if object in self._entries:
+            self.update(object)
+            return
+        cell_range = self._get_object_cell_range(object)
+        self._insert_count += 1
+        self._entries[object] = (cell_range, self._insert_count)
+        self._orders[object] = self._insert_count
+        self._add_to_cells(object, cell_range)
+
+    def remove(self, object):
+        """ Removes an object from the index if it is in the index. """
+        entry = self._entries.pop(object, None)
+        if entry is not None:
+            del self._orders[object]
+            self._remove_from_cells(object, entry[0])
+
+    def update(self, object):
+        """
+        Updates the cells an object is stored in (or adds the object if it
+        isn't in the index yet). This must be called whenever an indexed
+        object's position or bounding shape changes.
+        """
+        entry = self._entries.get(object)
+        if entry is None:
+            self.insert(object)
+            return
+        cell_range = entry[0]
+        # (_get_object_cell_range() inlined, as this is called on every move.
+        # The floored values are only converted to ints when the cells have
+        # changed: until then they compare equal to the ints in cell_range.)
+        shape = object.bounding_shape
+        x, z = object.position
+        size = self.cell_size
+        x1 = (shape.aabb_left + x) // size
+        z1 = (shape.aabb_top + z) // size
+        x2 = (shape.aabb_right + x) // size
+        z2 = (shape.aabb_bottom + z) // size
+        if x1 == cell_range[0] and z1 == cell_range[1] and \
+            x2 == cell_range[2] and z2 == cell_range[3]:
+            # The object is still in the same cells so there is nothing to do.
+            return
+        new_cell_range = (int(x1), int(z1), int(x2), int(z2))
+        self._remove_from_cells(object, cell_range)
+        self._add_to_cells(object, new_cell_range)
+        self._entries[object] = (new_cell_range, entry[1])
+
+    def query(self, left, top, right, bottom):
+        """
+        Returns a list of the indexed objects stored in any of the cells that
+        the given axis-aligned bounding box overlaps. The objects returned are
+        only candidates - their bounding shapes may not actually overlap the
+        given area.
+        """
+        size = self.cell_size
+        x1 = left // size
+        z1 = top // size
+        x2 = right // size
+        z2 = bottom // size
+        cells = self._cells
+        if x1 == x2 and z1 == z2:
+            # Fast path for the very common single cell query. (The floored
+            # values hash and compare the same as the ints in the keys.)
+            cell = cells.get((x1, z1))
+            if cell is None:
+                return []
+            candidates = cell
+        elif (x2 - x1 + 1) * (z2 - z1 + 1) > len(cells):
+            # The area covers more cells than are in use (e.g., a query
+            # expanded by how far objects can have moved), so it's quicker to
+            # look through the cells in use.
+            candidates = set()
+            for (x, z), cell in cells.iteritems():
+                if x1 <= x <= x2 and z1 <= z <= z2:
+                    candidates.update(cell)
+        else:
+            candidates = set()
+            for x in xrange(int(x1), int(x2) + 1):
+                for z in xrange(int(z1), int(z2) + 1):
+                    cell = cells.get((x, z))
+                    if cell is not None:
+                        candidates.update(cell)
+        if len(candidates) < 2:
+            return list(candidates)
+        return sorted(candidates, key=self._orders.__getitem__)
+
+    def walk_segment(self, point1, point2, radius=0):
+        """
+        Walks the grid cells crossed by the line segment from point1 to point2
+        in order (using a DDA grid traversal) and yields an (exit time,
+        objects) tuple for each one. The objects are those stored in the cell
+        (or, if radius is given, in any cell close enough to the cell to be
+        within radius of the segment) that have not been yielded yet, and the
+        exit time is the fraction of the segment (0 to 1) at which it leaves
+        the cell. An object that is not yielded by the time the walk has left
+        a cell can only be crossed by the segment after the exit time, so the
+        walk can be stopped as soon as a hit closer than that has been found.
+        """
+        size = self.cell_size
+        x1, z1 = point1
+        x2, z2 = point2
+        dx = x2 - x1
+        dz = z2 - z1
+        x = int(x1 // size)
+        z = int(z1 // size)
+        end_x = int(x2 // size)
+        end_z = int(z2 // size)
+        # The time at which the segment crosses the next cell boundary along
+        # each axis and the time it takes to cross a whole cell.
+        if dx > 0:
+            step_x = 1
+            time_x = ((x + 1) * size - x1) / dx
+            delta_x = size / dx
+        elif dx < 0:
+            step_x = -1
+            time_x = (x * size - x1) / dx
+            delta_x = -size / dx
+        else:
+            step_x = 0
+            time_x = delta_x = float("inf")
+        if dz > 0:
+            step_z = 1
+            time_z = ((z + 1) * size - z1) / dz
+            delta_z = size / dz
+        elif dz < 0:
+            step_z = -1
+            time_z = (z * size - z1) / dz
+            delta_z = -size / dz
+        else:
+            step_z = 0
+            time_z = delta_z = float("inf")
+
+        # Cells within this many cells of a cell the segment crosses may hold
+        # objects within radius of the segment.
+        reach = int(math.ceil(radius / size))
+        cells = self._cells
+        seen = set()
+        # The segment crosses one cell plus one for each cell boundary.
+        for i in xrange(abs(end_x - x) + abs(end_z - z) + 1):
+            found = []
+            for cell_x in xrange(x - reach, x + reach + 1):
+                for cell_z in xrange(z - reach, z + reach + 1):
+                    cell = cells.get((cell_x, cell_z))
+                    if cell is None:
+                        continue
+                    for object in cell:
+                        if object not in seen:
+                            seen.add(object)
+                            found.append(object)
+            yield min(time_x, time_z, 1), found
+            # (Never step past the end cell along an axis, which rounding
+            # errors could otherwise cause.)
+            if x != end_x and (time_x < time_z or z == end_z):
+                x += step_x
+                time_x += delta_x
+            else:
+                z += step_z
+                time_z += delta_z
+
+    def query_segment(self, point1, point2, radius=0):
+        """
+        Returns a list of the indexed objects stored in the cells that are
+        within radius of the line segment from point1 to point2 (see
+        walk_segment()). For long segments this looks at far fewer cells than
+        a query of the segment's bounding box.
+        """
+        candidates = []
+        for exit_time, objects in self.walk_segment(point1, point2, radius):
+            candidates.extend(objects)
+        return sorted(candidates, key=self._orders.__getitem__)
+
+    def nearest(self, position, get_distance, k=1, max_distance=None, accept=None):
+        """
+        Returns a list of up to k (distance, object) tuples of the indexed
+        objects closest to the given position, closest first. Only the cells
+        in rings around the position's cell are searched, moving outwards
+        until no unsearched object can be closer than the ones found.
+
+        Arguments:
+        position -- The (x, z) position to search from.
+        get_distance -- A function returning the distance from position to an
+            object. It must never be less than the distance from position to
+            the object's axis-aligned bounding box, since the search stops
+            once every unsearched cell is further away than the objects
+            found.
+        k -- The number of objects to return.
+        max_distance -- If given, objects further away than this are not
+            returned.
+        accept -- If given, only objects for which accept(object) is True are
+            returned.
+        """
+        size = self.cell_size
+        x, z = position
+        center_x = int(x // size)
+        center_z = int(z // size)
+        # The distance from the position to the nearest edge of its own cell.
+        edge_distance = min(x - center_x * size, (center_x + 1) * size - x,
+                            z - center_z * size, (center_z + 1) * size - z)
+        cells = self._cells
+        entries = self._entries
+        seen = set()
+        found = []
+        ring = 0
+        while True:
+            if ring == 0:
+                ring_cells = ((center_x, center_z),)
+            else:
+                ring_cells = self._get_ring(center_x, center_z, ring)
+            for key in ring_cells:
+                cell = cells.get(key)
+                if cell is None:
+                    continue
+                for object in cell:
+                    if object in seen:
+                        continue
+                    seen.add(object)
+                    if accept is not None and not accept(object):
+                        continue
+                    distance = get_distance(object)
+                    if max_distance is not None and distance > max_distance:
+                        continue
+                    heapq.heappush(found, (distance, entries[object][1], object))
+
+            # Every object that has not been seen yet is at least this far
+            # away (it is entirely outside the rings searched so far).
+            bound = edge_distance + ring * size
+            if len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= bound:
+                break
+            if max_distance is not None and bound > max_distance:
+                break
+            if len(seen) == len(entries):
+                break
+            ring += 1
+
+        return [(distance, object) for distance, order, object in
+                heapq.nsmallest(k, found)]
+
+    def _get_ring(self, center_x, center_z, ring):
+        """
+        Returns the keys of the cells exactly ring cells away from the given
+        center cell (the border of the square of cells around it).
+        """
+        keys = []
+        for x in xrange(center_x - ring, center_x + ring + 1):
+            keys.append((x, center_z - ring))
+            keys.append((x, center_z + ring))
+        for z in xrange(center_z - ring + 1, center_z + ring):
+            keys.append((center_x - ring, z))
+            keys.append((center_x + ring, z))
+        return keys
+
+    def _add_to_cells(self, object, cell_range):
+        x1, z1, x2, z2 = cell_range
+        cells = self._cells
+        for x in xrange(x1, x2 + 1):
+            for z in xrange(z1, z2 + 1):
+                cell = cells.get((x, z))
+                if cell is None:
+                    cell = cells[(x, z)] = set()
+                cell.add(object)
+
+    def _remove_from_cells(self, object, cell_range):
+        x1, z1, x2, z2 = cell_range
+        cells = self._cells
+        for x in xrange(x1, x2 + 1):
+            for z in xrange(z1, z2 + 1):
+                cell = cells[(x, z)]
+                cell.discard(object)
+                if len(cell) == 0:
+                    del cells[(x, z)]
+
+
+class BoundingVolumeHierarchy(object):
+    """
+    An immutable bounding volume hierarchy (a binary tree of axis-aligned
+    bounding boxes) over a set of objects that never move, such as level walls
+    and obstacles. The tree is built once when it is created; if the set of
+    static objects changes a new hierarchy must be built.
+
+    Query results are returned in the order the objects were given when the
+    hierarchy was built.
+    """
+    # The maximum number of objects stored in a leaf node.
+    leaf_size = 8
+
+    def __init__(self, objects):
+        # Each entry is (left, top, right, bottom, order, object).
+        entries = []
+        for order, object in enumerate(objects):
+            left, top, right, bottom = object.bounding_shape.get_AABB(object.position)
+            entries.append((left, top, right, bottom, order, object))
+        self._size = len(entries)
+        self._root = self._build(entries) if entries else None
+
+    def __len__(self):
+        return self._size
+
+    def _build(self, entries):
+        """
+        Recursively builds the tree. Nodes are tuples of:
+        (left, top, right, bottom, child1, child2, leaf entries)
+        where leaf entries is None for inner nodes.
+        """
+        left = min(entry[0] for entry in entries)
+        top = min(entry[1] for entry in entries)
+        right = max(entry[2] for entry in entries)
+        bottom = max(entry[3] for entry in entries)
+        if len(entries) <= self.leaf_size:
+            return (left, top, right, bottom, None, None, tuple(entries))
+        # Split at the median of the longest axis of the node's bounding box.
+        if right - left >= bottom - top:
+            entries.sort(key=lambda entry: entry[0] + entry[2])
+        else:
+            entries.sort(key=lambda entry: entry[1] + entry[3])
+        middle = len(entries) // 2
+        return (left, top, right, bottom,
+                self._build(entries[:middle]), self._build(entries[middle:]),
+                None)
+
+    def _collect(self, left, top, right, bottom, overlaps=None):
+        """
+        Returns the leaf entries whose bounding boxes overlap the given
+        axis-aligned bounding box, skipping every subtree whose bounding box
+        does not. If given, overlaps(left, top, right, bottom) is a further
+        test each matching leaf entry's bounding box must pass.
+        """
+        found = []
+        if self._root is None:
+            return found
+        stack = [self._root]
+        pop = stack.pop
+        push = stack.append
+        while stack:
+            node = pop()
+            if node[0] > right or node[2] < left or node[1] > bottom or node[3] < top:
+                continue
+            entries = node[6]
+            if entries is None:
+                push(node[5])
+                push(node[4])
+                continue
+            for entry in entries:
+                if entry[0] > right or entry[2] < left or entry[1] > bottom or entry[3] < top:
+                    continue
+                if overlaps is None or overlaps(entry[0], entry[1], entry[2], entry[3]):
+                    found.append(entry)
+        return found
+
+    def _get_objects(self, entries):
+        """ Returns the objects of the given entries in their build order. """
+        if len(entries) > 1:
+            entries.sort(key=lambda entry: entry[4])
+        return [entry[5] for entry in entries]
+
+    def query(self, left, top, right, bottom):
+        """
+        Returns the objects whose bounding boxes overlap the given axis-aligned
+        bounding box.
+        """
+        return self._get_objects(self._collect(left, top, right, bottom))
+
+    def query_circle(self, center, radius):
+        """
+        Returns the objects whose bounding boxes overlap the circle of the
+        given radius centered at center.
+        """
+        x, z = center
+        radius_squared = radius * radius
+        def overlaps(l, t, r, b):
+            # Find the distance from the center to the closest point of the box.
+            dx = l - x if x < l else (x - r if x > r else 0)
+            dz = t - z if z < t else (z - b if z > b else 0)
+            return dx * dx + dz * dz <= radius_squared
+        return self._get_objects(self._collect(x - radius, z - radius,
+            x + radius, z + radius, overlaps))
+
+    def query_cone(self, center, radius, orientation, width):
+        """
+        Returns the objects whose bounding boxes overlap the cone (circle
+        sector) of the given radius, orientation and width centered at center.
+        A box is only rejected if it is entirely outside the cone's circle or
+        entirely behind the cone.
+        """
+        x, z = center
+        radius_squared = radius * radius
+        # Boxes entirely on the far side of the line through the center that
+        # is perpendicular to the cone's direction can't overlap the cone
+        # (only valid for cones less than half a circle wide).
+        half_width = width / 2
+        check_behind = half_width <= math.pi / 2
+        dir_x = math.cos(orientation)
+        dir_z = math.sin(orientation)
+        def overlaps(l, t, r, b):
+            dx = l - x if x < l else (x - r if x > r else 0)
+            dz = t - z if z < t else (z - b if z > b else 0)
+            if dx * dx + dz * dz > radius_squared:
+                return False
+            if check_behind:
+                # The box corner furthest along the cone's direction.
+                far_x = (r if dir_x >= 0 else l) - x
+                far_z = (b if dir_z >= 0 else t) - z
+                if far_x * dir_x + far_z * dir_z < 0:
+                    return False
+            return True
+        return self._get_objects(self._collect(x - radius, z - radius,
+            x + radius, z + radius, overlaps))
+
+    def query_segment(self, point1, point2, radius=0):
+        """
+        Returns the objects whose bounding boxes (grown by radius on every
+        side) are crossed by the line segment from point1 to point2.
+        """
+        x1, z1 = point1
+        x2, z2 = point2
+        dx = x2 - x1
+        dz = z2 - z1
+        def overlaps(l, t, r, b):
+            # Slab test of the segment against the grown box.
+            l -= radius
+            t -= radius
+            r += radius
+            b += radius
+            t_min, t_max = 0.0, 1.0
+            for start, delta, low, high in ((x1, dx, l, r), (z1, dz, t, b)):
+                if delta == 0:
+                    if start < low or start > high:
+                        return False
+                    continue
+                t1 = (low - start) / delta
+                t2 = (high - start) / delta
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                if t1 > t_min:
+                    t_min = t1
+                if t2 < t_max:
+                    t_max = t2
+                if t_min > t_max:
+                    return False
+            return True
+        # Subtrees are culled by the segment's (grown) bounding box and only
+        # the leaf entries get the exact slab test. The slab test is skipped
+        # for segments no longer than radius, whose grown bounding box is
+        # already nearly as tight.
+        if abs(dx) <= radius and abs(dz) <= radius:
+            overlaps = None
+        return self._get_objects(self._collect(
+            min(x1, x2) - radius, min(z1, z2) - radius,
+            max(x1, x2) + radius, max(z1, z2) + radius, overlaps))
+
+    def query_shape(self, shape, position):
+        """
+        Returns the objects whose bounding boxes may overlap the given bounding
+        shape at the given position, using the tightest query for the shape's
+        type.
+        """
+        if shape.type == "circle":
+            return self.query_circle(position, shape.radius)
+        elif shape.type == "annulus":
+            return self.query_circle(position, shape.outer_radius)
+        elif shape.type == "cone":
+            return self.query_cone(position, shape.radius, shape.orientation,
+                                   shape.width)
+        elif shape.type == "linesegment":
+            return self.query_segment(
+                (position[0], position[1]),
+                (position[0] + shape.vector[0], position[1] + shape.vector[1]))
+        return self.query(*shape.get_AABB(position))
@@ -1,5 +1,10 @@
 from __future__ import division
+import math
+from collections import deque
+import collision
 from collision import CollisionDetector
+from spatial import SpatialHash, BoundingVolumeHierarchy
+from distancefield import DistanceField
 
 from event import Event
 
@@ -12,12 +17,43 @@ class World(object):
         self.is_master = master
         self.objects = []
         self.objects_hash = { }
+        self.spatial_index = SpatialHash()
+        # Zones (see objects.ZoneObject) are kept in an index of their own as
+        # nothing collides with them. It is used to tell them when an object
+        # near them moves.
+        self.zone_index = SpatialHash()
+        self.static_objects = []
+        self.static_index = BoundingVolumeHierarchy([])
+        self.static_categories = 0
+        # The distance field of the impassable static objects, or None if it
+        # has not been built (see build_distance_field()).
+        self.distance_field = None
         self.object_id_pos = 0
         self.object_added = Event()
         self.object_removed = Event()
         self.world_updated = Event()
         self.debug_file = open("world.log", "w")
         self.time = 0
+        # get_colliders() tests its candidates with the CollisionDetector
+        # batch routines (when NumPy is available) once there are at least
+        # this many of them. Below this the cost of packing the arrays is
+        # higher than testing the candidates one at a time.
+        self.batch_minimum = 8
+        # The recent positions of the moving objects in a master world, for
+        # get_colliders_at() to rewind them to. Each object's history is a
+        # ring of its positions after the last history_size updates (0.64
+        # seconds at the server's default 100 updates a second).
+        self.history_size = 64
+        self.position_history = { }
+        # The (time, distance) of each of those updates, where distance is
+        # the furthest any moving object moved since the update before, and
+        # the furthest any has moved since the last update (squared). Summed
+        # up they bound how far an object can be from where it was at an
+        # earlier time, so get_colliders_at() only has to rewind the objects
+        # within that distance.
+        self.history_steps = deque(maxlen=self.history_size)
+        self.unrecorded_step_squared = 0
+        self.reset_solver_stats()
         
     def generate_id(self):
         self.object_id_pos += 1
@@ -38,27 +74,339 @@ class World(object):
         self.objects.append(object)
         self.objects_hash[object.object_id] = object
         object.is_active = True
+        if object.is_static:
+            self.static_objects.append(object)
+            if len(self.static_index) > 0:
+                # The static index has already been built so it needs to be
+                # rebuilt to include this object.
+                self.build_static_index()
+            # The distance field no longer matches the static objects.
+            self.distance_field = None
+        else:
+            self.index_object(object)
         self.object_added(object)
     
     def remove_object(self, object):
         # Remove the object
         self.objects.remove(object)
         del self.objects_hash[object.object_id]
+        if object.is_static:
+            self.static_objects.remove(object)
+            self.build_static_index()
+            self.distance_field = None
+        elif object.collision_category == collision.CATEGORY_ZONE:
+            self.zone_index.remove(object)
+            object.clear_occupants()
+        else:
+            self.spatial_index.remove(object)
+            self.position_history.pop(object, None)
         object.is_active = False
+        if len(object.zones) > 0:
+            # The zones the object was in have to find out it has gone.
+            self._notify_zones(object)
         self.object_removed(object)
         
+    def build_static_index(self):
+        """
+        Builds the bounding volume hierarchy of the world's static objects
+        (objects that never move, such as level walls and obstacles). This
+        should be called once after the scene has added its static objects.
+        """
+        self.static_index = BoundingVolumeHierarchy(
+            [object for object in self.static_objects
+                if object.bounding_shape is not None])
+        # The collision categories of the objects in the static index, so
+        # that queries for other categories can skip it.
+        self.static_categories = 0
+        for object in self.static_objects:
+            self.static_categories |= object.collision_category
+        
+    def build_distance_field(self, cache_key=None):
+        """
+        Builds the distance field of the world's impassable static objects,
+        which MobileObjects use to keep clear of the level's geometry. This
+        should be called once after the scene has added its static objects.
+        
+        Arguments:
+        cache_key -- If given, the field is loaded from the cache under this
+            key (see distancefield.get_cache_key()) instead of being built,
+            or cached under it once built.
+        """
+        objects = [object for object in self.static_objects
+            if not object.isPassable and object.bounding_shape is not None]
+        if cache_key is None:
+            self.distance_field = DistanceField.build(objects)
+        else:
+            self.distance_field = DistanceField.load_or_build(objects, cache_key)
+        
+    def index_object(self, object):
+        """
+        Adds, updates or removes an object in the world's spatial index (or
+        a zone in the zone index). This is called by game objects whenever
+        their position or bounding shape changes.
+        """
+        if object.is_static:
+            # Static objects are kept in the static index instead.
+            return
+        if object.collision_category == collision.CATEGORY_ZONE:
+            index = self.zone_index
+        else:
+            index = self.spatial_index
+        if object.bounding_shape is None:
+            # Objects without a bounding shape can't collide with anything so
+            # they don't need to be indexed.
+            index.remove(object)
+        else:
+            # (This adds the object if it isn't in the index yet.)
+            index.update(object)
+            if index is self.spatial_index and self.is_master:
+                self._record_step(object)
+        if index is self.spatial_index and \
+            (len(self.zone_index) > 0 or len(object.zones) > 0):
+            self._notify_zones(object)
+    
+    def _record_step(self, object):
+        """
+        Keeps track of the furthest a moving object has moved since its
+        position was last recorded (see record_positions()).
+        """
+        positions = self.position_history.get(object)
+        if positions is not None:
+            x, z = positions[-1][1]
+            dx = object.position[0] - x
+            dz = object.position[1] - z
+            step_squared = dx * dx + dz * dz
+            if step_squared > self.unrecorded_step_squared:
+                self.unrecorded_step_squared = step_squared
+    
+    def _notify_zones(self, object):
+        """
+        Tells the zones an object is in, and the zones it may now be in, that
+        it has moved (or changed its bounding shape or left the world) so
+        that they check whether it is in them on their next update.
+        """
+        zones = object.zones
+        if object.is_active and object.bounding_shape is not None:
+            nearby_zones = self.zone_index.query(
+                *object.bounding_shape.get_AABB(object.position))
+            if len(nearby_zones) > 0:
+                zones = zones.union(nearby_zones)
+        for zone in zones:
+            zone.object_moved(object)
+    
+    def get_nearby_objects(self, left, top, right, bottom, include_static=True):
+        """
+        Returns a list of the objects (with bounding shapes) that may be
+        overlapping the given axis-aligned bounding box. This is a cheap
+        broadphase test - the returned objects still need to be tested with
+        the CollisionDetector. Static objects are left out if include_static
+        is False.
+        """
+        nearby_objects = self.spatial_index.query(left, top, right, bottom)
+        if not include_static:
+            return nearby_objects
+        return self.static_index.query(left, top, right, bottom) + nearby_objects
+    
+    def get_nearby_objects_along(self, bounding_shape, start, end, include_static=True):
+        """
+        Returns a list of the objects that may collide with the given bounding
+        shape as it moves from start to end. Static objects are found with a
+        segment query of the static index (unless include_static is False) and
+        moving objects with a walk of the spatial index's cells along the
+        segment.
+        """
+        # Grow the segment query by the shape's extent from its position.
+        extent = max(abs(bounding_shape.aabb_left), abs(bounding_shape.aabb_top),
+                     abs(bounding_shape.aabb_right), abs(bounding_shape.aabb_bottom))
+        nearby_objects = self.spatial_index.query_segment(start, end, extent)
+        if not include_static:
+            return nearby_objects
+        return self.static_index.query_segment(start, end, extent) + nearby_objects
+        
+    def reset_solver_stats(self):
+        """
+        Resets the counts of how much work MobileObject._move() has done
+        resolving contacts (see record_solver_iterations()).
+        """
+        # moves -- the number of moves solved.
+        # iterations -- the total number of sweeps done by those moves.
+        # max_iterations -- the most sweeps done by any one move.
+        # capped_moves -- the number of moves stopped by the iteration cap.
+        self.solver_stats = { "moves": 0,
+                              "iterations": 0,
+                              "max_iterations": 0,
+                              "capped_moves": 0 }
+    
+    def record_solver_iterations(self, iterations, capped):
+        """
+        Records the number of sweeps a MobileObject._move() needed to resolve
+        its contacts and whether it hit its iteration cap.
+        """
+        stats = self.solver_stats
+        stats["moves"] += 1
+        stats["iterations"] += iterations
+        if iterations > stats["max_iterations"]:
+            stats["max_iterations"] = iterations
+        if capped:
+            stats["capped_moves"] += 1
+        
     def update(self, dt):
         self.world_updated(dt)
         
         self.time += dt
         for gameObject in self.objects:
             gameObject.update(dt)
+        
+        if self.is_master:
+            self.record_positions()
+    
+    def record_positions(self):
+        """
+        Adds the current position of each moving object in the spatial index
+        (each one with a bounding shape, other than zones) to its position
+        history, dropping the oldest once it has
+        history_size of them.
+        """
+        time = self.time
+        history = self.position_history
+        for object in self.spatial_index:
+            positions = history.get(object)
+            if positions is None:
+                positions = history[object] = deque(maxlen=self.history_size)
+            positions.append((time, object.position))
+        self.history_steps.append((time, math.sqrt(self.unrecorded_step_squared)))
+        self.unrecorded_step_squared = 0
+    
+    def get_position_at(self, object, time):
+        """
+        Returns the position a moving object was at at the given world time,
+        interpolated between the positions in its history, or None if it
+        wasn't in the world yet. Times since the last update give its
+        current position and times before its history starts its oldest
+        position.
+        """
+        positions = self.position_history.get(object)
+        if positions is None or time >= positions[-1][0]:
+            if positions is None and time < self.time:
+                # It has been added since the last update.
+                return None
+            return object.position
+        if time < positions[0][0]:
+            if len(positions) < positions.maxlen:
+                return None
+            return positions[0][1]
+        # Search back from the most recent position, as the time is usually
+        # only a little in the past.
+        for i in xrange(len(positions) - 2, -1, -1):
+            time_a, position_a = positions[i]
+            if time_a <= time:
+                time_b, position_b = positions[i + 1]
+                fraction = (time - time_a) / (time_b - time_a)
+                return (position_a[0] + (position_b[0] - position_a[0]) * fraction,
+                        position_a[1] + (position_b[1] - position_a[1]) * fraction)
             
     def log(self, text):
         self.debug_file.write(text)
         self.debug_file.write("\n")
         
-    def get_colliders(self, bounding_shape, position, ignored=[], typefilter=None):
+    def nearest(self, position, max_radius=None, mask=collision.CATEGORY_ALL, k=1, ignored=[], condition=None):
+        """
+        Returns a list of the (up to) k moving objects closest to the given
+        position, closest first. The distance to an object is measured to
+        the edge of its bounding circle (or to its position for any other
+        bounding shape). Static objects, such as walls, are not included.
+        
+        Arguments:
+        position -- The (x, z) position to search from.
+        max_radius -- If given, only objects within this distance are returned.
+        mask -- The collision categories (see the collision module) of the
+            objects that can be returned.
+        k -- The number of objects to return.
+        ignored -- Objects that should not be returned.
+        condition -- If given, only objects for which condition(object) is
+            True are returned.
+        """
+        x, z = position
+        def get_distance(object):
+            dx = object.position[0] - x
+            dz = object.position[1] - z
+            distance = math.sqrt(dx * dx + dz * dz)
+            if object.bounding_shape.type == "circle":
+                distance = max(distance - object.bounding_shape.radius, 0)
+            return distance
+        def accept(object):
+            if not object.collision_category & mask:
+                return False
+            if object in ignored:
+                return False
+            return condition is None or condition(object)
+        return [object for distance, object in self.spatial_index.nearest(
+            position, get_distance, k, max_radius, accept)]
+        
+    def raycast(self, start, end, mask=collision.CATEGORY_ALL & ~collision.CATEGORY_ZONE,
+                ignored=[], all_hits=False):
+        """
+        Casts a ray from start to end and returns a (distance, object) tuple
+        for the first object it hits, or None if it doesn't hit anything. If
+        all_hits is True a list of (distance, object) tuples for every object
+        the ray hits, closest first, is returned instead. Only objects with
+        circle or line segment bounding shapes can be hit.
+        
+        The static objects along the ray are found with the static index and
+        the moving objects by walking the spatial index's cells from start
+        to end, which stops as soon as no unchecked object could be closer
+        than the closest hit.
+        
+        Arguments:
+        start -- The (x, z) position to cast the ray from.
+        end -- The (x, z) position to cast the ray to.
+        mask -- The collision categories (see the collision module) of the
+            objects that can be hit. Zones are left out by default.
+        ignored -- Objects that the ray passes through.
+        all_hits -- Whether to return every hit instead of the first.
+        """
+        vector = (end[0] - start[0], end[1] - start[1])
+        length = math.sqrt(vector[0] * vector[0] + vector[1] * vector[1])
+        point = collision.BoundingCircle.get(0)
+        hits = []
+        def check(objects):
+            for object in objects:
+                shape = object.bounding_shape
+                if not object.collision_category & mask or object in ignored:
+                    continue
+                if shape.type != "circle" and shape.type != "linesegment":
+                    continue
+                hit = CollisionDetector.get_time_of_impact(point, start, vector,
+                                                           shape, object.position)
+                if hit is not False:
+                    hits.append((hit[0], object))
+        
+        if mask & self.static_categories:
+            check(self.static_index.query_segment(start, end))
+        for exit_time, objects in self.spatial_index.walk_segment(start, end):
+            check(objects)
+            if not all_hits and len(hits) > 0 and \
+                min(hits, key=lambda hit: hit[0])[0] <= exit_time:
+                # Nothing further along the walk can be hit before this.
+                break
+        
+        hits.sort(key=lambda hit: hit[0])
+        hits = [(time * length, object) for time, object in hits]
+        if all_hits:
+            return hits
+        if len(hits) == 0:
+            return None
+        return hits[0]
+    
+    def has_line_of_sight(self, start, end, ignored=[]):
+        """
+        Returns True if nothing in the level (no wall or obstacle) is between
+        the given start and end positions.
+        """
+        return self.raycast(start, end, collision.CATEGORY_WALL, ignored) is None
+        
+    def get_colliders(self, bounding_shape, position, ignored=[],
+                      mask=collision.CATEGORY_ALL & ~collision.CATEGORY_ZONE):
         """
         Returns a list of game objects in the world that are currently
         colliding with the given bounding_shape at the given position. This
@@ -72,20 +420,117 @@ class World(object):
         bounding_shape -- The shape to check objects against.
         position -- The position of the shape to check objects against.
         ignored -- A list of game objects to ignore collision with.
-        typefilter -- A class type that the colliding object must an instance
-            (or derived instance) of.
+        mask -- The collision categories (see the collision module) of the
+            objects that can be collided with. Zones are left out by default
+            (and can only be tested against circles).
         """
+        nearby_objects = self.spatial_index.query(*bounding_shape.get_AABB(position))
+        if mask & self.static_categories:
+            nearby_objects = self.static_index.query_shape(bounding_shape, position) + \
+                nearby_objects
+        # Only collide with objects in the mask's categories that are not
+        # ignored.
+        nearby_objects = [object for object in nearby_objects
+            if object.collision_category & mask and object not in ignored]
+        
+        if CollisionDetector.BATCH_SUPPORTED and \
+            len(nearby_objects) >= self.batch_minimum:
+            return self._get_colliders_batch(bounding_shape, position,
+                                             nearby_objects)
+        
         colliders = []
-        for object in self.objects:
-            if object.bounding_shape is None:
-                # Can't collide with an object that has no bounding shape.
-                continue
-            if typefilter is not None and not isinstance(object, typefilter):
-                # Only collide with filtered objects.
-                continue
-            
+        for object in nearby_objects:
             result = CollisionDetector.check_collision(bounding_shape, position, object.bounding_shape, object.position)
-            if result is not False and object not in ignored:
+            if result is not False:
                 colliders.append(object)
                 
-        return colliders
\ No newline at end of file
+        return colliders
+    
+    def get_colliders_at(self, bounding_shape, position, time, ignored=[],
+                         mask=collision.CATEGORY_ALL & ~collision.CATEGORY_ZONE):
+        """
+        Returns a list of the game objects that were colliding with the given
+        bounding_shape at the given position at an earlier world time, with
+        the moving objects rewound to where they were then (see
+        get_position_at()). Static objects don't move, so they are tested as
+        get_colliders() tests them. Only a master world keeps the histories
+        of positions needed for this; otherwise (or if time isn't in the
+        past) it is the same as get_colliders().
+        
+        The server uses this for lag compensation: a player sees the other
+        objects where they were some time ago, so the abilities they use are
+        tested against the world as it was then.
+        
+        Arguments:
+        bounding_shape -- The shape to check objects against.
+        position -- The position of the shape to check objects against.
+        time -- The world time to rewind the moving objects to.
+        ignored -- A list of game objects to ignore collision with.
+        mask -- The collision categories (see the collision module) of the
+            objects that can be collided with. Zones are left out by default.
+        """
+        if not self.is_master or time >= self.time:
+            return self.get_colliders(bounding_shape, position, ignored, mask)
+        
+        colliders = []
+        if mask & self.static_categories:
+            for object in self.static_index.query_shape(bounding_shape, position):
+                if object.collision_category & mask and object not in ignored and \
+                    CollisionDetector.check_collision(bounding_shape, position,
+                        object.bounding_shape, object.position) is not False:
+                    colliders.append(object)
+        # Only the moving objects that are now within the distance they can
+        # have moved since then (see history_steps) can have been colliding,
+        # so only those are rewound and tested.
+        reach = math.sqrt(self.unrecorded_step_squared)
+        for step_time, step in self.history_steps:
+            if step_time > time:
+                reach += step
+        left, top, right, bottom = bounding_shape.get_AABB(position)
+        for object in self.spatial_index.query(left - reach, top - reach,
+                                               right + reach, bottom + reach):
+            if not object.collision_category & mask or object in ignored:
+                continue
+            object_position = self.get_position_at(object, time)
+            if object_position is not None and \
+                CollisionDetector.check_collision(bounding_shape, position,
+                    object.bounding_shape, object_position) is not False:
+                colliders.append(object)
+        return colliders
+    
+    def _get_colliders_batch(self, bounding_shape, position, nearby_objects):
+        """
+        Does the work of get_colliders() for many nearby objects at once by
+        packing the circles and line segments among them into arrays and
+        testing them with a single CollisionDetector batch call each. Returns
+        the colliders in the same order as nearby_objects.
+        """
+        circles = []
+        segments = []
+        others = []
+        for object in nearby_objects:
+            shape_type = object.bounding_shape.type
+            if shape_type == "circle" and bounding_shape.type in ("circle", "cone", "linesegment"):
+                circles.append(object)
+            elif shape_type == "linesegment" and bounding_shape.type == "circle":
+                segments.append(object)
+            else:
+                others.append(object)
+        
+        hits = set()
+        if len(circles) > 0:
+            mask = CollisionDetector.check_circles(bounding_shape, position,
+                [object.position for object in circles],
+                [object.bounding_shape.radius for object in circles])
+            hits.update(object for object, hit in zip(circles, mask.tolist()) if hit)
+        if len(segments) > 0:
+            mask = CollisionDetector.check_segments(bounding_shape, position,
+                [object.position for object in segments],
+                [object.bounding_shape.vector for object in segments])
+            hits.update(object for object, hit in zip(segments, mask.tolist()) if hit)
+        for object in others:
+            # Shape pairs without a batch routine are tested one at a time.
+            if CollisionDetector.check_collision(bounding_shape, position, object.bounding_shape, object.position):
+                hits.add(object)
+        
+        return [object for object in nearby_objects if object in hits]
\ No newline at end of file
@@ -35,8 +35,17 @@ def main(argv=None):
     # Start the application.
     if len(argv) > 1 and argv[1] == "server":
         # Run as a server.
+        port = 8981
+        tick_rate = 100
+        backend = "twisted"
+        if len(argv) > 2:
+            port = int(argv[2])
+        if len(argv) > 3:
+            tick_rate = float(argv[3])
+        if len(argv) > 4:
+            backend = argv[4]
         try:
-            app = application.ServerApplication()
+            app = application.ServerApplication(port, tick_rate, backend=backend)
             app.go()
         except KeyboardInterrupt:
             try: app.stop()
@@ -52,15 +61,18 @@ def main(argv=None):
         player_name = "Newbie"
         address = "localhost"
         port = 8981
+        transport = "tcp"
         if len(argv) > 1:
             player_name = argv[1]
         if len(argv) > 2:
             address = argv[2]
         if len(argv) > 3:
             port = int(argv[3])
+        if len(argv) > 4:
+            transport = argv[4]
         print "Starting and connecting to %s:%s as %s." % (address, port, player_name)
         try:
-            app = application.ClientApplication(player_name, address, port)
+            app = application.ClientApplication(player_name, address, port, transport)
             app.go()
         except ogre.OgreException, e:
             print e
@@ -3,4 +3,7 @@
 
 import client
 import server
-import packets
\ No newline at end of file
+import packets
+import quantization
+import snapshots
+import interpolation
\ No newline at end of file
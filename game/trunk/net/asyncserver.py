@@ -0,0 +1,136 @@
+"""
+The asyncserver module contains an asyncio based alternative to the Twisted
+GameServer, with the same events and send()/broadcast() interface so that
+ServerApplication can run on either (see net.benchmark to compare them).
+"""
+
+try:
+    import asyncio
+except ImportError:
+    # Python 2 has no asyncio, but trollius is a port of it.
+    import trollius as asyncio
+
+from event import Event
+from framing import PacketFramer, SendBuffer
+
+
+class AsyncServerProtocol(asyncio.Protocol):
+    def __init__(self, factory):
+        self.factory = factory
+        self.transport = None
+        self.player = None
+        self.framer = PacketFramer()
+        self.send_buffer = SendBuffer()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.factory.client_count += 1
+        self.client_id = self.factory.client_count
+        self.factory.clients.append(self)
+        print "New connection #%s client=%s from %s." % \
+            (len(self.factory.clients), self.client_id,
+             transport.get_extra_info("peername"))
+        self.factory.client_connected(self)
+
+    def connection_lost(self, exc):
+        self.factory.clients.remove(self)
+        self.factory.client_disconnected(self)
+        print "Lost connection #%s client=%s from %s." % \
+            (len(self.factory.clients)+1, self.client_id,
+             self.transport.get_extra_info("peername"))
+
+    def data_received(self, data):
+        for packet in self.framer.feed(data):
+            # Hand the packet straight to the game (on the event loop's
+            # thread).
+            self.factory.packet_received(self, packet)
+
+
+class AsyncGameServer(object):
+    """
+    An asyncio version of net.server.GameServer. Everything runs on the event
+    loop's thread: packets are handed to the packet_received event as soon as
+    they are decoded and packets sent with send() and broadcast() are packed
+    into the clients' send buffers, which flush() writes to their transports.
+
+    Events:
+    client_connected(client) -- A client has connected.
+    client_disconnected(client) -- A client has disconnected.
+    packet_received(client, packet) -- A packet has been received.
+    """
+    def __init__(self, world, port, loop=None):
+        self.world = world
+        self.port = port
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        self.client_connected = Event()
+        self.client_disconnected = Event()
+        self.packet_received = Event()
+        self.clients = []
+        self.client_count = 0
+        self.broadcast_buffer = SendBuffer()
+
+    def send(self, client, packet):
+        """ Sends a packet to a single client (on the next flush()). """
+        client.send_buffer.add(packet)
+
+    def broadcast(self, packet, ignore=None):
+        """
+        Sends a packet to every client except the client of the player given
+        as ignore (on the next flush()).
+        """
+        # Pack the packet once and copy it into each client's buffer.
+        packed = self.broadcast_buffer
+        packed.add(packet)
+        data = packed.get_view()
+        for client in self.clients:
+            if client.player is not None and client.player == ignore:
+                continue
+            client.send_buffer.add_data(data)
+        del data
+        packed.clear()
+
+    def flush(self):
+        """
+        Writes the packets sent since the last flush to the clients' transports,
+        a single write for each client.
+        """
+        for client in self.clients:
+            client.send_buffer.flush(client.transport.write)
+
+    def call_repeatedly(self, interval, function):
+        """
+        Calls function every interval seconds on the event loop's thread
+        (once the loop is running) until the server is stopped.
+        """
+        loop = self.loop
+        def call():
+            # Schedule the next call from when this one was due so that
+            # calls don't drift later and later.
+            call.due += interval
+            loop.call_at(call.due, call)
+            function()
+        call.due = loop.time() + interval
+        loop.call_at(call.due, call)
+
+    def go(self):
+        """
+        Starts listening and runs the event loop on the calling thread until
+        stop() is called (or the process is interrupted).
+        """
+        loop = self.loop
+        server = loop.run_until_complete(loop.create_server(
+            lambda: AsyncServerProtocol(self), port=self.port))
+        print "Server starting and listening on port %s." % self.port
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print "Server stopping."
+            server.close()
+            for client in list(self.clients):
+                client.transport.close()
+            loop.run_until_complete(server.wait_closed())
+
+    def stop(self):
+        if self.loop.is_running(): self.loop.stop()
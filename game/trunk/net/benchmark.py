@@ -0,0 +1,384 @@
+"""
+The benchmark module compares the Twisted GameServer (net.server) with the
+asyncio AsyncGameServer (net.asyncserver): how fast each accepts connections
+and how many packets per second each can broadcast to 64 and 256 connected
+clients over loopback (from the start of the broadcast until every client
+has received all of it). Run it from the game's directory with:
+
+    python -m net.benchmark [--connections 64,256] [--packets 1000]
+
+Each server is run in its own process (so the two event loops never share a
+process) while this process connects the clients and reads the broadcasts.
+
+With --framing it instead times decoding bursts of packets (10000 by default)
+received in chunks, with the PacketFramer (net.framing) and with the string
+buffer the protocols used before it.
+
+With --udp it instead runs the UDP transport (net.udp) over loopback with
+datagrams dropped at random in both directions (--loss, 20% by default) and
+checks that every reliable packet arrives once and in order and that the
+unreliable ones are never handed over out of order.
+"""
+
+from __future__ import division
+import sys
+import os
+import select
+import socket
+import subprocess
+import time
+import timeit
+from optparse import OptionParser
+
+from net import packets
+from net.framing import PacketFramer
+
+# The backends that are compared.
+BACKENDS = ["twisted", "asyncio"]
+
+# Lines the server process reports results on start with this.
+RESULT_PREFIX = "RESULT"
+
+
+def _create_server(backend, port):
+    if backend == "asyncio":
+        from net.asyncserver import AsyncGameServer
+        return AsyncGameServer(None, port)
+    from net.server import GameServer
+    return GameServer(None, port)
+
+
+def _get_update_packet():
+    update = packets.ObjectUpdate()
+    update.object_id = 1
+    update.x, update.z = 100.0, -200.0
+    update.rotation = 1.5
+    update.move_speed = 100.0
+    update.move_direction = 0.0
+    update.force_x, update.force_z = 0.0, 0.0
+    update.is_dead = False
+    return update
+
+
+def serve(backend, port, connections, packet_count):
+    """
+    Runs a server with the given backend that waits for the given number of
+    connections, then broadcasts packet_count ObjectUpdate packets to them
+    all at once and stops once they have all disconnected. The accept rate
+    and the time the broadcast calls took are printed as result lines.
+    """
+    server = _create_server(backend, port)
+    accept_times = []
+    update = _get_update_packet()
+
+    def report(name, value):
+        print "%s %s %r" % (RESULT_PREFIX, name, value)
+        sys.stdout.flush()
+
+    def on_client_connected(client):
+        accept_times.append(timeit.default_timer())
+        if len(accept_times) < connections:
+            return
+        if connections > 1:
+            report("accepts/s", (connections - 1) / (accept_times[-1] - accept_times[0]))
+        # The wall clock time is reported as the client process needs to
+        # compare it with the time it received the last of the broadcast.
+        report("broadcast start", time.time())
+        start = timeit.default_timer()
+        for i in xrange(packet_count):
+            server.broadcast(update)
+        server.flush()
+        report("broadcast call s", timeit.default_timer() - start)
+
+    def on_client_disconnected(client):
+        if len(server.clients) == 0 and len(accept_times) >= connections:
+            server.stop()
+
+    server.client_connected += on_client_connected
+    server.client_disconnected += on_client_disconnected
+    server.go()
+
+
+def run(backend, port, connections, packet_count):
+    """
+    Benchmarks a backend by starting its server in another process,
+    connecting the given number of clients to it and receiving its broadcast.
+    Returns a dictionary of the results.
+    """
+    process = subprocess.Popen([sys.executable, "-m", "net.benchmark",
+                                "--serve", backend, "--port", str(port),
+                                "--connections", str(connections),
+                                "--packets", str(packet_count)],
+                               stdout=subprocess.PIPE)
+    try:
+        # Wait for the server to start listening.
+        deadline = time.time() + 10
+        while True:
+            try:
+                probe = socket.create_connection(("127.0.0.1", port))
+                break
+            except socket.error:
+                if time.time() > deadline or process.poll() is not None:
+                    raise Exception("The %s server did not start." % backend)
+                time.sleep(0.05)
+        sockets = [probe]
+        for i in xrange(connections - 1):
+            sockets.append(socket.create_connection(("127.0.0.1", port)))
+
+        # Receive the broadcast on every connection.
+        expected = len(_get_update_packet().pack()) * packet_count
+        received = dict((client, 0) for client in sockets)
+        pending = list(sockets)
+        while pending:
+            readable, writable, errors = select.select(pending, [], [], 10)
+            if not readable:
+                raise Exception("Timed out receiving the %s broadcast." % backend)
+            for client in readable:
+                data = client.recv(65536)
+                if not data:
+                    raise Exception("The %s server closed a connection." % backend)
+                received[client] += len(data)
+                if received[client] >= expected:
+                    pending.remove(client)
+        end = time.time()
+        for client in sockets:
+            client.close()
+
+        output = process.communicate()[0]
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+    results = { }
+    for line in output.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            name, value = line[len(RESULT_PREFIX) + 1:].rsplit(" ", 1)
+            results[name] = float(value)
+    # From the start of the broadcast to the last of it being received.
+    elapsed = end - results.pop("broadcast start")
+    results["broadcast packets/s"] = connections * packet_count / elapsed
+    return results
+
+
+class StringFramer(object):
+    """
+    The string buffer framing the protocols used before the PacketFramer,
+    for comparison: the whole of the rest of the buffer is copied after each
+    packet is decoded (and it is a loop here rather than recursion so that
+    bursts don't hit the recursion limit).
+    """
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, data):
+        self.buffer += data
+        received = []
+        while len(self.buffer) >= 3:
+            header = packets.Packet()
+            header.unpack(self.buffer)
+            if len(self.buffer) < header.size:
+                break
+            received.append(packets.unpack(self.buffer))
+            self.buffer = self.buffer[header.size:]
+        return received
+
+
+def _get_burst(packet_count):
+    """
+    Returns the data of a burst of packet_count packets, a mix of the
+    packets a server receives (player updates and ability requests) and
+    sends (object updates and messages).
+    """
+    player_update = packets.PlayerUpdate()
+    player_update.x, player_update.z = 10.0, 20.0
+    player_update.rotation = 0.5
+    player_update.move_speed = 100.0
+    player_update.move_direction = 0.0
+    player_update.input_sequence = 1
+    player_update.duration = 0.05
+    ability_request = packets.AbilityRequest()
+    ability_request.ability_id = 1
+    message = packets.Message()
+    message.message = "Player 1 has joined the game."
+    message.type = "system"
+    mix = [_get_update_packet().pack(), player_update.pack(),
+           ability_request.pack(), message.pack()]
+    return "".join(mix[i % len(mix)] for i in xrange(packet_count))
+
+
+def run_framing(packet_count, chunk_sizes, repeat=3):
+    """
+    Times decoding a burst of packet_count packets received in chunks of
+    each of chunk_sizes bytes with the PacketFramer and the StringFramer.
+    Returns a list of (framer name, chunk size, packets/s) tuples using the
+    best of repeat runs.
+    """
+    burst = _get_burst(packet_count)
+    results = []
+    for chunk_size in chunk_sizes:
+        chunks = [burst[i:i + chunk_size]
+                  for i in xrange(0, len(burst), chunk_size)]
+        for framer_class in [PacketFramer, StringFramer]:
+            best = None
+            for i in xrange(repeat):
+                framer = framer_class()
+                start = timeit.default_timer()
+                count = 0
+                for chunk in chunks:
+                    count += len(framer.feed(chunk))
+                elapsed = timeit.default_timer() - start
+                if count != packet_count:
+                    raise Exception("%s decoded %s of %s packets." %
+                                    (framer_class.__name__, count, packet_count))
+                if best is None or elapsed < best:
+                    best = elapsed
+            results.append((framer_class.__name__, chunk_size,
+                            packet_count / best))
+    return results
+
+
+def run_udp(port, packet_count, loss, timeout=60):
+    """
+    Runs a UdpGameServer and a UdpGameClient over loopback in this process,
+    dropping loss of the datagrams each sends. The client sends packet_count
+    reliable Messages (which the server sends back) and unreliable
+    ObjectUpdates. Returns a dictionary of the results and raises an
+    Exception if the reliable packets don't all arrive in order or the
+    unreliable ones arrive out of order.
+    """
+    from twisted.internet import reactor
+    from twisted.internet.task import LoopingCall
+    from net.udp import UdpGameServer, UdpGameClient
+
+    server = UdpGameServer(None, port)
+    server.loss = loss
+    client = UdpGameClient(None, "127.0.0.1", port)
+    client.loss = loss
+    results = { }
+    server_messages = []
+    server_updates = []
+    client_messages = []
+    state = { "sent": 0, "start": None }
+
+    def on_packet_received(connection, packet):
+        if type(packet) is packets.Message:
+            server_messages.append(packet.message)
+            # Echo it back to test the server's reliable channel too.
+            server.send(connection, packet)
+        elif type(packet) is packets.ObjectUpdate:
+            server_updates.append(packet.object_id)
+
+    def on_connected():
+        state["start"] = time.time()
+
+    def update():
+        if state["start"] is None:
+            return
+        # Send a few of each packet every tick.
+        for i in xrange(5):
+            if state["sent"] < packet_count:
+                message = packets.Message()
+                message.message = str(state["sent"])
+                message.type = "notice"
+                client.output.put_nowait(message)
+                update = _get_update_packet()
+                update.object_id = state["sent"]
+                client.output.put_nowait(update)
+                state["sent"] += 1
+        client.send()
+        server.flush()
+        while not client.input.empty():
+            packet = client.input.get_nowait()
+            if type(packet) is packets.Message:
+                client_messages.append(packet.message)
+        if len(client_messages) >= packet_count or \
+            time.time() - state["start"] > timeout:
+            results["s"] = time.time() - state["start"]
+            results["rtt ms"] = (client.connection.rtt or 0) * 1000
+            reactor.stop()
+
+    server.packet_received += on_packet_received
+    client.connected += on_connected
+    server.listen()
+    client.listen()
+    LoopingCall(update).start(0.01)
+    reactor.run()
+
+    expected = [str(i) for i in xrange(packet_count)]
+    if server_messages != expected:
+        raise Exception("The server received %d of %d reliable packets, %s in order." %
+            (len(server_messages), packet_count,
+             "not" if server_messages != expected[:len(server_messages)] else "but"))
+    if client_messages != expected:
+        raise Exception("The client received %d of %d reliable packets, %s in order." %
+            (len(client_messages), packet_count,
+             "not" if client_messages != expected[:len(client_messages)] else "but"))
+    if server_updates != sorted(set(server_updates)):
+        raise Exception("The unreliable packets were handed over out of order.")
+    results["unreliable received"] = len(server_updates) / packet_count
+    return results
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    parser = OptionParser(usage="python -m net.benchmark [options]")
+    parser.add_option("--connections", default="64,256",
+                      help="comma separated numbers of clients to connect")
+    parser.add_option("--packets", type="int", default=1000,
+                      help="the number of packets to broadcast")
+    parser.add_option("--port", type="int", default=8990,
+                      help="the port to run the servers on")
+    parser.add_option("--backends", default=",".join(BACKENDS),
+                      help="comma separated backends to compare")
+    parser.add_option("--serve", default=None,
+                      help="run a benchmark server with the given backend")
+    parser.add_option("--framing", action="store_true", default=False,
+                      help="benchmark decoding bursts of packets instead")
+    parser.add_option("--burst", type="int", default=10000,
+                      help="the number of packets in a burst (with --framing)")
+    parser.add_option("--chunks", default="1460,65536,0",
+                      help="comma separated sizes of the chunks a burst is "
+                           "received in, 0 for all at once (with --framing)")
+    parser.add_option("--udp", action="store_true", default=False,
+                      help="test the UDP transport over loopback instead")
+    parser.add_option("--loss", type="float", default=0.2,
+                      help="the fraction of datagrams to drop (with --udp)")
+    options, arguments = parser.parse_args(argv[1:])
+
+    if options.udp:
+        results = run_udp(options.port, options.packets, options.loss)
+        print "Every reliable packet arrived in order with %d%% loss." % \
+            (options.loss * 100)
+        print "%-14s %14s %20s" % ("time s", "rtt ms", "unreliable received")
+        print "%-14.2f %14.1f %19.0f%%" % (results["s"], results["rtt ms"],
+            results["unreliable received"] * 100)
+        return 0
+
+    if options.framing:
+        burst_size = len(_get_burst(options.burst))
+        chunk_sizes = [int(value) or burst_size
+                       for value in options.chunks.split(",")]
+        print "%-14s %12s %14s" % ("framer", "chunk size", "packets/s")
+        for name, chunk_size, rate in run_framing(options.burst, chunk_sizes):
+            print "%-14s %12d %14.0f" % (name, chunk_size, rate)
+        return 0
+
+    if options.serve is not None:
+        serve(options.serve, options.port, int(options.connections),
+              options.packets)
+        return 0
+
+    print "%-8s %12s %14s %20s %18s" % ("backend", "connections",
+        "accepts/s", "broadcast packets/s", "broadcast call s")
+    for connections in [int(value) for value in options.connections.split(",")]:
+        for backend in options.backends.split(","):
+            results = run(backend, options.port, connections, options.packets)
+            print "%-8s %12d %14.0f %20.0f %18.4f" % (backend, connections,
+                results.get("accepts/s", 0), results["broadcast packets/s"],
+                results.get("broadcast call s", 0))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
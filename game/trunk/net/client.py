@@ -3,6 +3,7 @@ from twisted.internet import reactor, protocol
 import threading, time, struct
 from Queue import Queue
 from event import Event
+from framing import PacketFramer
 import packets
 
 
@@ -12,24 +13,11 @@ class ClientProtocol(protocol.Protocol):
         print "Connected to %s:%s." % (server.host, server.port)
         self.factory.server_transport = self.transport
         self.factory.connected()
-        self.current_packet = None
-        self.buffer = ""
+        self.framer = PacketFramer()
     
     def dataReceived(self, data):
-        self.buffer += data
-        self._processBuffer()
-        
-    def _processBuffer(self):
-        if self.current_packet is None and len(self.buffer) >= 3:
-            self.current_packet = packets.Packet()
-            self.current_packet.unpack(self.buffer)
-            
-        if self.current_packet is not None and len(self.buffer) >= self.current_packet.size:
-            packet = packets.unpack(self.buffer)
-            self.buffer = self.buffer[packet.size:]
+        for packet in self.framer.feed(data):
             self.factory.input.put_nowait(packet)
-            self.current_packet = None
-            self._processBuffer()
     
     def connectionLost(self, reason):
         server = self.transport.getPeer()
@@ -0,0 +1,133 @@
+"""
+The framing module contains the PacketFramer, which splits the stream of
+bytes received on a connection back up into packets for the server's and the
+client's protocols, and the SendBuffer, which packs the packets to send on a
+connection one after the other into a single buffer.
+"""
+
+import struct
+
+import packets
+
+# The id and size every packet starts with (see packets.Packet).
+_header = struct.Struct("!BH")
+
+
+class PacketFramer(object):
+    """
+    Collects the data received on a stream connection and decodes the
+    complete packets in it.
+
+    The data is kept in a bytearray with a read offset: packets are decoded
+    in place through a memoryview at their offset, so decoding a packet
+    doesn't copy the rest of the buffer, and the bytes already decoded are
+    only removed from the front of the buffer once there are at least
+    compact_size of them (or nothing is left after them).
+    """
+    def __init__(self, compact_size=65536):
+        """
+        Arguments:
+        compact_size -- The number of decoded bytes to let build up at the
+            front of the buffer before removing them.
+        """
+        self.buffer = bytearray()
+        self.offset = 0
+        self.compact_size = compact_size
+
+    def feed(self, data):
+        """
+        Adds data received from the connection and returns a list of the
+        packets completed by it (in the order they were sent). Data left over
+        from an incomplete packet is kept for the next call.
+        """
+        buffer = self.buffer
+        buffer += data
+        end = len(buffer)
+        offset = self.offset
+        received = []
+        header_size = _header.size
+        view = memoryview(buffer)
+        try:
+            while end - offset >= header_size:
+                id, size = _header.unpack_from(view, offset)
+                if size < header_size:
+                    raise ValueError("Malformed packet (id %s, size %s)." % (id, size))
+                if end - offset < size:
+                    break
+                received.append(packets.unpack(view, offset))
+                offset += size
+        finally:
+            # The bytearray can't be resized while a view of it exists.
+            del view
+        if offset == end:
+            del buffer[:]
+            offset = 0
+        elif offset >= self.compact_size:
+            del buffer[:offset]
+            offset = 0
+        self.offset = offset
+        return received
+
+
+class SendBuffer(object):
+    """
+    Collects the packets to send on a connection so they can be written in
+    one go. Packets are packed straight into a preallocated bytearray with
+    Packet.pack_into() (rather than each being packed into a string of its
+    own), which is reused after every flush() and grown when a burst of
+    packets doesn't fit.
+    """
+    def __init__(self, size=4096):
+        """
+        Arguments:
+        size -- The number of bytes to preallocate.
+        """
+        self.buffer = bytearray(size)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def _reserve(self, size):
+        """ Makes sure there is room for size more bytes. """
+        needed = self.length + size - len(self.buffer)
+        if needed > 0:
+            # Grow by at least the current size, so a long burst only
+            # reallocates a few times.
+            self.buffer.extend(bytearray(max(needed, len(self.buffer))))
+
+    def add(self, packet):
+        """ Packs a packet onto the end of the buffer. """
+        self._reserve(packet.get_size())
+        self.length = packet.pack_into(self.buffer, self.length)
+
+    def add_data(self, data):
+        """
+        Copies data (a string or a buffer such as another SendBuffer's
+        get_view()) onto the end of the buffer.
+        """
+        size = len(data)
+        self._reserve(size)
+        self.buffer[self.length:self.length + size] = data
+        self.length += size
+
+    def get_view(self):
+        """
+        Returns a memoryview of the data in the buffer. It must be released
+        (deleted) before anything more is added to the buffer.
+        """
+        return memoryview(self.buffer)[:self.length]
+
+    def clear(self):
+        """ Empties the buffer. """
+        self.length = 0
+
+    def flush(self, write):
+        """
+        Calls write with the data in the buffer (as a string, as transports
+        keep hold of what they can't write straight away) if there is any,
+        and empties the buffer.
+        """
+        if self.length:
+            write(memoryview(self.buffer)[:self.length].tobytes())
+            self.length = 0
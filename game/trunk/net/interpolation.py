@@ -0,0 +1,222 @@
+"""
+The interpolation module contains what the client uses to show the other
+objects in the world smoothly: an estimate of the server's world time, and
+a buffer of each object's states at the times of the snapshots they came in
+(see the Interpolator).
+
+Objects are shown as they were a fixed delay (RENDER_DELAY) behind the
+server's time, which is normally between two states already received, so
+their position and rotation can be interpolated between them. If no state
+has arrived for the time being shown (a snapshot was late or lost), the
+object keeps moving at the velocity in its last state for at most
+MAX_EXTRAPOLATION seconds and then stops until a state arrives.
+"""
+
+from __future__ import division
+import math
+from collections import deque
+
+# How far behind the server's time objects are shown. It should be at least
+# twice the time between snapshots (0.05 seconds by default), so that there
+# is still a state to interpolate to if one is late or lost.
+RENDER_DELAY = 0.1
+
+# The longest an object is moved on past its last state.
+MAX_EXTRAPOLATION = 0.1
+
+# The longest time between two states of an object that is moving. Once
+# nothing in the world has changed the server stops sending snapshots, so
+# states further apart than this mean the object stood still until
+# MAX_INTERVAL before the second one.
+MAX_INTERVAL = 0.25
+
+# The most states to keep for an object.
+BUFFER_SIZE = 32
+
+
+def _interpolate_angle(a, b, fraction):
+    """ Interpolates between two angles (in radians) the shortest way round. """
+    difference = (b - a + math.pi) % (2 * math.pi) - math.pi
+    return a + difference * fraction
+
+
+class ServerClock(object):
+    """
+    Estimates the server's world time from the times of the snapshots
+    received, as an offset from a local clock. The offset follows each new
+    snapshot's gradually, so that the jitter in when they arrive doesn't make
+    the time jump about, but is reset if it is off by more than max_error.
+    """
+    def __init__(self, smoothing=0.1, max_error=0.5):
+        """
+        Arguments:
+        smoothing -- The fraction of the way to move the offset towards
+            each new snapshot's.
+        max_error -- The difference from a new snapshot's offset at which
+            the offset is reset to it.
+        """
+        self.smoothing = smoothing
+        self.max_error = max_error
+        self.offset = None
+
+    def update(self, server_time, local_time):
+        """ Adds the server_time of a snapshot received at local_time. """
+        offset = server_time - local_time
+        if self.offset is None or abs(offset - self.offset) > self.max_error:
+            self.offset = offset
+        else:
+            self.offset += (offset - self.offset) * self.smoothing
+
+    def get_time(self, local_time):
+        """
+        Returns the server's time at local_time, or None if no snapshot has
+        been received yet.
+        """
+        if self.offset is None:
+            return None
+        return local_time + self.offset
+
+
+class InterpolationBuffer(object):
+    """
+    The states of an object at the server times they were sent for, as
+    (time, (x, z, rotation), velocity) tuples, in order.
+    """
+    def __init__(self, max_extrapolation=MAX_EXTRAPOLATION,
+                 max_interval=MAX_INTERVAL, size=BUFFER_SIZE):
+        """
+        Arguments:
+        max_extrapolation -- The longest to move the object on past its last
+            state.
+        max_interval -- The longest time between two states of the object
+            while it is moving.
+        size -- The most states to keep.
+        """
+        self.states = deque(maxlen=size)
+        self.max_extrapolation = max_extrapolation
+        self.max_interval = max_interval
+
+    def __len__(self):
+        return len(self.states)
+
+    def add(self, time, state, velocity=(0, 0)):
+        """
+        Adds the state (an (x, z, rotation) tuple) of the object at the
+        given server time, and the (x, z) velocity it was moving at then to
+        extrapolate with. States older than the last one are ignored.
+        """
+        states = self.states
+        if states:
+            last_time, last_state, last_velocity = states[-1]
+            if time < last_time:
+                return
+            if time == last_time:
+                states.pop()
+            elif time - last_time > self.max_interval:
+                # The object hasn't changed since its last state until
+                # shortly before this one.
+                states.append((time - self.max_interval, last_state, (0, 0)))
+        states.append((time, state, velocity))
+
+    def hold(self, time):
+        """ Adds the object's last state again at the given server time. """
+        if self.states and time > self.states[-1][0]:
+            last_time, last_state, last_velocity = self.states[-1]
+            self.states.append((time, last_state, last_velocity))
+
+    def clear(self):
+        self.states.clear()
+
+    def get(self, time):
+        """
+        Returns the (x, z, rotation) of the object at the given server time,
+        or None if there are no states. States before the ones needed for
+        time are removed, so time shouldn't go backwards.
+        """
+        states = self.states
+        if not states:
+            return None
+        while len(states) > 1 and states[1][0] <= time:
+            states.popleft()
+        time_a, state_a, velocity = states[0]
+        if time <= time_a:
+            return state_a
+        x_a, z_a, rotation_a = state_a
+        if len(states) == 1:
+            # Keep the object moving past its last state for a while.
+            elapsed = min(time - time_a, self.max_extrapolation)
+            return (x_a + velocity[0] * elapsed, z_a + velocity[1] * elapsed,
+                    rotation_a)
+        time_b, (x_b, z_b, rotation_b), velocity = states[1]
+        fraction = (time - time_a) / (time_b - time_a)
+        return (x_a + (x_b - x_a) * fraction, z_a + (z_b - z_a) * fraction,
+                _interpolate_angle(rotation_a, rotation_b, fraction))
+
+
+class Interpolator(object):
+    """
+    Keeps a ServerClock and the InterpolationBuffers of the objects in the
+    snapshots received, and gets the states to show them in.
+    """
+    def __init__(self, render_delay=RENDER_DELAY):
+        """
+        Arguments:
+        render_delay -- How far behind the server's time to show objects.
+        """
+        self.render_delay = render_delay
+        self.clock = ServerClock()
+        self.buffers = { }
+
+    def add_snapshot(self, time, local_time, updates):
+        """
+        Adds the states of a snapshot for the given server time, received at
+        local_time, from the ObjectUpdates it was applied as (see
+        net.snapshots.SnapshotDecoder). Objects without an update are still
+        in their last state.
+        """
+        self.clock.update(time, local_time)
+        updated = set()
+        for update in updates:
+            buffer = self.buffers.get(update.object_id)
+            if buffer is None:
+                buffer = self.buffers[update.object_id] = InterpolationBuffer()
+            # The object's own movement and the force on it.
+            velocity = (update.force_x, update.force_z)
+            if update.move_speed > 0:
+                direction = update.rotation + update.move_direction
+                velocity = (velocity[0] + update.move_speed * math.cos(direction),
+                            velocity[1] + update.move_speed * math.sin(direction))
+            buffer.add(time, (update.x, update.z, update.rotation), velocity)
+            updated.add(update.object_id)
+        for object_id, buffer in self.buffers.iteritems():
+            if object_id not in updated:
+                buffer.hold(time)
+
+    def clear(self, object_id):
+        """
+        Forgets the states of an object, for when it is moved straight to a
+        new position.
+        """
+        if self.buffers.has_key(object_id):
+            self.buffers[object_id].clear()
+
+    def remove(self, object_id):
+        """ Forgets an object altogether. """
+        if self.buffers.has_key(object_id):
+            del self.buffers[object_id]
+
+    def get_states(self, local_time):
+        """
+        Returns a list of (object_id, (x, z, rotation)) tuples of the objects
+        as they were render_delay behind the server's time at local_time.
+        """
+        server_time = self.clock.get_time(local_time)
+        if server_time is None:
+            return []
+        time = server_time - self.render_delay
+        states = []
+        for object_id, buffer in self.buffers.iteritems():
+            state = buffer.get(time)
+            if state is not None:
+                states.append((object_id, state))
+        return states
@@ -1,24 +1,93 @@
 import struct
 
-def unpack(packed):
-    id, = struct.unpack_from("!B", packed)
+def unpack(packed, offset=0):
+    """
+    Unpacks the packet starting at offset in packed (a string or any buffer,
+    such as a memoryview) into an instance of its Packet class.
+    """
+    id, = struct.unpack_from("!B", packed, offset)
     packet = packets[id]()
-    packet.unpack(packed)
+    packet.unpack(packed, offset)
     return packet
 
 
+def _get_codec(format):
+    """
+    Returns a precompiled Struct of the packet header followed by the fields
+    in format.
+    """
+    return struct.Struct(Packet.format + " " + format.lstrip("!"))
+
+
+def _get_string_codecs(format):
+    """
+    Returns precompiled Structs of the packet header followed by the fields
+    before the string (the %ds) in format, and of the fields after it.
+    """
+    head, tail = format.split("%ds")
+    return _get_codec(head), struct.Struct("!" + tail)
+
+
+def _unpack_string(packed, offset, length):
+    return memoryview(packed)[offset:offset + length].tobytes()
+
+
 class Packet(object):
+    """
+    The header every packet starts with: its id and its size (including the
+    header). Packets with nothing else to them use this as it is.
+
+    Packets with a fixed size have a codec, a precompiled Struct of the
+    header followed by their fields, and implement _get_values() and
+    _set_values(). Packets with strings in them have no codec and implement
+    get_size(), pack_into() and unpack() themselves, with the codecs of the
+    fields either side of the string made from their format.
+    """
     id = 0
     format = "!BH"
-
-    def pack(self, packed=""):
-        return struct.pack(Packet.format, self.id, 3 + len(packed)) + \
-            packed
-
-    def unpack(self, packed):
-        size = 3 #struct.calcsize(Packet.format)
-        self.id, self.size = struct.unpack_from(Packet.format, packed)
-        return size
+    header = struct.Struct(format)
+    codec = header
+
+    def get_size(self):
+        """ Returns the number of bytes the packet packs into. """
+        return self.codec.size
+
+    def pack(self):
+        """ Returns the packet packed into a string. """
+        codec = self.codec
+        if codec is None:
+            buffer = bytearray(self.get_size())
+            self.pack_into(buffer, 0)
+            return bytes(buffer)
+        return codec.pack(self.id, codec.size, *self._get_values())
+
+    def pack_into(self, buffer, offset):
+        """
+        Packs the packet into buffer (a bytearray with at least get_size()
+        bytes from offset) at offset and returns the offset just past it.
+        """
+        codec = self.codec
+        codec.pack_into(buffer, offset, self.id, codec.size, *self._get_values())
+        return offset + codec.size
+
+    def unpack(self, packed, offset=0):
+        """
+        Unpacks the packet starting at offset in packed and returns the
+        offset just past it.
+        """
+        codec = self.codec
+        values = codec.unpack_from(packed, offset)
+        self.id, self.size = values[0], values[1]
+        self._set_values(values[2:])
+        return offset + codec.size
+
+    def _get_values(self):
+        """ Returns a tuple of the fields to pack after the header. """
+        return ()
+
+    def _set_values(self, values):
+        """ Sets the fields from the tuple of values unpacked after the header. """
+        pass
 
 
 element_types = {
@@ -34,23 +103,30 @@ class JoinRequest(Packet):
     Optional attributes: player_name
     """
     id = 1
-    format = "!H%ds"
-    
+    format = "!H%ds" # player_name length, player_name
+    codec = None
+    head_codec = _get_string_codecs(format)[0]
+
     def __init__(self):
         Packet.__init__(self)
         self.player_name = ""
-    
-    def pack(self, packed=""):
-        format = JoinRequest.format % len(self.player_name)
-        return Packet.pack(self, struct.pack(format,
-            len(self.player_name), self.player_name)) + \
-            packed
-    
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        pname_length, = struct.unpack_from("!H", packed, offset)
-        self.player_name, = struct.unpack_from("%ds" % pname_length, packed, offset+2)
-        return offset + 2 + pname_length
+
+    def get_size(self):
+        return self.head_codec.size + len(self.player_name)
+
+    def pack_into(self, buffer, offset):
+        name = self.player_name
+        size = self.head_codec.size + len(name)
+        self.head_codec.pack_into(buffer, offset, self.id, size, len(name))
+        offset += self.head_codec.size
+        buffer[offset:offset + len(name)] = name
+        return offset + len(name)
+
+    def unpack(self, packed, offset=0):
+        self.id, self.size, pname_length = self.head_codec.unpack_from(packed, offset)
+        offset += self.head_codec.size
+        self.player_name = _unpack_string(packed, offset, pname_length)
+        return offset + pname_length
 
 
 class JoinResponse(Packet):
@@ -60,16 +136,13 @@ class JoinResponse(Packet):
     """
     id = 2
     format = "!H" # player_id
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(JoinResponse.format,
-            self.player_id)) + \
-            packed
-    
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        self.player_id, = struct.unpack_from(JoinResponse.format, packed, offset)
-        return offset + 2
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (self.player_id,)
+
+    def _set_values(self, values):
+        self.player_id, = values
 
 
 class SpawnRequest(Packet):
@@ -79,17 +152,13 @@ class SpawnRequest(Packet):
     """
     id = 3
     format = "!B"
+    codec = _get_codec(format)
 
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(SpawnRequest.format,
-            element_types[self.element_type])) + \
-            packed
+    def _get_values(self):
+        return (element_types[self.element_type],)
 
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        etype, = struct.unpack_from(SpawnRequest.format, packed, offset)
-        self.element_type = element_types[etype]
-        return offset + 1
+    def _set_values(self, values):
+        self.element_type = element_types[values[0]]
 
 
 class SpawnResponse(Packet):
@@ -101,41 +170,48 @@ class SpawnResponse(Packet):
     """
     id = 4
     format = "!B ff" # element_type x z
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(SpawnResponse.format,
-            element_types[self.element_type], self.x, self.z)) + \
-            packed
-
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        etype, self.x, self.z = struct.unpack_from(SpawnResponse.format, packed, offset)
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (element_types[self.element_type], self.x, self.z)
+
+    def _set_values(self, values):
+        etype, self.x, self.z = values
         self.element_type = element_types[etype]
-        return offset + 9
 
 
 class PlayerUpdate(Packet):
     """
     This is a packet sent from the client to the server to update the server
     with information regarding the current player.
-    
+
+    Each one is an input: the player moved with the given rotation,
+    move_speed and move_direction for duration seconds (at most
+    max_duration) up to the position the client predicted. The server
+    applies the input's movement itself and sends back the input_sequence
+    of the last input it applied (see snapshot_fields), so the client can
+    replay the inputs after it on top of the server's position.
+
     Required attributes:
-    x, z, rotation, move_speed, move_direction
+    x, z, rotation, move_speed, move_direction, input_sequence (16 bit,
+    wrapping around), duration
     """
     id = 5
-    format = "!ff f f f" # position rotation move_speed move_direction
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(PlayerUpdate.format,
-            self.x, self.z, self.rotation,
-            self.move_speed, self.move_direction)) + \
-            packed
-    
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        self.x, self.z, self.rotation, self.move_speed, self.move_direction = \
-            struct.unpack_from(PlayerUpdate.format, packed, offset)
-        return offset + 20
+    format = "!ff f f f H f" # position rotation move_speed move_direction input_sequence duration
+    codec = _get_codec(format)
+
+    # The longest an input can move the player for, so that a client can't
+    # move further than the server would have moved it.
+    max_duration = 0.25
+
+    def _get_values(self):
+        return (self.x, self.z, self.rotation,
+            self.move_speed, self.move_direction,
+            self.input_sequence, self.duration)
+
+    def _set_values(self, values):
+        self.x, self.z, self.rotation, self.move_speed, self.move_direction, \
+            self.input_sequence, self.duration = values
 
 
 object_types = {
@@ -148,35 +224,46 @@ class ObjectInit(Packet):
     This is a packet sent from the server to the client to give extended
     information about a GameObject to the client. The server may likely only
     send one of these packets for each object.
-    
+
     Required atributes: object_id, object_type
     Optional attributes: element_type, name, owner_id ttl,
     """
     id = 6
-    format = "!H B B H %ds H f" # object_id, object_type, element_type, namelen, name, owner_id, ttl 
-    offset_namelen = struct.calcsize("H B B")
-    
+    format = "!H B B H %ds H f" # object_id, object_type, element_type, namelen, name, owner_id, ttl
+    codec = None
+    head_codec, tail_codec = _get_string_codecs(format)
+
     def __init__(self):
         Packet.__init__(self)
         self.element_type = 0
         self.name = ""
         self.owner_id = 0
         self.ttl = -1
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(ObjectInit.format % len(self.name),
+
+    def get_size(self):
+        return self.head_codec.size + len(self.name) + self.tail_codec.size
+
+    def pack_into(self, buffer, offset):
+        name = self.name
+        self.head_codec.pack_into(buffer, offset, self.id, self.get_size(),
             self.object_id, object_types[self.object_type], element_types[self.element_type],
-            len(self.name), self.name, self.owner_id, self.ttl)) + \
-            packed
-    
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        namelen = struct.unpack_from("!H", packed, offset + self.offset_namelen)
-        self.object_id, otype, etype, namelen, self.name, self.owner_id, self.ttl = \
-            struct.unpack_from(ObjectInit.format % namelen , packed, offset)
+            len(name))
+        offset += self.head_codec.size
+        buffer[offset:offset + len(name)] = name
+        offset += len(name)
+        self.tail_codec.pack_into(buffer, offset, self.owner_id, self.ttl)
+        return offset + self.tail_codec.size
+
+    def unpack(self, packed, offset=0):
+        self.id, self.size, self.object_id, otype, etype, namelen = \
+            self.head_codec.unpack_from(packed, offset)
+        offset += self.head_codec.size
+        self.name = _unpack_string(packed, offset, namelen)
+        offset += namelen
+        self.owner_id, self.ttl = self.tail_codec.unpack_from(packed, offset)
         self.object_type = object_types[otype]
         self.element_type = element_types[etype]
-        return offset + 12 + namelen
+        return offset + self.tail_codec.size
 
 
 class ObjectUpdate(Packet):
@@ -184,81 +271,240 @@ class ObjectUpdate(Packet):
     This is a packet sent from the server to the client to give updated
     information about a GameObject to the client. The server will likely send
     these packets constantly to update the client's game state.
-    
+
     Required attributes:
     object_id, x, z, rotation, move_speed, move_direction, force_x, force_z, is_dead
     Optional attributes:
-    forced
+    forced, input_sequence and time (not sent; set for the updates a
+        WorldSnapshot is applied as, see net.snapshots)
     """
     id = 7
     format = "!H ff f f f ff B" # object_id position rotation move_speed move_direction force_vector flags
+    codec = _get_codec(format)
     _flags_mask_forced = 1 << 0
     _flags_mask_is_dead = 1 << 1
-    
+
     def __init__(self):
         Packet.__init__(self)
         self.forced = False
-    
-    def pack(self, packed=""):
+        self.input_sequence = None
+        self.time = None
+
+    def _get_values(self):
         flags = 0
         if self.forced: flags |= self._flags_mask_forced
         if self.is_dead: flags |= self._flags_mask_is_dead
-        return Packet.pack(self, struct.pack(ObjectUpdate.format,
-            self.object_id, self.x, self.z, self.rotation,
-            self.move_speed, self.move_direction, self.force_x, self.force_z, flags)) + \
-            packed
-    
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
+        return (self.object_id, self.x, self.z, self.rotation,
+            self.move_speed, self.move_direction, self.force_x, self.force_z, flags)
+
+    def _set_values(self, values):
         self.object_id, self.x, self.z, self.rotation, self.move_speed, \
-            self.move_direction, self.force_x, self.force_z, flags = \
-            struct.unpack_from(ObjectUpdate.format, packed, offset)
+            self.move_direction, self.force_x, self.force_z, flags = values
         self.forced = (flags & self._flags_mask_forced) == self._flags_mask_forced
         self.is_dead = (flags & self._flags_mask_is_dead) == self._flags_mask_is_dead
-        return offset + 31
-        
+
 
 class ObjectStatusUpdate(Packet):
     """
     This is a packet generally sent from the server to client(s) when the
     status (power or health) of another object needs to be updated.
-    
+
     Required attributes:
     object_id, health, power
     """
     id = 9
     format = "!H f f" # object_id health power
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(ObjectStatusUpdate.format,
-            self.object_id, self.health, self.power)) + packed
-            
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        self.object_id, self.health, self.power = struct.unpack_from(
-            ObjectStatusUpdate.format, packed, offset)
-        return offset + 10
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (self.object_id, self.health, self.power)
+
+    def _set_values(self, values):
+        self.object_id, self.health, self.power = values
+
+
+# The fields of an object's state in a WorldSnapshot, in the order of the
+# bits of an entry's mask, with their formats.
+snapshot_fields = [
+    ("x", "f"),
+    ("z", "f"),
+    ("rotation", "f"),
+    ("move_speed", "f"),
+    ("move_direction", "f"),
+    ("force_x", "f"),
+    ("force_z", "f"),
+    ("is_dead", "B"),
+    ("health", "f"),
+    ("power", "f"),
+    ("input_sequence", "H"),
+]
+
+
+class WorldSnapshot(Packet):
+    """
+    This is a packet sent from the server to each client with the state of
+    every object in the world, as a delta against an earlier snapshot the
+    client has acknowledged with a SnapshotAck (its baseline). Each object
+    that changed since the baseline has an entry of its id and a mask with a
+    bit set for each field that changed (see snapshot_fields), followed by
+    the values of only those fields. Objects that are no longer in the world
+    have an entry with just the removed bit set. A baseline_sequence equal to
+    the sequence means the snapshot has no baseline and every field of every
+    object is sent. See net.snapshots for building and applying snapshots.
+
+    If the snapshot has a quantization (see net.quantization), the values
+    are its integer codes for the fields and the quantized flag is set. The
+    sizes of the codes depend on the quantization, so the entries of a
+    quantized snapshot are left packed by unpack() (entries is None) until
+    decode_entries() is called with the same quantization (as the
+    SnapshotDecoder does).
+
+    Required attributes:
+    sequence - the snapshot's sequence number (16 bit, wrapping around)
+    baseline_sequence - the sequence number of the baseline
+    time - the world time of the snapshot
+    entries - a list of (object_id, mask, values) tuples where values is a
+        tuple of the values of the fields in mask
+    Optional attributes:
+    quantization - the net.quantization.Quantization of the values
+    """
+    id = 12
+    format = "!H H d B H" # sequence baseline_sequence time flags entry_count
+    codec = None
+    head_codec = _get_codec(format)
+    entry_codec = struct.Struct("!H H") # object_id mask
+    mask_removed = 1 << len(snapshot_fields)
+    _flags_mask_quantized = 1 << 0
+    # Precompiled Structs of the fields in each mask, created as needed.
+    _mask_codecs = { }
+
+    def __init__(self):
+        Packet.__init__(self)
+        self.time = 0
+        self.entries = []
+        self.quantization = None
+        self._packed_entries = None
+        self._entry_count = 0
+
+    @classmethod
+    def get_mask_codec(cls, mask):
+        """ Returns a Struct of the values of the fields in mask. """
+        try:
+            return cls._mask_codecs[mask]
+        except KeyError:
+            format = "!" + "".join([field_format
+                for i, (name, field_format) in enumerate(snapshot_fields)
+                if mask & (1 << i)])
+            codec = cls._mask_codecs[mask] = struct.Struct(format)
+            return codec
+
+    def _get_mask_codec_getter(self):
+        if self.quantization is not None:
+            return self.quantization.get_mask_codec
+        return self.get_mask_codec
+
+    def get_size(self):
+        size = self.head_codec.size
+        entry_size = self.entry_codec.size
+        get_mask_codec = self._get_mask_codec_getter()
+        for object_id, mask, values in self.entries:
+            size += entry_size + get_mask_codec(mask).size
+        return size
+
+    def pack_into(self, buffer, offset):
+        start = offset
+        offset += self.head_codec.size
+        entry_codec = self.entry_codec
+        get_mask_codec = self._get_mask_codec_getter()
+        for object_id, mask, values in self.entries:
+            entry_codec.pack_into(buffer, offset, object_id, mask)
+            offset += entry_codec.size
+            codec = get_mask_codec(mask)
+            codec.pack_into(buffer, offset, *values)
+            offset += codec.size
+        flags = 0
+        if self.quantization is not None: flags |= self._flags_mask_quantized
+        # The header goes in last, once the size is known.
+        self.head_codec.pack_into(buffer, start, self.id, offset - start,
+            self.sequence, self.baseline_sequence, self.time, flags,
+            len(self.entries))
+        return offset
+
+    def unpack(self, packed, offset=0):
+        start = offset
+        self.id, self.size, self.sequence, self.baseline_sequence, self.time, \
+            flags, count = self.head_codec.unpack_from(packed, offset)
+        offset += self.head_codec.size
+        self.quantization = None
+        if flags & self._flags_mask_quantized:
+            end = start + self.size
+            self._packed_entries = _unpack_string(packed, offset, end - offset)
+            self._entry_count = count
+            self.entries = None
+            return end
+        return self._unpack_entries(packed, offset, count)
+
+    def decode_entries(self, quantization):
+        """
+        Unpacks the entries of a quantized snapshot with its quantization
+        (see net.quantization). Does nothing if they are already unpacked.
+        """
+        if self.entries is not None:
+            return
+        self.quantization = quantization
+        self._unpack_entries(self._packed_entries, 0, self._entry_count)
+        self._packed_entries = None
+
+    def _unpack_entries(self, packed, offset, count):
+        entry_codec = self.entry_codec
+        get_mask_codec = self._get_mask_codec_getter()
+        self.entries = entries = []
+        for i in xrange(count):
+            object_id, mask = entry_codec.unpack_from(packed, offset)
+            offset += entry_codec.size
+            codec = get_mask_codec(mask)
+            entries.append((object_id, mask, codec.unpack_from(packed, offset)))
+            offset += codec.size
+        return offset
+
+
+class SnapshotAck(Packet):
+    """
+    This is a packet sent from a client to the server to acknowledge that it
+    has received a WorldSnapshot, so that the server can send the following
+    snapshots as deltas against it.
+
+    Required attributes:
+    sequence - the sequence number of the snapshot
+    """
+    id = 13
+    format = "!H" # sequence
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (self.sequence,)
+
+    def _set_values(self, values):
+        self.sequence, = values
 
 
 class ObjectRemove(Packet):
     """
     This is a packet generally sent from the server to client(s) when an object
     should be removed from the game world.
-    
+
     Required attributes:
     object_id
     """
     id = 8
     format = "!H" # object_id
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(ObjectRemove.format,
-            self.object_id)) + packed
-            
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        self.object_id, = struct.unpack_from(ObjectRemove.format, packed, offset)
-        return offset + 2
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (self.object_id,)
+
+    def _set_values(self, values):
+        self.object_id, = values
 
 
 class AbilityRequest(Packet):
@@ -266,21 +512,19 @@ class AbilityRequest(Packet):
     This is a packet sent from the client to the server to request to use an
     ability. The server will sen dout an AbilityUsed packet if the request is
     accepted.
-    
+
     Required attributes:
     ability_id - the id of the ability the player is requsting ot use.
     """
     id = 10
     format = "!H" # ability_id
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(AbilityRequest.format,
-            self.ability_id)) + packed
-            
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        self.ability_id, = struct.unpack_from(AbilityRequest.format, packed, offset)
-        return offset + 2
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (self.ability_id,)
+
+    def _set_values(self, values):
+        self.ability_id, = values
 
 
 class AbilityUsed(Packet):
@@ -288,22 +532,20 @@ class AbilityUsed(Packet):
     This is a packet sent from the server to all clients when a player uses an
     ability. This is genreally a response to an AbilityRequest packet from a
     client.
-    
+
     Required attributes:
     object_id - the id of the player using the ability
     ability_id - the id of the ability
     """
     id = 11
     format = "!H H" # object_id ability_id
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(AbilityUsed.format,
-            self.object_id, self.ability_id)) + packed
-            
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        self.object_id, self.ability_id = struct.unpack_from(AbilityUsed.format, packed, offset)
-        return offset + 4
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (self.object_id, self.ability_id)
+
+    def _set_values(self, values):
+        self.object_id, self.ability_id = values
 
 
 message_types = {
@@ -323,18 +565,30 @@ class Message(Packet):
     """
     id = 20
     format = "!H %ds B" # message_length, message, type
-    
-    def pack(self, packed=""):
-        typeid = message_types[self.type]
-        return Packet.pack(self, struct.pack(Message.format % len(self.message),
-            len(self.message), self.message, typeid)) + packed
-    
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        mlen = struct.unpack_from("!H", packed, offset)
-        mlen, self.message, typeid = struct.unpack_from(Message.format % mlen, packed, offset)
+    codec = None
+    head_codec, tail_codec = _get_string_codecs(format)
+
+    def get_size(self):
+        return self.head_codec.size + len(self.message) + self.tail_codec.size
+
+    def pack_into(self, buffer, offset):
+        message = self.message
+        self.head_codec.pack_into(buffer, offset, self.id, self.get_size(),
+            len(message))
+        offset += self.head_codec.size
+        buffer[offset:offset + len(message)] = message
+        offset += len(message)
+        self.tail_codec.pack_into(buffer, offset, message_types[self.type])
+        return offset + self.tail_codec.size
+
+    def unpack(self, packed, offset=0):
+        self.id, self.size, mlen = self.head_codec.unpack_from(packed, offset)
+        offset += self.head_codec.size
+        self.message = _unpack_string(packed, offset, mlen)
+        offset += mlen
+        typeid, = self.tail_codec.unpack_from(packed, offset)
         self.type = message_types[typeid]
-        return offset + 3 + mlen
+        return offset + self.tail_codec.size
 
 
 class ScoreUpdate(Packet):
@@ -343,35 +597,30 @@ class ScoreUpdate(Packet):
     """
     id = 21
     format = "!H h" # player_id, score
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(ScoreUpdate.format,
-            self.player_id, self.score)) + packed
-    
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        self.player_id, self.score = struct.unpack_from(ScoreUpdate.format,
-            packed, offset)
-        return offset + 4
-        
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (self.player_id, self.score)
+
+    def _set_values(self, values):
+        self.player_id, self.score = values
+
 class RoundStart(Packet):
     id = 22
 
 class RoundEnd(Packet):
     id = 23
-    
+
 class ClientDisconnect(Packet):
     id = 31
     format = "!H" # player_id
-    
-    def pack(self, packed=""):
-        return Packet.pack(self, struct.pack(ClientDisconnect.format,
-            self.player_id)) + packed
-    
-    def unpack(self, packed):
-        offset = Packet.unpack(self, packed)
-        self.player_id, = struct.unpack_from(ClientDisconnect.format, packed, offset)
-        return offset + 2
+    codec = _get_codec(format)
+
+    def _get_values(self):
+        return (self.player_id,)
+
+    def _set_values(self, values):
+        self.player_id, = values
 
 packets = {
     0: Packet,
@@ -386,6 +635,8 @@ packets = {
     9: ObjectStatusUpdate,
     10: AbilityRequest,
     11: AbilityUsed,
+    12: WorldSnapshot,
+    13: SnapshotAck,
     20: Message,
     21: ScoreUpdate,
     22: RoundStart,
@@ -0,0 +1,176 @@
+"""
+The quantization module contains the compact encoding of the object states
+in WorldSnapshots: fields are sent as small integers instead of 32 bit
+floats, with the precision of each field configurable.
+
+By default (see get_default_quantization()) positions are 16 bit fixed point
+within the level's bounds, rotation and move_direction are 16 bit angles and
+force vectors are 8 bit, which takes an object's full state from 43 bytes
+to 29. The worst case error of each field is:
+
+    x, z            (bounds width) / 65534 / 2, 0.0091 for the test level
+    rotation,       pi / 2 ** 16, 0.000048 radians (0.0027 degrees)
+      move_direction
+    force_x,        512 / 127 / 2, 2.0 (force values are up to around 500)
+      force_z
+
+Values outside a field's range are clamped to it. Zero forces, which are the
+most common, are sent exactly.
+"""
+
+from __future__ import division
+import math
+import os.path
+import struct
+from xml.dom import minidom
+
+import packets
+
+# The level bounds file positions are quantized within by default.
+BOUNDS_FILEPATH = os.path.join("media", "levelbounds.bounds")
+
+# The largest force component that can be sent by default.
+MAX_FORCE = 512
+
+
+def _get_integer_format(bits, signed):
+    """ Returns the struct format of the smallest integer with bits bits. """
+    for format, size in [("b", 8), ("h", 16), ("i", 32)]:
+        if bits <= size:
+            return format if signed else format.upper()
+    raise ValueError("Can't quantize to more than 32 bits.")
+
+
+class LinearQuantizer(object):
+    """
+    Quantizes values between minimum and maximum to signed integers of bits
+    bits, in equal steps either side of the middle of the range (so that if
+    the range is symmetric, 0 is sent exactly).
+    """
+    def __init__(self, minimum, maximum, bits=16):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.bits = bits
+        self.format = _get_integer_format(bits, True)
+        self.middle = (minimum + maximum) / 2
+        self.limit = (1 << (bits - 1)) - 1
+        self.step = (maximum - minimum) / 2 / self.limit
+        self.max_error = self.step / 2
+
+    def quantize(self, value):
+        code = int(round((value - self.middle) / self.step))
+        if code > self.limit:
+            return self.limit
+        elif code < -self.limit:
+            return -self.limit
+        return code
+
+    def dequantize(self, code):
+        return self.middle + code * self.step
+
+
+class AngleQuantizer(object):
+    """
+    Quantizes angles (in radians) to unsigned integers of bits bits, going
+    once around the circle. Angles are dequantized to between -pi and pi.
+    """
+    def __init__(self, bits=16):
+        self.bits = bits
+        self.format = _get_integer_format(bits, False)
+        self.steps = 1 << bits
+        self.step = 2 * math.pi / self.steps
+        self.max_error = self.step / 2
+
+    def quantize(self, value):
+        return int(round(value / self.step)) % self.steps
+
+    def dequantize(self, code):
+        if code >= self.steps // 2:
+            code -= self.steps
+        return code * self.step
+
+
+class Quantization(object):
+    """
+    The encoding of the fields of the object states in a WorldSnapshot (see
+    packets.snapshot_fields). Each field with a quantizer is sent as its
+    integer code, and the rest are sent as they are.
+    """
+    def __init__(self, quantizers):
+        """
+        Arguments:
+        quantizers -- A dictionary of field names to the quantizers for them
+            (LinearQuantizer or AngleQuantizer).
+        """
+        self.quantizers = [quantizers.get(name) for name, format in
+                           packets.snapshot_fields]
+        self.formats = [format if quantizer is None else quantizer.format
+                        for (name, format), quantizer in
+                        zip(packets.snapshot_fields, self.quantizers)]
+        self._mask_codecs = { }
+
+    def quantize(self, state):
+        """ Returns a state (a tuple of field values) as a tuple of codes. """
+        return tuple([value if quantizer is None else quantizer.quantize(value)
+                      for value, quantizer in zip(state, self.quantizers)])
+
+    def dequantize(self, codes):
+        """ Returns the state a tuple of codes from quantize() stands for. """
+        return tuple([code if quantizer is None else quantizer.dequantize(code)
+                      for code, quantizer in zip(codes, self.quantizers)])
+
+    def get_mask_codec(self, mask):
+        """ Returns a Struct of the codes of the fields in mask. """
+        try:
+            return self._mask_codecs[mask]
+        except KeyError:
+            format = "!" + "".join([format for i, format in
+                                    enumerate(self.formats) if mask & (1 << i)])
+            codec = self._mask_codecs[mask] = struct.Struct(format)
+            return codec
+
+    def get_max_errors(self):
+        """
+        Returns a dictionary of the names of the quantized fields to the
+        largest difference there can be between a value (within the field's
+        range) and the value it is dequantized to.
+        """
+        return dict((name, quantizer.max_error) for (name, format), quantizer
+                    in zip(packets.snapshot_fields, self.quantizers)
+                    if quantizer is not None)
+
+
+def load_bounds(filepath=BOUNDS_FILEPATH):
+    """
+    Returns the (min_x, max_x, min_z, max_z) of the segments in a level
+    bounds file, in world coordinates (see
+    gamestate.scenes.Scene._setup_level_boundaries()).
+    """
+    xs = []
+    zs = []
+    xml_data = minidom.parse(filepath)
+    for name in ["point1", "point2"]:
+        for point in xml_data.getElementsByTagName(name):
+            xs.append(float(point.getAttribute("x")))
+            zs.append(-float(point.getAttribute("z")))
+    return min(xs), max(xs), min(zs), max(zs)
+
+
+def get_default_quantization(bounds_filepath=BOUNDS_FILEPATH, position_bits=16,
+                             angle_bits=16, force_bits=8, max_force=MAX_FORCE):
+    """
+    Returns the Quantization of positions within the bounds in the given level
+    bounds file, angles and forces (up to max_force) to the given number of
+    bits each. Both the server and the clients must use the same one.
+    """
+    min_x, max_x, min_z, max_z = load_bounds(bounds_filepath)
+    angle = AngleQuantizer(angle_bits)
+    force = LinearQuantizer(-max_force, max_force, force_bits)
+    return Quantization({
+        "x": LinearQuantizer(min_x, max_x, position_bits),
+        "z": LinearQuantizer(min_z, max_z, position_bits),
+        "rotation": angle,
+        "move_direction": angle,
+        "force_x": force,
+        "force_z": force,
+    })
@@ -1,12 +1,16 @@
 from twisted.internet import reactor, protocol
+from twisted.internet.task import LoopingCall
 
-import threading, time, struct
-from Queue import Queue
+import struct
+import sys
 from event import Event
+from framing import PacketFramer, SendBuffer
 import packets
 
 class ServerProtocol(protocol.Protocol):
     def connectionMade(self):
+        self.framer = PacketFramer()
+        self.send_buffer = SendBuffer()
         self.factory.client_count += 1
         self.client_id = self.factory.client_count
         self.player = None
@@ -14,8 +18,6 @@ class ServerProtocol(protocol.Protocol):
         print "New connection #%s client=%s from %s." % \
             (len(self.factory.clients), self.client_id, self.transport.getPeer())
         self.factory.client_connected(self)
-        self.current_packet = None
-        self.buffer = ""
 
     def connectionLost(self, reason):
         self.factory.clients.remove(self)
@@ -24,23 +26,24 @@ class ServerProtocol(protocol.Protocol):
             (len(self.factory.clients)+1, self.client_id, self.transport.getPeer())
 
     def dataReceived(self, data):
-        self.buffer += data
-        self._processBuffer()
-    
-    def _processBuffer(self):
-        if self.current_packet is None and len(self.buffer) >= 3:
-            self.current_packet = packets.Packet()
-            self.current_packet.unpack(self.buffer)
-            
-        if self.current_packet is not None and len(self.buffer) >= self.current_packet.size:
-            packet = packets.unpack(self.buffer)
-            self.buffer = self.buffer[packet.size:]
-            self.factory.input.put_nowait((self, packet))
-            self.current_packet = None
-            self._processBuffer()
+        for packet in self.framer.feed(data):
+            # Hand the packet straight to the game (on the reactor's thread).
+            self.factory.packet_received(self, packet)
 
 
 class GameServer(protocol.ServerFactory):
+    """
+    The server's connection factory. The server runs entirely on the
+    reactor's thread: packets are handed to the packet_received event as
+    soon as they are decoded and packets sent with send() and broadcast()
+    are packed into the clients' send buffers, which flush() writes to their
+    transports (Twisted writes them out on its next iteration).
+    
+    Events:
+    client_connected(client) -- A client has connected.
+    client_disconnected(client) -- A client has disconnected.
+    packet_received(client, packet) -- A packet has been received.
+    """
     protocol = ServerProtocol
     
     def __init__(self, world, port):
@@ -48,11 +51,12 @@ class GameServer(protocol.ServerFactory):
         self.port = port
         self.client_connected = Event()
         self.client_disconnected = Event()
-        self.input = Queue()
-        self.output = Queue()
-        self.output_broadcast = Queue()
+        self.packet_received = Event()
         self.clients = []
         self.client_count = 0
+        self.broadcast_buffer = SendBuffer()
+        # The LoopingCalls started by call_repeatedly().
+        self.loops = []
 
     def startFactory(self):
         print "Server starting and listening on port %s." % self.port
@@ -62,21 +66,60 @@ class GameServer(protocol.ServerFactory):
         print "Server stopping."
         pass
     
-    def send(self):
-        while not self.output.empty():
-            (client, packet) = self.output.get_nowait()
-            client.transport.write(packet.pack())
-        while not self.output_broadcast.empty():
-            (packet, ignore) = self.output_broadcast.get_nowait()
-            packed = packet.pack()
-            for client in self.clients:
-                if client.player is not None and client.player == ignore:
-                    continue
-                client.transport.write(packed)
+    def send(self, client, packet):
+        """ Sends a packet to a single client (on the next flush()). """
+        client.send_buffer.add(packet)
+    
+    def broadcast(self, packet, ignore=None):
+        """
+        Sends a packet to every client except the client of the player given
+        as ignore (on the next flush()).
+        """
+        # Pack the packet once and copy it into each client's buffer.
+        packed = self.broadcast_buffer
+        packed.add(packet)
+        data = packed.get_view()
+        for client in self.clients:
+            if client.player is not None and client.player == ignore:
+                continue
+            client.send_buffer.add_data(data)
+        del data
+        packed.clear()
+    
+    def flush(self):
+        """
+        Writes the packets sent since the last flush to the clients' transports,
+        a single write for each client.
+        """
+        for client in self.clients:
+            client.send_buffer.flush(client.transport.write)
+    
+    def call_repeatedly(self, interval, function):
+        """
+        Calls function every interval seconds on the reactor's thread (once
+        the reactor is running) until the server is stopped. If function
+        raises an exception, the exception is printed and the server is
+        stopped rather than carrying on without the calls.
+        """
+        loop = LoopingCall(function)
+        self.loops.append(loop)
+        loop.start(interval, now=False).addErrback(self._on_loop_failed)
+
+    def _on_loop_failed(self, failure):
+        print "Stopping the server after an error in its loop:"
+        failure.printTraceback(sys.stderr)
+        self.stop()
         
     def go(self):
+        """
+        Starts listening and runs the reactor on the calling thread until
+        stop() is called (or the process is interrupted).
+        """
         reactor.listenTCP(self.port, self)
-        reactor.run(installSignalHandlers=0)
+        reactor.run()
         
     def stop(self):
+        for loop in self.loops:
+            if loop.running: loop.stop()
+        self.loops = []
         if reactor.running: reactor.stop()
\ No newline at end of file
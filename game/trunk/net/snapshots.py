@@ -0,0 +1,223 @@
+"""
+The snapshots module builds the WorldSnapshot packets the server sends each
+client as deltas against the last snapshot the client acknowledged, and
+applies them on the client.
+
+An object's state is a tuple of the values of packets.snapshot_fields (or
+of their codes, if the snapshots are quantized), and a world state is a
+dictionary of object ids to their states.
+"""
+
+from collections import OrderedDict
+
+import packets
+
+# The number of snapshots to keep to use as baselines. A client that hasn't
+# acknowledged any of them is sent a snapshot without a baseline.
+HISTORY_SIZE = 64
+
+# The indices of the fields in a state (see packets.snapshot_fields).
+FIELD_INDICES = dict((name, i) for i, (name, format) in
+                     enumerate(packets.snapshot_fields))
+
+# The fields that are sent as an ObjectUpdate and as an ObjectStatusUpdate.
+_UPDATE_MASK = sum([1 << FIELD_INDICES[name] for name in ["x", "z",
+    "rotation", "move_speed", "move_direction", "force_x", "force_z",
+    "is_dead", "input_sequence"]])
+_STATUS_MASK = sum([1 << FIELD_INDICES[name] for name in ["health", "power"]])
+_FULL_MASK = (1 << len(packets.snapshot_fields)) - 1
+
+
+def get_delta(baseline, state):
+    """
+    Returns the mask of the fields of state that differ from baseline (a
+    state or None) and a tuple of their values.
+    """
+    if baseline is None:
+        return _FULL_MASK, state
+    mask = 0
+    values = []
+    for i in xrange(len(state)):
+        if state[i] != baseline[i]:
+            mask |= 1 << i
+            values.append(state[i])
+    return mask, tuple(values)
+
+
+def apply_delta(baseline, mask, values):
+    """
+    Returns the state of baseline (a state or None) with the fields in mask
+    set to values.
+    """
+    if mask == _FULL_MASK:
+        return tuple(values)
+    state = list(baseline)
+    values = iter(values)
+    for i in xrange(len(state)):
+        if mask & (1 << i):
+            state[i] = values.next()
+    return tuple(state)
+
+
+class SnapshotEncoder(object):
+    """
+    Keeps the world states sent recently and encodes the snapshot for the
+    current one against whichever of them a client last acknowledged. Clients
+    with the same baseline share the same packet.
+    """
+    def __init__(self, history_size=HISTORY_SIZE, quantization=None):
+        """
+        Arguments:
+        history_size -- The number of snapshots to keep as baselines.
+        quantization -- The net.quantization.Quantization to encode the
+            states with, or None to send them as they are.
+        """
+        self.history = OrderedDict()
+        self.history_size = history_size
+        self.quantization = quantization
+        self.sequence = -1
+        self.time = 0
+        self.packets = { }
+
+    def add(self, time, state):
+        """
+        Adds the world state at the given time as the next snapshot and
+        returns its sequence number. If the state is the same as the current
+        snapshot's, it is kept as the current snapshot instead (so that an
+        idle world doesn't use up sequence numbers or push the baselines
+        clients have acknowledged out of the history).
+        """
+        if self.quantization is not None:
+            # Compare the quantized states, so that changes too small to be
+            # sent don't count.
+            quantize = self.quantization.quantize
+            state = dict((object_id, quantize(object_state))
+                         for object_id, object_state in state.iteritems())
+        if self.history.get(self.sequence) == state:
+            return self.sequence
+        self.sequence = (self.sequence + 1) % 0x10000
+        self.time = time
+        self.history[self.sequence] = state
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+        self.packets = { }
+        return self.sequence
+
+    def get_packet(self, baseline_sequence=None):
+        """
+        Returns the WorldSnapshot packet of the current snapshot as a delta
+        against the snapshot with baseline_sequence, or with no baseline if
+        that isn't given or is no longer kept.
+        """
+        if baseline_sequence not in self.history or \
+            baseline_sequence == self.sequence:
+            baseline_sequence = self.sequence
+        try:
+            return self.packets[baseline_sequence]
+        except KeyError:
+            pass
+        state = self.history[self.sequence]
+        if baseline_sequence == self.sequence:
+            baseline = { }
+        else:
+            baseline = self.history[baseline_sequence]
+        entries = []
+        for object_id, object_state in state.iteritems():
+            mask, values = get_delta(baseline.get(object_id), object_state)
+            if mask:
+                entries.append((object_id, mask, values))
+        for object_id in baseline:
+            if object_id not in state:
+                entries.append((object_id, packets.WorldSnapshot.mask_removed, ()))
+        snapshot = packets.WorldSnapshot()
+        snapshot.sequence = self.sequence
+        snapshot.baseline_sequence = baseline_sequence
+        snapshot.time = self.time
+        snapshot.entries = entries
+        snapshot.quantization = self.quantization
+        self.packets[baseline_sequence] = snapshot
+        return snapshot
+
+
+class SnapshotDecoder(object):
+    """
+    Keeps the world states of the snapshots received recently to apply the
+    following snapshots to, and turns each snapshot into the ObjectUpdate and
+    ObjectStatusUpdate packets for the objects that changed since the
+    previous one. The ObjectUpdates have the snapshot's time set.
+    """
+    def __init__(self, history_size=HISTORY_SIZE, quantization=None):
+        """
+        Arguments:
+        history_size -- The number of snapshots to keep.
+        quantization -- The net.quantization.Quantization to decode
+            quantized snapshots with (the same as the server's), or None if
+            the server doesn't quantize them.
+        """
+        self.history = OrderedDict()
+        self.history_size = history_size
+        self.quantization = quantization
+        self.state = { }
+
+    def apply(self, snapshot):
+        """
+        Applies a WorldSnapshot packet and returns a list of the ObjectUpdate
+        and ObjectStatusUpdate packets for it, or None if its baseline is no
+        longer kept (in which case it shouldn't be acknowledged).
+        """
+        if snapshot.entries is None:
+            if self.quantization is None:
+                raise ValueError("Received a quantized WorldSnapshot without a quantization set.")
+            snapshot.decode_entries(self.quantization)
+        if snapshot.baseline_sequence == snapshot.sequence:
+            baseline = { }
+        elif snapshot.baseline_sequence in self.history:
+            baseline = self.history[snapshot.baseline_sequence]
+        else:
+            return None
+        state = dict(baseline)
+        for object_id, mask, values in snapshot.entries:
+            if mask & packets.WorldSnapshot.mask_removed:
+                state.pop(object_id, None)
+            else:
+                state[object_id] = apply_delta(baseline.get(object_id), mask, values)
+        self.history[snapshot.sequence] = state
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+
+        # Only objects that changed since the previous snapshot need
+        # updating (the baseline may be older than it).
+        result = []
+        previous = self.state
+        dequantize = None
+        if snapshot.quantization is not None:
+            dequantize = snapshot.quantization.dequantize
+        for object_id, object_state in state.iteritems():
+            mask, values = get_delta(previous.get(object_id), object_state)
+            if mask and dequantize is not None:
+                object_state = dequantize(object_state)
+            if mask & _UPDATE_MASK:
+                result.append(self._get_update(object_id, object_state,
+                                               snapshot.time))
+            if mask & _STATUS_MASK:
+                result.append(self._get_status_update(object_id, object_state))
+        self.state = state
+        return result
+
+    def _get_update(self, object_id, state, time):
+        update = packets.ObjectUpdate()
+        update.object_id = object_id
+        update.time = time
+        update.x, update.z, update.rotation, update.move_speed, \
+            update.move_direction, update.force_x, update.force_z, is_dead = \
+            state[:FIELD_INDICES["is_dead"] + 1]
+        update.is_dead = bool(is_dead)
+        update.input_sequence = state[FIELD_INDICES["input_sequence"]]
+        return update
+
+    def _get_status_update(self, object_id, state):
+        update = packets.ObjectStatusUpdate()
+        update.object_id = object_id
+        update.health = state[FIELD_INDICES["health"]]
+        update.power = state[FIELD_INDICES["power"]]
+        return update
@@ -0,0 +1,582 @@
+"""
+The udp module contains a UDP transport for the game, an alternative to the
+TCP GameServer and GameClient that a lost datagram doesn't hold up the
+packets after it (as a lost TCP segment holds up everything after it).
+
+Every datagram has a sequence number and acknowledges the last 33
+datagrams received from the other end (the most recent sequence number and
+a bitfield of the 32 before it). On top of that there are two channels:
+
+- An unreliable, latest wins channel for the packets that are superseded by
+  the next one anyway (ObjectUpdate, WorldSnapshot and SnapshotAck): they
+  are sent once and dropped if a more recent datagram has already brought
+  one that supersedes them (an ObjectUpdate for the same object, or any
+  WorldSnapshot or SnapshotAck).
+- A reliable, ordered channel for everything else (JoinResponse,
+  PlayerUpdate, AbilityUsed, ScoreUpdate, Message, RoundStart, RoundEnd,
+  ClientDisconnect and so on): they are resent until a datagram they were
+  in is acknowledged and are handed over in the order they were sent. At
+  most RELIABLE_WINDOW of them are in flight at once, which bounds those
+  the other end has to hold on to until the ones before them arrive.
+
+A client connects by sending connect datagrams with a random nonce until the
+server accepts with the same nonce. Connections are dropped when nothing
+has been received from them for TIMEOUT seconds, so both ends send a keep
+alive datagram when they have nothing else to send.
+
+The Connection class does all of this without any sockets; UdpGameServer
+and UdpGameClient run it over Twisted. See net.benchmark --udp for a
+loopback test with datagrams being lost.
+"""
+
+from __future__ import division
+import random
+import socket
+import struct
+import sys
+from collections import OrderedDict
+from Queue import Queue
+
+from twisted.internet import reactor, protocol
+from twisted.internet.task import LoopingCall
+
+from event import Event
+from timestep import get_time
+import packets
+
+# The kinds of datagrams.
+KIND_CONNECT = 1
+KIND_ACCEPT = 2
+KIND_DATA = 3
+KIND_DISCONNECT = 4
+
+# The channels of the messages in a data datagram.
+CHANNEL_UNRELIABLE = 0
+CHANNEL_RELIABLE = 1
+
+# The packets sent on the unreliable channel.
+# PlayerUpdates are inputs that the server applies one after the other, so
+# they aren't among them.
+UNRELIABLE_PACKETS = frozenset([packets.ObjectUpdate, packets.WorldSnapshot,
+                                packets.SnapshotAck])
+
+# The most reliable messages sent but not acknowledged at once (counting
+# from the oldest), and so the most the other end buffers out of order.
+RELIABLE_WINDOW = 1024
+
+# Unreliable messages in datagrams this far behind the most recent one are
+# dropped, and the newest sequence numbers recorded for the latest wins
+# channel are forgotten once they are this far behind (before they wrap
+# around and look more recent than new ones).
+UNRELIABLE_WINDOW = 1024
+
+# The most to put in one datagram (unless a single packet is bigger), which
+# keeps them within the MTU of most links.
+MAX_DATAGRAM_SIZE = 1200
+
+# The shortest time to wait for an acknowledgement before resending, and the
+# time to wait until the round trip time is known.
+MIN_RESEND_TIME = 0.05
+DEFAULT_RESEND_TIME = 0.2
+
+# The time after which to send a datagram even if there is nothing to send.
+KEEP_ALIVE_TIME = 0.25
+
+# The time without receiving anything after which a connection is dropped.
+TIMEOUT = 5
+
+# The time between connect datagrams while connecting.
+CONNECT_RETRY_TIME = 0.25
+
+_header = struct.Struct("!B H H I") # kind sequence ack ack_bits
+_nonce = struct.Struct("!I")
+_unreliable_message = struct.Struct("!B") # channel
+_reliable_message = struct.Struct("!B H") # channel reliable_sequence
+_packet_size = struct.Struct("!H")
+_packet_size_offset = 1 # The size comes after the packet's id.
+
+
+def is_more_recent(a, b):
+    """
+    Returns whether the 16 bit sequence number a is more recent than b,
+    allowing for them wrapping around.
+    """
+    return a != b and ((a - b) & 0xFFFF) < 0x8000
+
+
+def get_supersede_key(packet):
+    """
+    Returns the key of an unreliable packet on the latest wins channel: a
+    packet supersedes those before it with the same key.
+    """
+    if type(packet) is packets.ObjectUpdate:
+        return (packet.id, packet.object_id)
+    return packet.id
+
+
+class Connection(object):
+    """
+    One end of a connection: the sequence numbers, acknowledgements and
+    channels, without the sockets. Packets given to send() are packed into
+    datagrams by get_datagrams() and receive() turns the datagrams from the
+    other end back into packets.
+
+    Attributes:
+    address -- The address of the other end.
+    rtt -- The smoothed round trip time in seconds (None until known).
+    last_received_time -- The time the last datagram was received.
+    """
+    def __init__(self, address, clock=get_time):
+        self.address = address
+        self.clock = clock
+        self.sequence = 0
+        self.remote_sequence = None
+        self.ack_bits = 0
+        # The datagrams sent that haven't been acknowledged: their sequence
+        # numbers to the time they were sent and the reliable messages in
+        # them.
+        self.sent = OrderedDict()
+        self.reliable_sequence = 0
+        # The reliable messages that haven't been acknowledged: their
+        # sequence numbers to [packed packet, time last sent].
+        self.reliable_out = OrderedDict()
+        self.unreliable_out = []
+        self.expected_reliable = 0
+        self.reliable_in = { }
+        # The keys of the unreliable packets received (see
+        # get_supersede_key()) to the sequence number of the newest datagram
+        # that brought one, and the sequence number they were last pruned at.
+        self.newest_unreliable = { }
+        self.pruned_sequence = None
+        self.rtt = None
+        self.last_received_time = clock()
+        self.last_sent_time = None
+        # Whether reliable messages have been received since the last
+        # datagram sent (which are acknowledged straight away, rather than
+        # waiting for something else to send).
+        self.ack_pending = False
+
+    def send(self, packet, packed=None):
+        """
+        Queues a packet to go out in the next get_datagrams() on the channel
+        for its type. packed is the packet already packed, if it is.
+        """
+        if packed is None:
+            packed = packet.pack()
+        if type(packet) in UNRELIABLE_PACKETS:
+            self.unreliable_out.append(packed)
+        else:
+            self.reliable_out[self.reliable_sequence] = [packed, None]
+            self.reliable_sequence = (self.reliable_sequence + 1) & 0xFFFF
+
+    def get_resend_time(self):
+        """ Returns the time to wait for a reliable message to be acked. """
+        if self.rtt is None:
+            return DEFAULT_RESEND_TIME
+        return max(MIN_RESEND_TIME, 2 * self.rtt)
+
+    def get_datagrams(self):
+        """
+        Returns a list of the datagrams to send for the packets queued since
+        the last call and the reliable messages that are due to be resent
+        (or a keep alive if it's been a while since anything was sent).
+        """
+        now = self.clock()
+        resend_time = self.get_resend_time()
+        messages = []
+        oldest = None
+        for reliable_sequence, message in self.reliable_out.iteritems():
+            if oldest is None:
+                oldest = reliable_sequence
+            elif (reliable_sequence - oldest) & 0xFFFF >= RELIABLE_WINDOW:
+                # The rest wait until the oldest have been acknowledged.
+                break
+            if message[1] is None or now - message[1] >= resend_time:
+                message[1] = now
+                messages.append((_reliable_message.pack(CHANNEL_RELIABLE,
+                    reliable_sequence) + message[0], reliable_sequence))
+        for packed in self.unreliable_out:
+            messages.append((_unreliable_message.pack(CHANNEL_UNRELIABLE) +
+                packed, None))
+        self.unreliable_out = []
+
+        if not messages:
+            if not self.ack_pending and self.last_sent_time is not None and \
+                now - self.last_sent_time < KEEP_ALIVE_TIME:
+                return []
+            return [self._get_datagram(now, [], [])]
+
+        datagrams = []
+        data = []
+        reliable = []
+        size = _header.size
+        for message, reliable_sequence in messages:
+            if data and size + len(message) > MAX_DATAGRAM_SIZE:
+                datagrams.append(self._get_datagram(now, data, reliable))
+                data = []
+                reliable = []
+                size = _header.size
+            data.append(message)
+            size += len(message)
+            if reliable_sequence is not None:
+                reliable.append(reliable_sequence)
+        datagrams.append(self._get_datagram(now, data, reliable))
+        return datagrams
+
+    def _get_datagram(self, now, data, reliable):
+        sequence = self.sequence
+        self.sequence = (sequence + 1) & 0xFFFF
+        self.sent[sequence] = (now, reliable)
+        # Datagrams too old to be in an ack bitfield never will be.
+        while len(self.sent) > 33 and \
+            not is_more_recent(self.sent.keys()[0], (sequence - 33) & 0xFFFF):
+            self.sent.popitem(last=False)
+        self.last_sent_time = now
+        self.ack_pending = False
+        # Until something has been received, ack the sequence number before
+        # our first so that nothing is acknowledged.
+        ack = self.remote_sequence if self.remote_sequence is not None else 0xFFFF
+        return _header.pack(KIND_DATA, sequence, ack, self.ack_bits) + \
+            "".join(data)
+
+    def get_control_datagram(self, kind, nonce=0):
+        """ Returns a connect, accept or disconnect datagram. """
+        return _header.pack(kind, 0, 0, 0) + _nonce.pack(nonce)
+
+    def receive(self, datagram):
+        """
+        Takes a data datagram from the other end and returns a list of the
+        packets to hand over from it.
+        """
+        self.last_received_time = now = self.clock()
+        kind, sequence, ack, ack_bits = _header.unpack_from(datagram)
+
+        # Record the datagram to acknowledge it.
+        if self.remote_sequence is None:
+            self.remote_sequence = sequence
+        elif is_more_recent(sequence, self.remote_sequence):
+            shift = (sequence - self.remote_sequence) & 0xFFFF
+            if shift > 32:
+                self.ack_bits = 0
+            else:
+                self.ack_bits = ((self.ack_bits << shift) |
+                                 (1 << (shift - 1))) & 0xFFFFFFFF
+            self.remote_sequence = sequence
+        else:
+            behind = (self.remote_sequence - sequence) & 0xFFFF
+            if 1 <= behind <= 32:
+                self.ack_bits |= 1 << (behind - 1)
+
+        # Handle its acknowledgements of ours.
+        for sent_sequence in self.sent.keys():
+            behind = (ack - sent_sequence) & 0xFFFF
+            if behind == 0 or (behind <= 32 and (ack_bits >> (behind - 1)) & 1):
+                sent_time, reliable = self.sent.pop(sent_sequence)
+                for reliable_sequence in reliable:
+                    self.reliable_out.pop(reliable_sequence, None)
+                if behind == 0:
+                    sample = now - sent_time
+                    if self.rtt is None:
+                        self.rtt = sample
+                    else:
+                        self.rtt += (sample - self.rtt) / 10
+
+        # Unreliable messages only count if nothing newer has superseded
+        # them.
+        is_too_old = (self.remote_sequence - sequence) & 0xFFFF >= UNRELIABLE_WINDOW
+        if self.pruned_sequence is None:
+            self.pruned_sequence = sequence
+        elif (self.remote_sequence - self.pruned_sequence) & 0xFFFF >= UNRELIABLE_WINDOW:
+            self.pruned_sequence = self.remote_sequence
+            for key, newest in self.newest_unreliable.items():
+                if (self.remote_sequence - newest) & 0xFFFF >= UNRELIABLE_WINDOW:
+                    del self.newest_unreliable[key]
+
+        received = []
+        view = memoryview(datagram)
+        offset = _header.size
+        end = len(datagram)
+        while offset < end:
+            channel = ord(datagram[offset])
+            if channel == CHANNEL_RELIABLE:
+                channel, reliable_sequence = _reliable_message.unpack_from(view, offset)
+                offset += _reliable_message.size
+            else:
+                offset += _unreliable_message.size
+            size, = _packet_size.unpack_from(view, offset + _packet_size_offset)
+            if size < packets.Packet.header.size:
+                raise ValueError("Malformed packet (size %s)." % size)
+            if channel == CHANNEL_RELIABLE:
+                self.ack_pending = True
+                if reliable_sequence == self.expected_reliable:
+                    received.append(packets.unpack(view, offset))
+                    self.expected_reliable = (self.expected_reliable + 1) & 0xFFFF
+                    # Hand over the messages that were waiting for it.
+                    while self.expected_reliable in self.reliable_in:
+                        received.append(self.reliable_in.pop(self.expected_reliable))
+                        self.expected_reliable = (self.expected_reliable + 1) & 0xFFFF
+                elif is_more_recent(reliable_sequence, self.expected_reliable) and \
+                    (reliable_sequence - self.expected_reliable) & 0xFFFF < RELIABLE_WINDOW:
+                    self.reliable_in[reliable_sequence] = packets.unpack(view, offset)
+            elif not is_too_old:
+                packet = packets.unpack(view, offset)
+                key = get_supersede_key(packet)
+                newest = self.newest_unreliable.get(key)
+                if newest is None or not is_more_recent(newest, sequence):
+                    self.newest_unreliable[key] = sequence
+                    received.append(packet)
+            offset += size
+        return received
+
+
+class UdpClientConnection(Connection):
+    """ A client's connection to the UdpGameServer. """
+    def __init__(self, address, client_id, nonce, clock=get_time):
+        Connection.__init__(self, address, clock)
+        self.client_id = client_id
+        self.nonce = nonce
+        self.player = None
+
+
+class UdpGameServer(protocol.DatagramProtocol):
+    """
+    A UDP version of net.server.GameServer. The server runs entirely on the
+    reactor's thread: packets are handed to the packet_received event as
+    soon as they are received and packets sent with send() and broadcast()
+    are sent in datagrams by flush().
+
+    Events:
+    client_connected(client) -- A client has connected.
+    client_disconnected(client) -- A client has disconnected.
+    packet_received(client, packet) -- A packet has been received.
+    """
+    def __init__(self, world, port, clock=get_time):
+        self.world = world
+        self.port = port
+        self.clock = clock
+        self.client_connected = Event()
+        self.client_disconnected = Event()
+        self.packet_received = Event()
+        self.clients = []
+        self.client_count = 0
+        self.connections = { }
+        # The LoopingCalls started by call_repeatedly().
+        self.loops = []
+        # The fraction of datagrams to drop on purpose (for testing).
+        self.loss = 0
+
+    def _write(self, datagram, address):
+        if self.loss and random.random() < self.loss:
+            return
+        self.transport.write(datagram, address)
+
+    def datagramReceived(self, datagram, address):
+        if len(datagram) < _header.size:
+            return
+        kind = ord(datagram[0])
+        client = self.connections.get(address)
+        if kind == KIND_CONNECT:
+            nonce, = _nonce.unpack_from(datagram, _header.size)
+            if client is not None and client.nonce != nonce:
+                # The client has restarted on the same address.
+                self._remove_client(client)
+                client = None
+            if client is None:
+                self.client_count += 1
+                client = UdpClientConnection(address, self.client_count, nonce,
+                                             self.clock)
+                self.connections[address] = client
+                self.clients.append(client)
+                print "New connection #%s client=%s from %s." % \
+                    (len(self.clients), client.client_id, address)
+                self.client_connected(client)
+            # Accept it every time, in case the last accept was lost.
+            self._write(client.get_control_datagram(KIND_ACCEPT, nonce), address)
+        elif client is None:
+            pass
+        elif kind == KIND_DATA:
+            for packet in client.receive(datagram):
+                self.packet_received(client, packet)
+        elif kind == KIND_DISCONNECT:
+            self._remove_client(client)
+
+    def _remove_client(self, client):
+        del self.connections[client.address]
+        self.clients.remove(client)
+        self.client_disconnected(client)
+        print "Lost connection #%s client=%s from %s." % \
+            (len(self.clients)+1, client.client_id, client.address)
+
+    def send(self, client, packet):
+        """ Sends a packet to a single client (on the next flush()). """
+        client.send(packet)
+
+    def broadcast(self, packet, ignore=None):
+        """
+        Sends a packet to every client except the client of the player given
+        as ignore (on the next flush()).
+        """
+        packed = packet.pack()
+        for client in self.clients:
+            if client.player is not None and client.player == ignore:
+                continue
+            client.send(packet, packed)
+
+    def flush(self):
+        """
+        Sends the packets sent since the last flush (and resends the
+        reliable ones that haven't been acknowledged) and drops the clients
+        that have timed out.
+        """
+        now = self.clock()
+        for client in list(self.clients):
+            if now - client.last_received_time > TIMEOUT:
+                self._remove_client(client)
+                continue
+            for datagram in client.get_datagrams():
+                self._write(datagram, client.address)
+
+    def call_repeatedly(self, interval, function):
+        """
+        Calls function every interval seconds on the reactor's thread (once
+        the reactor is running) until the server is stopped. If function
+        raises an exception, the exception is printed and the server is
+        stopped rather than carrying on without the calls.
+        """
+        loop = LoopingCall(function)
+        self.loops.append(loop)
+        loop.start(interval, now=False).addErrback(self._on_loop_failed)
+
+    def _on_loop_failed(self, failure):
+        print "Stopping the server after an error in its loop:"
+        failure.printTraceback(sys.stderr)
+        self.stop()
+
+    def listen(self):
+        """ Starts listening for clients (go() does this). """
+        reactor.listenUDP(self.port, self)
+        print "Server starting and listening on port %s." % self.port
+
+    def go(self):
+        """
+        Starts listening and runs the reactor on the calling thread until
+        stop() is called (or the process is interrupted).
+        """
+        self.listen()
+        reactor.run()
+
+    def stop(self):
+        for loop in self.loops:
+            if loop.running: loop.stop()
+        self.loops = []
+        if self.transport is not None:
+            for client in self.clients:
+                self._write(client.get_control_datagram(KIND_DISCONNECT),
+                            client.address)
+        if reactor.running: reactor.stop()
+
+
+class UdpGameClient(protocol.DatagramProtocol):
+    """
+    A UDP version of net.client.GameClient: packets received are put on
+    the input queue and the packets put on the output queue are sent by
+    send() (which must be called on the reactor's thread).
+
+    Events:
+    connected() -- The server has accepted the connection.
+    """
+    def __init__(self, world, addr, port, clock=get_time):
+        self.world = world
+        self.addr = addr
+        self.port = port
+        self.clock = clock
+        self.connected = Event()
+        self.input = Queue()
+        self.output = Queue()
+        self.connection = None
+        self.nonce = random.randint(1, 0xFFFFFFFF)
+        self.connect_time = None
+        self.last_connect_time = None
+        self.loop = None
+        # The fraction of datagrams to drop on purpose (for testing).
+        self.loss = 0
+
+    def _write(self, datagram):
+        if self.loss and random.random() < self.loss:
+            return
+        self.transport.write(datagram)
+
+    def startProtocol(self):
+        self.transport.connect(socket.gethostbyname(self.addr), self.port)
+        self.connect_time = self.clock()
+        self.loop = LoopingCall(self._update)
+        self.loop.start(CONNECT_RETRY_TIME / 5)
+
+    def _update(self):
+        now = self.clock()
+        if self.connection is None:
+            # Keep trying to connect until accepted.
+            if now - self.connect_time > TIMEOUT:
+                print "Connection failed: no reply from %s:%s." % (self.addr, self.port)
+                self.stop()
+            elif self.last_connect_time is None or \
+                now - self.last_connect_time >= CONNECT_RETRY_TIME:
+                self.last_connect_time = now
+                self._write(_header.pack(KIND_CONNECT, 0, 0, 0) +
+                            _nonce.pack(self.nonce))
+        elif now - self.connection.last_received_time > TIMEOUT:
+            print "Connection lost: timed out."
+            self.stop()
+        else:
+            # Keep the connection alive (and acknowledge what we receive)
+            # even if the game isn't sending anything.
+            for datagram in self.connection.get_datagrams():
+                self._write(datagram)
+
+    def datagramReceived(self, datagram, address):
+        if len(datagram) < _header.size:
+            return
+        kind = ord(datagram[0])
+        if kind == KIND_ACCEPT:
+            nonce, = _nonce.unpack_from(datagram, _header.size)
+            if self.connection is None and nonce == self.nonce:
+                self.connection = Connection(address, self.clock)
+                print "Connected to %s:%s." % address
+                self.connected()
+        elif self.connection is None:
+            pass
+        elif kind == KIND_DATA:
+            for packet in self.connection.receive(datagram):
+                self.input.put_nowait(packet)
+        elif kind == KIND_DISCONNECT:
+            print "Connection lost: the server disconnected."
+            self.stop()
+
+    def connectionRefused(self):
+        # Only while connecting (an ICMP port unreachable); keep retrying
+        # until the timeout as the server may just not be up yet.
+        pass
+
+    def send(self):
+        if self.connection is None:
+            return
+        while not self.output.empty():
+            self.connection.send(self.output.get_nowait())
+        for datagram in self.connection.get_datagrams():
+            self._write(datagram)
+
+    def listen(self):
+        """ Starts connecting (go() does this). """
+        reactor.listenUDP(0, self)
+
+    def go(self):
+        self.listen()
+        reactor.run(installSignalHandlers=0)
+
+    def stop(self):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        if self.connection is not None and self.transport is not None:
+            self._write(self.connection.get_control_datagram(KIND_DISCONNECT))
+            self.connection = None
+        if reactor.running: reactor.stop()
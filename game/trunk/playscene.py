@@ -1,5 +1,6 @@
 from __future__ import division
 import threading, time, math
+from collections import deque
 
 # Import OGRE-specific (and other UI-Client) external packages and modules.
 import ogre.renderer.OGRE as ogre
@@ -9,6 +10,7 @@ from twisted.internet import reactor
 # Import internal packages and modules modules.
 import gamestate, net
 from net import packets
+from net.udp import is_more_recent
 import SceneLoader
 from inputhandler import InputHandler
 from event import Event, SchedulerManager
@@ -261,8 +263,10 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
     sets up the initial scene and acts as the main game loop (via
     frameStarted()).
     """
+    # The most inputs to keep waiting for the server to apply them.
+    input_history_size = 64
 
-    def __init__(self, sceneManager, address, port, player_name):
+    def __init__(self, sceneManager, address, port, player_name, transport="tcp"):
         # Initialize the various listener classes we are a subclass from
         ogre.FrameListener.__init__(self)
         ogre.WindowEventListener.__init__(self)
@@ -270,6 +274,7 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
         
         self.address = address
         self.port = port
+        self.transport = transport
         self.player_name = player_name
         self.is_round_active = False
         
@@ -282,10 +287,23 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
         
         self.player = None
         self.last_update = None
+        # The inputs sent that the server hasn't applied yet, as
+        # (input_sequence, distance, direction) tuples, and the player's
+        # moves since the last one as (distance, direction) tuples.
+        self.inputs = deque(maxlen=self.input_history_size)
+        self.input_sequence = 0
+        self.input_moves = []
         self.scores = { }
         self.scores_changed = Event()
         self.game_nodes = { }
         self.players = { }
+        # The server may send quantized snapshots, which are decoded with
+        # the same quantization it uses.
+        self.snapshots = net.snapshots.SnapshotDecoder(
+            quantization=net.quantization.get_default_quantization())
+        # The other objects are shown a little behind the server's time,
+        # interpolating between the states in the snapshots.
+        self.interpolator = net.interpolation.Interpolator()
         
         # Come up with a non-static way of doing this.
         self.nodes = []
@@ -352,7 +370,11 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
         self.scene = gamestate.scenes.TestScene(self.world)
 
         # Create the client and set listeners.
-        self.client = net.client.GameClient(self.world, self.address, self.port)
+        if self.transport == "udp":
+            from net.udp import UdpGameClient
+            self.client = UdpGameClient(self.world, self.address, self.port)
+        else:
+            self.client = net.client.GameClient(self.world, self.address, self.port)
         self.client.connected += self.on_client_connected
         
         # Start the netclient and connect.
@@ -454,6 +476,12 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
         # Update the game state world.
         self.world.update(dt)
         
+        # Move the other objects to where the server had them.
+        self._interpolate()
+        
+        # Add the player's movement to the next PlayerUpdate.
+        self._record_input(dt)
+        
         # Update the audio module so it can throw its events
         audio.update(dt)
         
@@ -481,9 +509,53 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
         self.nodes.remove(node)
         
     ## Net event callbacks & helpers
+    def _interpolate(self):
+        """
+        Moves the other objects in the snapshots to where they were a
+        little behind the server's time (see net.interpolation).
+        """
+        for object_id, (x, z, rotation) in \
+            self.interpolator.get_states(self.world.time):
+            if self.world.objects_hash.has_key(object_id):
+                object = self.world.objects_hash[object_id]
+                object.position = (x, z)
+                object.rotation = rotation
+
+    def _record_input(self, dt):
+        """
+        Adds the player's own movement over the last frame to the input the
+        next PlayerUpdate will send.
+        """
+        if self.player is None or self.player.is_dead:
+            return
+        if self.player.is_moving:
+            self.input_moves.append((self.player.move_speed * dt,
+                self.player.rotation + self.player.move_direction))
+
+    def _clear_inputs(self):
+        """ Forgets the inputs the server hasn't applied yet. """
+        self.inputs.clear()
+        self.input_moves = []
+
+    def _reconcile(self, update):
+        """
+        Moves the player to the position in an ObjectUpdate from a
+        WorldSnapshot, then replays the inputs sent after the last one the
+        server had applied (and the movement since) on top of it. The player
+        ends up where the server will have it once it applies them, so the
+        server stays authoritative without moving the player back.
+        """
+        inputs = self.inputs
+        while inputs and not is_more_recent(inputs[0][0], update.input_sequence):
+            inputs.popleft()
+        moves = [(distance, direction)
+                 for input_sequence, distance, direction in inputs]
+        self.player.replay_moves((update.x, update.z), moves + self.input_moves)
+
     def _send_update(self, check_time=True):
         """ Sends a PlayerUpdate packet to the server if appropriate. """
         if self.player is None or self.player.is_dead:
+            self._clear_inputs()
             return
 
         update = self._get_update()
@@ -499,8 +571,34 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
                 last_update.rotation == update.rotation and \
                 last_update.move_speed == update.move_speed and \
                 last_update.move_direction == update.move_direction:
+                # The player hasn't moved, so there is no input to send.
+                self.input_moves = []
                 return
         
+        # Send the moves since the last update as the next input. They are
+        # summed into a single move, so that the server moves the player as
+        # far and in the same direction however it turned in between.
+        move_x = sum([distance * math.cos(direction)
+                      for distance, direction in self.input_moves])
+        move_z = sum([distance * math.sin(direction)
+                      for distance, direction in self.input_moves])
+        distance = math.sqrt(move_x ** 2 + move_z ** 2)
+        if distance > 0 and self.player.move_speed > 0:
+            update.move_speed = self.player.move_speed
+            update.move_direction = math.atan2(move_z, move_x) - update.rotation
+            update.duration = min(distance / update.move_speed,
+                                  packets.PlayerUpdate.max_duration)
+        else:
+            update.move_speed = 0
+            update.move_direction = 0
+            update.duration = 0
+        self.input_sequence = (self.input_sequence + 1) % 0x10000
+        update.input_sequence = self.input_sequence
+        self.inputs.append((update.input_sequence,
+            update.move_speed * update.duration,
+            update.rotation + update.move_direction))
+        self.input_moves = []
+        
         # print "Sending player update to server."
         self.client.output.put_nowait(update)
         self.last_update = (self.world.time, update)
@@ -548,6 +646,7 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
         if ptype is packets.SpawnResponse:
             self.player.change_element(packet.element_type)
             self.player.position = (packet.x, packet.z)
+            self._clear_inputs()
             self.world.add_object(self.player, self.player.object_id)
             self.gui.setup_player_gui(self.player)
             self.is_round_active = True
@@ -576,6 +675,13 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
                 object = self.world.objects_hash[packet.object_id]
                 # print "Updating object id=%s." % object.object_id
                 if packet.forced:
+                    if object == self.player:
+                        # The server has moved the player regardless of
+                        # the inputs it is yet to apply.
+                        self._clear_inputs()
+                    else:
+                        # Don't interpolate to where the object went.
+                        self.interpolator.clear(object.object_id)
                     object.position = (packet.x, packet.z)
                     object.rotation = packet.rotation
                     if packet.move_speed > 0:
@@ -595,35 +701,24 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
                         object.is_dead = packet.is_dead
                         if packet.move_speed > 0:
                             object.move_speed = packet.move_speed
-                        diff_vector = ogre.Vector2(packet.x - object.position[0],
-                                                   packet.z - object.position[1])
-                 #       if diff_vector.squaredLength() > 500:
-                            # If the server tells us we're far from where we think
-                            # we are, then warp to the server's location.
-                  #          object.position = (packet.x, packet.z)
+                        if packet.input_sequence is not None:
+                            # Correct our position to the server's.
+                            self._reconcile(packet)
                     else:
                         # This is an update for another game object.
                         if packet.move_speed > 0:
                             object.is_moving = True
                             object.move_direction = packet.move_direction
                             object.move_speed = packet.move_speed
-                            
-                            diff_vector = ogre.Vector3(packet.x - object.position[0], 0, packet.z - object.position[1])
-                            if diff_vector.squaredLength() > 500:
-                                # If the server's location is far from where we
-                                # thinkt his player is, then, then don't smooth.
-                                object.position = (packet.x, packet.z)
-                                object.rotation = packet.rotation
-                            else:
-                                # Smooth the difference in locations.
-                                move_vector = ogre.Vector3(packet.move_speed * math.cos(packet.rotation + packet.move_direction), 0,
-                                                           packet.move_speed * math.sin(packet.rotation + packet.move_direction))
-                                resultant = diff_vector + move_vector
-                                angle = math.atan2(resultant.z, resultant.x)
-                                object.rotation = angle - packet.move_direction
                         else:
-                            object.position = (packet.x, packet.z)
                             object.is_moving = False
+                        if packet.time is None:
+                            # Updates sent on their own (when the object is
+                            # added to the world) move it straight there,
+                            # while the ones from snapshots are interpolated
+                            # (see _interpolate()).
+                            self.interpolator.clear(object.object_id)
+                            object.position = (packet.x, packet.z)
                     if object.type == "player":
                         if packet.is_dead:
                             object.is_dead = packet.is_dead
@@ -636,6 +731,27 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
                 object.power = packet.power
             else:
                 print "Ignoring ObjectStatusUpdate because player is not in world."
+
+        # WorldSnapshot
+        elif ptype is packets.WorldSnapshot:
+            updates = self.snapshots.apply(packet)
+            if updates is not None:
+                # Apply the updates for the objects that changed as if they
+                # had been sent on their own.
+                for update in updates:
+                    self.process_packet(update)
+                # The positions of the other objects are interpolated.
+                self.interpolator.add_snapshot(packet.time, self.world.time,
+                    [update for update in updates
+                     if type(update) is packets.ObjectUpdate and
+                     (self.player is None or
+                      update.object_id != self.player.object_id) and
+                     self.world.objects_hash.has_key(update.object_id)])
+                # Let the server know it can send deltas against this
+                # snapshot.
+                ack = packets.SnapshotAck()
+                ack.sequence = packet.sequence
+                self.client.output.put_nowait(ack)
         
         # ObjectRemove
         elif ptype is packets.ObjectRemove:
@@ -730,7 +846,7 @@ class PlayScene(ogre.FrameListener, ogre.WindowEventListener, SchedulerManager):
             
     def on_world_object_removed(self, object):
         # @todo: Remove nodes at some point for players no longer here.
-        pass
+        self.interpolator.remove(object.object_id)
         
     def on_player_position_changed(self, mobileObject, position):
         self.cameraNode.position = (position[0], 100, position[1] + 100)
@@ -0,0 +1,9 @@
+# This file is here so that python knows this folder should be treated as a
+# package.
+
+"""
+The tests package contains the unit tests of the game. Run them from the
+game's directory with:
+
+    python -m unittest discover
+"""
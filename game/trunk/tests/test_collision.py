@@ -0,0 +1,233 @@
+"""
+Tests of the plain float collision detection routines in the collision module
+against the original ogre.Vector3 based ones in the ogrecollision module, over
+randomized shapes and positions given both as ints and as floats. They are
+skipped if OGRE isn't installed.
+"""
+
+import math
+import random
+import unittest
+
+from gamestate.collision import BoundingCircle, BoundingCone, \
+    BoundingLineSegment, BoundingRectangle, CollisionDetector
+
+try:
+    from gamestate import ogrecollision
+except ImportError:
+    ogrecollision = None
+
+# The seed of the random shapes and positions, so that failures can be
+# reproduced.
+SEED = 1234
+
+# The number of random cases to check each routine with, for both ints and
+# floats.
+CASES = 500
+
+# The largest coordinate of the random positions.
+EXTENT = 15
+
+
+def _get_number(rng, integer, low, high):
+    if integer:
+        return rng.randint(low, high)
+    return rng.uniform(low, high)
+
+def _get_point(rng, integer):
+    return (_get_number(rng, integer, -EXTENT, EXTENT),
+            _get_number(rng, integer, -EXTENT, EXTENT))
+
+def _get_circle(rng, integer, is_hollow=False):
+    return BoundingCircle(_get_number(rng, integer, 1, 8), is_hollow)
+
+def _get_line(rng, integer):
+    """ Returns a random line segment of non-zero length with its normal. """
+    point1 = _get_point(rng, integer)
+    point2 = point1
+    while point2 == point1:
+        point2 = _get_point(rng, integer)
+    vx = point2[0] - point1[0]
+    vz = point2[1] - point1[1]
+    length = math.sqrt(vx * vx + vz * vz)
+    return BoundingLineSegment(point1, point2, (-vz / length, vx / length))
+
+def _get_rectangle(rng, integer):
+    return BoundingRectangle(_get_number(rng, integer, 2, 20),
+                             _get_number(rng, integer, 2, 20),
+                             _get_number(rng, integer, 0, 359))
+
+def _get_cone(rng, integer):
+    return BoundingCone(_get_number(rng, integer, 1, 20),
+                        rng.uniform(-math.pi, math.pi), rng.uniform(0.1, math.pi))
+
+def _call(function, arguments):
+    """
+    Returns ("result", the result) of calling function with the given
+    arguments, or ("error", the exception's class) if it raises one.
+    """
+    try:
+        return ("result", function(*arguments))
+    except Exception, e:
+        return ("error", e.__class__)
+
+def _is_close(a, b):
+    return abs(a - b) <= 1e-3 * max(1, abs(b))
+
+
+@unittest.skipIf(ogrecollision is None, "OGRE is not installed.")
+class OgreEquivalenceTest(unittest.TestCase):
+    """
+    Checks that each routine of the CollisionDetector gives the same results
+    as the OgreCollisionDetector's.
+    """
+    def _check(self, name, get_arguments, to_vectors=True):
+        """
+        Calls the routine with the given name of both detectors with
+        arguments from get_arguments(rng, integer) and checks that they
+        return the same results (within rounding, as ogre.Vector3 is single
+        precision) or raise the same exception. The (x, z) position tuples in
+        the arguments are converted to ogre.Vector3 for the
+        OgreCollisionDetector if to_vectors is True.
+        """
+        function = getattr(CollisionDetector, name)
+        reference = getattr(ogrecollision.OgreCollisionDetector, name)
+        rng = random.Random(SEED)
+        for integer in (True, False):
+            for i in xrange(CASES):
+                arguments = get_arguments(rng, integer)
+                reference_arguments = arguments
+                if to_vectors:
+                    reference_arguments = [ogrecollision._vector(argument)
+                                           if isinstance(argument, tuple) else argument
+                                           for argument in arguments]
+                result = _call(function, arguments)
+                expected = _call(reference, reference_arguments)
+                message = "%s%r: %r != %r" % (name, tuple(arguments), result, expected)
+                self.assertEqual(result[0], expected[0], message)
+                result, expected = result[1], expected[1]
+                if isinstance(expected, tuple) and expected and \
+                    not isinstance(expected[0], bool):
+                    # A vector or intersection points.
+                    self.assertTrue(isinstance(result, tuple), message)
+                    self.assertEqual(len(result), len(expected), message)
+                    for a, b in zip(result, expected):
+                        self.assertTrue(_is_close(a, b), message)
+                else:
+                    self.assertEqual(result, expected, message)
+
+    def test_check_circle_line(self):
+        self._check("_check_circle_line", lambda rng, integer: [
+            _get_circle(rng, integer), _get_point(rng, integer),
+            _get_line(rng, integer), _get_point(rng, integer)])
+
+    def test_is_circle_intersecting_line(self):
+        self._check("_is_circle_intersecting_line", lambda rng, integer: [
+            _get_circle(rng, integer), _get_point(rng, integer),
+            _get_line(rng, integer), _get_point(rng, integer)])
+
+    def test_check_circle_circle(self):
+        self._check("_check_circle_circle", lambda rng, integer: [
+            _get_circle(rng, integer), _get_point(rng, integer),
+            _get_circle(rng, integer), _get_point(rng, integer)])
+
+    def test_check_circle_circle_hollow(self):
+        self._check("_check_circle_circle_hollow", lambda rng, integer: [
+            _get_circle(rng, integer, True), _get_point(rng, integer),
+            _get_circle(rng, integer), _get_point(rng, integer)])
+
+    def test_check_circle_rect(self):
+        self._check("_check_circle_rect", lambda rng, integer: [
+            _get_circle(rng, integer), _get_point(rng, integer),
+            _get_rectangle(rng, integer), _get_point(rng, integer)])
+
+    def test_check_cone_circle(self):
+        self._check("_check_cone_circle", lambda rng, integer: [
+            _get_cone(rng, integer), _get_point(rng, integer),
+            _get_circle(rng, integer), _get_point(rng, integer)])
+
+    def test_check_line_line(self):
+        self._check("_check_line_line", lambda rng, integer: [
+            _get_line(rng, integer), _get_point(rng, integer),
+            _get_line(rng, integer), _get_point(rng, integer)])
+
+    def test_check_line_rect(self):
+        self._check("_check_line_rect", lambda rng, integer: [
+            _get_line(rng, integer), _get_point(rng, integer),
+            _get_rectangle(rng, integer), _get_point(rng, integer)])
+
+    def test_resolve_circle_line(self):
+        def get_arguments(rng, integer):
+            line = _get_line(rng, integer)
+            return [_get_circle(rng, integer), _get_point(rng, integer),
+                    _get_point(rng, integer), line, line.point1]
+        self._check("_resolve_circle_line", get_arguments)
+
+    def test_resolve_circle_circle(self):
+        self._check("_resolve_circle_circle", lambda rng, integer: [
+            _get_circle(rng, integer), _get_point(rng, integer),
+            _get_circle(rng, integer), _get_point(rng, integer)])
+
+    def test_resolve_circle_rectangle(self):
+        self._check("_resolve_circle_rectangle", lambda rng, integer: [
+            _get_circle(rng, integer), _get_point(rng, integer),
+            _get_point(rng, integer), _get_rectangle(rng, integer),
+            _get_point(rng, integer)])
+
+    def test_check_collision(self):
+        def get_arguments(rng, integer):
+            shapes = [_get_circle(rng, integer), _get_circle(rng, integer, True),
+                      _get_line(rng, integer), _get_rectangle(rng, integer)]
+            shape1 = rng.choice([_get_circle(rng, integer),
+                                 _get_circle(rng, integer, True),
+                                 _get_cone(rng, integer)])
+            if shape1.type == "cone":
+                shape2 = _get_circle(rng, integer)
+            else:
+                shape2 = rng.choice(shapes)
+            return [shape1, _get_point(rng, integer), shape2, _get_point(rng, integer)]
+        self._check("check_collision", get_arguments, False)
+
+    def test_check_collision_and_resolve(self):
+        def get_arguments(rng, integer):
+            shape2 = rng.choice([_get_circle(rng, integer), _get_line(rng, integer),
+                                 _get_rectangle(rng, integer)])
+            return [_get_circle(rng, integer), _get_point(rng, integer),
+                    _get_point(rng, integer), shape2, _get_point(rng, integer)]
+        self._check("check_collision_and_resolve", get_arguments, False)
+
+    def test_is_between(self):
+        def get_arguments(rng, integer):
+            shape = rng.choice([_get_circle(rng, integer), _get_line(rng, integer),
+                                _get_rectangle(rng, integer)])
+            # The original checks the y of the line's vector (which is always
+            # 0) instead of its z for zero length lines, so it never finds
+            # lines along the z axis between anything.
+            line = _get_line(rng, integer)
+            while line.vector[0] == 0:
+                line = _get_line(rng, integer)
+            return [shape, _get_point(rng, integer), line]
+        self._check("is_between", get_arguments, False)
+
+
+class IntegerInputTest(unittest.TestCase):
+    """
+    Checks that the routines give the same results for int positions and
+    shapes as for the same ones as floats.
+    """
+    def test_check_line_line(self):
+        line1 = BoundingLineSegment((0, 0), (2, 0))
+        line2 = BoundingLineSegment((0, 0), (0, 4))
+        self.assertFalse(CollisionDetector._check_line_line(line1, (0, 0), line2, (3, -2)))
+        line1 = BoundingLineSegment((0., 0.), (2., 0.))
+        line2 = BoundingLineSegment((0., 0.), (0., 4.))
+        self.assertFalse(CollisionDetector._check_line_line(line1, (0., 0.), line2, (3., -2.)))
+
+    def test_check_circle_line(self):
+        line = BoundingLineSegment((0, 0), (4, 0))
+        self.assertEqual(CollisionDetector._check_circle_line(
+            BoundingCircle(1), (3, 1), line, (0, 0)), (0.75,))
+
+
+if __name__ == "__main__":
+    unittest.main()
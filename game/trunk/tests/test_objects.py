@@ -0,0 +1,92 @@
+"""
+Tests of the movement of the game objects.
+"""
+
+import math
+import unittest
+
+from gamestate import collision
+from gamestate.objects import GameObject, Player, ProjectileObject
+from test_world import WorldTestCase
+
+
+class ReplayMovesTest(WorldTestCase):
+    """
+    Checks that replaying moves (as the client does when it reconciles its
+    player with a snapshot) ends up where the moves do, without colliding
+    with anything again.
+    """
+    def setUp(self):
+        WorldTestCase.setUp(self)
+        self.player = Player(self.world)
+        self.player.position = (0, 0)
+        self.world.add_object(self.player)
+        self.other = Player(self.world)
+        # A wall in the way and a projectile passed through on the way.
+        self.wall = self.add_object(collision.BoundingCircle.get(10), (60, 0))
+        self.wall.isPassable = False
+        self.projectile = ProjectileObject(self.other, 4, 10)
+        self.projectile.position = (20, 0)
+        self.collisions = []
+        self.player.collided += lambda *args: self.collisions.append(args)
+        self.expired = []
+        self.projectile.expired += lambda object: self.expired.append(object)
+
+    def test_replay_moves(self):
+        moves = [(15, 0), (15, 0), (40, 0), (20, math.pi / 2)]
+        self.player.replay_moves((0, 0), moves)
+        self.assertEqual(self.collisions, [])
+        self.assertEqual(self.expired, [])
+        self.assertTrue(self.projectile.is_active)
+        # Stopped against the wall, then moved on from there.
+        x, z = self.player.position
+        self.assertTrue(abs(x - (60 - 10 - 6)) < 0.5, x)
+        self.assertTrue(abs(z - 20) < 1e-6, z)
+
+    def test_move_collides(self):
+        # The same first moves made for real do collide.
+        self.player._move_towards(15, 0)
+        self.player._move_towards(15, 0)
+        self.assertEqual(self.expired, [self.projectile])
+
+
+class StaticContactTest(WorldTestCase):
+    """
+    Checks that an object that starts a move overlapping the level's
+    geometry (such as a projectile cast point-blank at a wall) collides with
+    it, even though the move pushes it out of the geometry first.
+    """
+    def setUp(self):
+        WorldTestCase.setUp(self)
+        self.player = Player(self.world)
+        self.player.position = (-100, 0)
+        self.world.add_object(self.player)
+        self.wall = GameObject(self.world)
+        self.wall.is_static = True
+        self.wall.isPassable = False
+        self.wall.position = (0, 0)
+        self.wall.bounding_shape = collision.BoundingCircle.get(20)
+        self.world.add_object(self.wall)
+        self.world.build_static_index()
+        self.world.build_distance_field()
+        self.expired = []
+
+    def _cast(self, position):
+        projectile = ProjectileObject(self.player, 4, 10)
+        projectile.position = position
+        projectile.expired += lambda object: self.expired.append(object)
+        return projectile
+
+    def test_spawned_inside_wall(self):
+        projectile = self._cast((-18, 0))
+        self.assertEqual(projectile._move_towards(5, math.pi), [self.wall])
+        self.assertEqual(self.expired, [projectile])
+
+    def test_spawned_clear_of_wall(self):
+        projectile = self._cast((-30, 0))
+        self.assertEqual(projectile._move_towards(5, math.pi), [])
+        self.assertEqual(self.expired, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
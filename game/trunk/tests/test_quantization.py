@@ -0,0 +1,180 @@
+"""
+Tests of the quantized encoding of the object states in WorldSnapshots.
+"""
+
+import math
+import os.path
+import random
+import unittest
+
+from net import packets
+from net.snapshots import SnapshotDecoder, SnapshotEncoder
+from net.quantization import AngleQuantizer, LinearQuantizer, \
+    get_default_quantization, load_bounds
+
+# The seed of the random values, so that failures can be reproduced.
+SEED = 1234
+
+BOUNDS_FILEPATH = os.path.join(os.path.dirname(__file__), "..", "media",
+                               "levelbounds.bounds")
+
+# Leeway for rounding in the checks of the errors.
+EPSILON = 1e-9
+
+
+def _get_angle_error(a, b):
+    """ Returns the difference between two angles the shortest way round. """
+    return abs((a - b + math.pi) % (2 * math.pi) - math.pi)
+
+def _clamp(value, minimum, maximum):
+    return max(minimum, min(maximum, value))
+
+
+class QuantizerTest(unittest.TestCase):
+    """
+    Checks that the quantizers' codes fit in their formats and are
+    dequantized to within their max_error of the values.
+    """
+    def test_linear(self):
+        rng = random.Random(SEED)
+        for minimum, maximum, bits in [(-512, 512, 8), (-90.5, 121.25, 16),
+                                       (0, 1, 12), (-1e4, 1e4, 32)]:
+            quantizer = LinearQuantizer(minimum, maximum, bits)
+            limit = (1 << (bits - 1)) - 1
+            span = maximum - minimum
+            for i in xrange(2000):
+                value = rng.uniform(minimum - span, maximum + span)
+                code = quantizer.quantize(value)
+                self.assertTrue(-limit <= code <= limit)
+                # Values outside the range are clamped to it.
+                error = abs(quantizer.dequantize(code) - _clamp(value, minimum, maximum))
+                self.assertTrue(error <= quantizer.max_error + EPSILON,
+                                "%r: %r > %r" % (value, error, quantizer.max_error))
+            if minimum == -maximum:
+                self.assertEqual(quantizer.dequantize(quantizer.quantize(0)), 0)
+
+    def test_angle(self):
+        rng = random.Random(SEED)
+        for bits in [8, 12, 16]:
+            quantizer = AngleQuantizer(bits)
+            values = [rng.uniform(-3 * math.pi, 3 * math.pi) for i in xrange(2000)]
+            # Angles around the wrap between -pi and pi.
+            values += [math.pi, -math.pi, math.pi - 1e-9, -math.pi + 1e-9,
+                       math.pi + 1e-9, -math.pi - 1e-9]
+            values += [math.pi + rng.uniform(-1, 1) * quantizer.step * 2
+                       for i in xrange(200)]
+            values += [-math.pi + rng.uniform(-1, 1) * quantizer.step * 2
+                       for i in xrange(200)]
+            for value in values:
+                code = quantizer.quantize(value)
+                self.assertTrue(0 <= code < 1 << bits)
+                angle = quantizer.dequantize(code)
+                self.assertTrue(-math.pi - EPSILON <= angle < math.pi)
+                error = _get_angle_error(angle, value)
+                self.assertTrue(error <= quantizer.max_error + EPSILON,
+                                "%r: %r > %r" % (value, error, quantizer.max_error))
+
+
+class DefaultQuantizationTest(unittest.TestCase):
+    """
+    Checks that random states packed and unpacked with the default
+    quantization come back within its get_max_errors() of the originals.
+    """
+    def setUp(self):
+        self.quantization = get_default_quantization(BOUNDS_FILEPATH)
+        self.bounds = load_bounds(BOUNDS_FILEPATH)
+        self.indices = dict((name, i) for i, (name, format) in
+                            enumerate(packets.snapshot_fields))
+
+    def _get_state(self, rng):
+        min_x, max_x, min_z, max_z = self.bounds
+        width = max_x - min_x
+        height = max_z - min_z
+        values = {
+            # Some of the positions are outside the level.
+            "x": rng.uniform(min_x - width / 4, max_x + width / 4),
+            "z": rng.uniform(min_z - height / 4, max_z + height / 4),
+            "rotation": rng.choice([rng.uniform(-math.pi, math.pi),
+                                    rng.uniform(-1e-3, 1e-3) + math.pi,
+                                    rng.uniform(-1e-3, 1e-3) - math.pi]),
+            "move_speed": rng.uniform(0, 100),
+            "move_direction": rng.uniform(-2 * math.pi, 2 * math.pi),
+            "force_x": rng.choice([0, rng.uniform(-800, 800)]),
+            "force_z": rng.choice([0, rng.uniform(-800, 800)]),
+            "is_dead": rng.randint(0, 1),
+            "health": rng.uniform(0, 100),
+            "power": rng.uniform(0, 100),
+            "input_sequence": rng.randint(0, 0xFFFF),
+        }
+        return tuple([values[name] for name, format in packets.snapshot_fields])
+
+    def test_round_trip(self):
+        quantization = self.quantization
+        max_errors = quantization.get_max_errors()
+        min_x, max_x, min_z, max_z = self.bounds
+        ranges = {
+            "x": (min_x, max_x),
+            "z": (min_z, max_z),
+            "force_x": (-512, 512),
+            "force_z": (-512, 512),
+        }
+        full_mask = (1 << len(packets.snapshot_fields)) - 1
+        codec = quantization.get_mask_codec(full_mask)
+        rng = random.Random(SEED)
+        for i in xrange(5000):
+            state = self._get_state(rng)
+            codes = codec.unpack(codec.pack(*quantization.quantize(state)))
+            result = quantization.dequantize(codes)
+            for name, max_error in max_errors.iteritems():
+                index = self.indices[name]
+                value = state[index]
+                if name in ranges:
+                    error = abs(result[index] - _clamp(value, *ranges[name]))
+                else:
+                    error = _get_angle_error(result[index], value)
+                self.assertTrue(error <= max_error + EPSILON,
+                                "%s %r: %r > %r" % (name, value, error, max_error))
+            for name in ["is_dead", "input_sequence"]:
+                self.assertEqual(result[self.indices[name]], state[self.indices[name]])
+            # Zero forces are sent exactly.
+            for name in ["force_x", "force_z"]:
+                if state[self.indices[name]] == 0:
+                    self.assertEqual(result[self.indices[name]], 0)
+
+    def test_max_errors(self):
+        # The worst case errors in the quantization module's documentation.
+        max_errors = self.quantization.get_max_errors()
+        self.assertTrue(max_errors["x"] < 0.01)
+        self.assertTrue(max_errors["z"] < 0.01)
+        self.assertTrue(max_errors["rotation"] < 0.00005)
+        self.assertTrue(max_errors["move_direction"] < 0.00005)
+        self.assertTrue(max_errors["force_x"] <= 2.02)
+        self.assertTrue(max_errors["force_z"] <= 2.02)
+
+    def test_snapshot(self):
+        # A quantized snapshot is decoded with the decoder's quantization,
+        # and its time isn't rounded (as a float32 would round it).
+        rng = random.Random(SEED)
+        encoder = SnapshotEncoder(quantization=self.quantization)
+        decoder = SnapshotDecoder(quantization=self.quantization)
+        time = 100000.125
+        states = dict((object_id, self._get_state(rng)) for object_id in range(10))
+        encoder.add(time, states)
+        updates = decoder.apply(packets.unpack(encoder.get_packet().pack()))
+        self.assertEqual(set(update.object_id for update in updates
+                             if type(update) is packets.ObjectUpdate), set(states))
+        quantization = self.quantization
+        for update in updates:
+            if type(update) is packets.ObjectUpdate:
+                self.assertEqual(update.time, time)
+                state = quantization.dequantize(quantization.quantize(
+                    states[update.object_id]))
+                self.assertEqual((update.x, update.z),
+                    (state[self.indices["x"]], state[self.indices["z"]]))
+
+        snapshot = packets.unpack(encoder.get_packet().pack())
+        self.assertRaises(ValueError, SnapshotDecoder().apply, snapshot)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+"""
+Tests of the timestep module's clock.
+"""
+
+import sys
+import time
+import unittest
+
+import timestep
+
+
+class GetTimeTest(unittest.TestCase):
+    @unittest.skipUnless(sys.platform.startswith("linux"), "Linux only")
+    def test_is_monotonic_clock(self):
+        # Not the wall clock, which can jump, but the monotonic clock (which
+        # on Linux counts from the boot rather than from 1970).
+        self.assertFalse(timestep.get_time is time.time)
+        self.assertTrue(timestep.get_time() < time.time() / 2)
+
+    def test_advances(self):
+        start = timestep.get_time()
+        time.sleep(0.05)
+        elapsed = timestep.get_time() - start
+        self.assertTrue(0.04 < elapsed < 1, elapsed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Tests of the channels of the UDP transport's connections.
+"""
+
+import unittest
+
+from net import packets, udp
+
+
+def _get_update(object_id, x):
+    update = packets.ObjectUpdate()
+    update.object_id = object_id
+    update.x = x
+    update.z = 0
+    update.rotation = 0
+    update.move_speed = 0
+    update.move_direction = 0
+    update.force_x = 0
+    update.force_z = 0
+    update.is_dead = False
+    return update
+
+def _get_message(number):
+    message = packets.Message()
+    message.message = str(number)
+    message.type = "notice"
+    return message
+
+
+class ConnectionTest(unittest.TestCase):
+    def setUp(self):
+        self.time = 0
+        clock = lambda: self.time
+        self.sender = udp.Connection("receiver", clock)
+        self.receiver = udp.Connection("sender", clock)
+
+    def test_latest_wins_per_object(self):
+        first = self.sender.get_datagrams()
+        self.sender.send(_get_update(1, 1))
+        old = self.sender.get_datagrams()
+        self.sender.send(_get_update(2, 2))
+        other = self.sender.get_datagrams()
+        self.sender.send(_get_update(1, 3))
+        new = self.sender.get_datagrams()
+
+        # The update for object 2 isn't superseded by the newer datagram
+        # with an update for object 1, but the older one for object 1 is.
+        received = []
+        for datagram in first + new + other + old:
+            received.extend(self.receiver.receive(datagram))
+        self.assertEqual([(p.object_id, p.x) for p in received],
+                         [(1, 3), (2, 2)])
+
+    def test_reliable_window(self):
+        count = udp.RELIABLE_WINDOW + 100
+        for i in range(count):
+            self.sender.send(_get_message(i))
+        datagrams = self.sender.get_datagrams()
+        # Lose the first datagram, so the rest have to wait for it.
+        for datagram in datagrams[1:]:
+            self.receiver.receive(datagram)
+        self.assertTrue(len(self.receiver.reliable_in) < udp.RELIABLE_WINDOW)
+
+        received = []
+        while len(received) < count:
+            self.time += 1
+            for datagram in self.sender.get_datagrams():
+                received.extend(self.receiver.receive(datagram))
+            for datagram in self.receiver.get_datagrams():
+                self.sender.receive(datagram)
+            self.assertTrue(len(self.receiver.reliable_in) < udp.RELIABLE_WINDOW)
+        self.assertEqual([int(p.message) for p in received], range(count))
+
+
+if __name__ == "__main__":
+    unittest.main()
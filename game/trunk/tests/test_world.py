@@ -0,0 +1,252 @@
+"""
+Tests of the World's collision queries.
+"""
+
+import math
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from gamestate import collision
+from gamestate.collision import BoundingCircle, BoundingCone, \
+    BoundingLineSegment, BoundingRectangle, CollisionDetector
+from gamestate.objects import GameObject, ZoneObject
+from gamestate.world import World
+
+# The seed of the random worlds, so that failures can be reproduced.
+SEED = 1234
+
+
+class WorldTestCase(unittest.TestCase):
+    """
+    Runs each test with a new World, in a temporary directory so that the
+    world's log isn't left behind.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.old_directory = os.getcwd()
+        os.chdir(self.directory)
+        self.world = World()
+
+    def tearDown(self):
+        self.world.debug_file.close()
+        os.chdir(self.old_directory)
+        shutil.rmtree(self.directory)
+
+    def add_object(self, bounding_shape, position,
+                   category=collision.CATEGORY_DEFAULT):
+        object = GameObject(self.world)
+        object.collision_category = category
+        object.position = position
+        object.bounding_shape = bounding_shape
+        self.world.add_object(object)
+        return object
+
+
+def _get_number(rng, integer, low, high):
+    if integer:
+        return rng.randint(low, high)
+    return rng.uniform(low, high)
+
+def _get_point(rng, integer, extent=30):
+    return (_get_number(rng, integer, -extent, extent),
+            _get_number(rng, integer, -extent, extent))
+
+def _get_nonzero_point(rng, integer, extent=10):
+    """ Returns a random point other than (0, 0), for line segment ends. """
+    point = (0, 0)
+    while point == (0, 0):
+        point = _get_point(rng, integer, extent)
+    return point
+
+
+@unittest.skipIf(not CollisionDetector.BATCH_SUPPORTED, "NumPy is not installed.")
+class BatchCollidersTest(WorldTestCase):
+    """
+    Checks that World._get_colliders_batch() finds the same colliders as
+    testing each object with CollisionDetector.check_collision().
+    """
+    def _check(self, get_shape, object_shapes, integer, queries=200):
+        """
+        Fills the world with 100 random objects of the given shape types
+        ("circle", "linesegment" or "rectangle") and checks the colliders of
+        queries random query shapes from get_shape(rng, integer).
+        """
+        rng = random.Random(SEED)
+        for i in xrange(100):
+            shape_type = rng.choice(object_shapes)
+            if shape_type == "circle":
+                shape = BoundingCircle(_get_number(rng, integer, 1, 5))
+            elif shape_type == "linesegment":
+                shape = BoundingLineSegment((0, 0), _get_nonzero_point(rng, integer),
+                                            (0, 1))
+            else:
+                shape = BoundingRectangle(_get_number(rng, integer, 1, 10),
+                                          _get_number(rng, integer, 1, 10),
+                                          _get_number(rng, integer, 0, 359))
+            self.add_object(shape, _get_point(rng, integer))
+        objects = self.world.objects
+
+        for i in xrange(queries):
+            shape = get_shape(rng, integer)
+            try:
+                position = _get_point(rng, integer)
+                expected = [object for object in objects
+                            if CollisionDetector.check_collision(shape, position,
+                                object.bounding_shape, object.position)]
+            except Exception:
+                # The query circle is inside a rectangle, which can't be
+                # tested.
+                continue
+            colliders = self.world._get_colliders_batch(shape, position, objects)
+            self.assertEqual(colliders, expected, "%s at %r" % (shape.type, position))
+            # The world's own query (with its broadphase) finds the same.
+            self.world.batch_minimum = 0
+            colliders = self.world.get_colliders(shape, position)
+            self.assertEqual(set(colliders), set(expected))
+
+    def test_circle(self):
+        for integer in (True, False):
+            self._check(lambda rng, integer:
+                BoundingCircle(_get_number(rng, integer, 1, 15)),
+                ["circle", "linesegment", "rectangle"], integer)
+
+    def test_hollow_circle(self):
+        for integer in (True, False):
+            self._check(lambda rng, integer:
+                BoundingCircle(_get_number(rng, integer, 1, 15), True),
+                ["circle", "linesegment", "rectangle"], integer)
+
+    def test_cone(self):
+        for integer in (True, False):
+            self._check(lambda rng, integer:
+                BoundingCone(_get_number(rng, integer, 1, 20),
+                             rng.uniform(-math.pi, math.pi),
+                             rng.uniform(0.1, math.pi)),
+                ["circle"], integer)
+
+    def test_line_segment(self):
+        for integer in (True, False):
+            self._check(lambda rng, integer:
+                BoundingLineSegment((0, 0), _get_nonzero_point(rng, integer),
+                                    (0, 1)),
+                ["circle"], integer)
+
+
+class RewindTest(WorldTestCase):
+    """
+    Checks that get_colliders_at() finds every object that a test of all of
+    them at their rewound positions does, as objects move a little each
+    update and now and then jump across the world (between updates too).
+    """
+    def setUp(self):
+        WorldTestCase.setUp(self)
+        self.world.is_master = True
+
+    def _get_expected(self, shape, position, time):
+        world = self.world
+        expected = []
+        for object in world.objects:
+            object_position = world.get_position_at(object, time)
+            if object_position is not None and \
+                CollisionDetector.check_collision(shape, position,
+                    object.bounding_shape, object_position) is not False:
+                expected.append(object)
+        return set(expected)
+
+    def test_get_colliders_at(self):
+        rng = random.Random(SEED)
+        world = self.world
+        objects = [self.add_object(BoundingCircle.get(rng.choice([4, 10])),
+                                   _get_point(rng, False, 400))
+                   for i in xrange(200)]
+        shapes = [BoundingCircle.get(40), BoundingCone.get(60, 0.5, 2),
+                  BoundingLineSegment((0, 0), (80, 30), (-0.35, 0.94))]
+        for step in xrange(150):
+            for object in objects:
+                if rng.random() < 0.01:
+                    object.position = _get_point(rng, False, 400)
+                else:
+                    object.position = (object.position[0] + rng.uniform(-3, 3),
+                                       object.position[1] + rng.uniform(-3, 3))
+            world.update(0.01)
+            # Some move between updates (as players do when their inputs
+            # arrive).
+            for object in rng.sample(objects, 5):
+                object.position = _get_point(rng, False, 400)
+            for i in xrange(5):
+                shape = rng.choice(shapes)
+                position = _get_point(rng, False, 400)
+                time = world.time - rng.uniform(0, 0.8)
+                self.assertEqual(
+                    set(world.get_colliders_at(shape, position, time)),
+                    self._get_expected(shape, position, time))
+
+
+class ZoneOccupancyTest(WorldTestCase):
+    """
+    Checks that zones keep their occupants up to date as objects move, come
+    and go, and fire an entered and exited event for each change.
+    """
+    def setUp(self):
+        WorldTestCase.setUp(self)
+        self.world.is_master = True
+
+    def test_occupants(self):
+        rng = random.Random(SEED)
+        world = self.world
+        players = [self.add_object(BoundingCircle.get(10),
+                                   _get_point(rng, False, 300),
+                                   collision.CATEGORY_PLAYER)
+                   for i in xrange(40)]
+        zones = []
+        events = { }
+        def on_entered(zone, object):
+            self.assertFalse(object in events[zone])
+            events[zone].add(object)
+        def on_exited(zone, object):
+            events[zone].remove(object)
+        for i in xrange(12):
+            shape = rng.choice([BoundingCircle.get(50),
+                                BoundingCone.get(80, rng.uniform(-math.pi, math.pi), 2),
+                                collision.BoundingAnnulus.get(40, 60)])
+            zone = ZoneObject(world, shape)
+            zone.position = _get_point(rng, False, 200)
+            if i % 3 == 0:
+                zone.anchor = rng.choice(players)
+            zone.entered += on_entered
+            zone.exited += on_exited
+            events[zone] = set()
+            world.add_object(zone)
+            zones.append(zone)
+
+        for step in xrange(300):
+            for player in players:
+                if rng.random() < 0.5:
+                    player.position = (player.position[0] + rng.uniform(-8, 8),
+                                       player.position[1] + rng.uniform(-8, 8))
+            if step % 30 == 10:
+                world.remove_object(players.pop(rng.randrange(len(players))))
+                players.append(self.add_object(BoundingCircle.get(10), (0, 0),
+                                               collision.CATEGORY_PLAYER))
+            world.update(0.01)
+            for zone in zones:
+                expected = set(world.get_colliders(zone.bounding_shape,
+                    zone.position, mask=collision.CATEGORY_PLAYER))
+                self.assertEqual(set(zone.occupants), expected)
+                self.assertEqual(events[zone], expected)
+            for player in players:
+                self.assertEqual(player.zones, set(zone for zone in zones
+                                                   if player in zone.occupants))
+
+        for zone in zones:
+            zone.remove()
+        self.assertEqual(len(world.zone_index), 0)
+        for player in players:
+            self.assertEqual(player.zones, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
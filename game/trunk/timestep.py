@@ -0,0 +1,160 @@
+"""
+The timestep module contains the FixedTimestep, which runs a simulation's
+updates at a fixed rate no matter how long each update or the time between
+them takes.
+"""
+
+from __future__ import division
+import os
+import sys
+import time
+
+# The CLOCK_MONOTONIC ids of clock_gettime() by platform.
+_CLOCK_MONOTONIC_IDS = {
+    "linux": 1,
+    "darwin": 6,
+    "freebsd": 4,
+}
+
+
+def _get_clock_gettime_monotonic():
+    """
+    Returns a function returning the time in seconds of the C library's
+    clock_gettime() with CLOCK_MONOTONIC (called through ctypes), or None if
+    it isn't available on this platform.
+    """
+    clock_id = None
+    for platform, platform_clock_id in _CLOCK_MONOTONIC_IDS.iteritems():
+        if sys.platform.startswith(platform):
+            clock_id = platform_clock_id
+    if clock_id is None:
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+    except ImportError:
+        return None
+
+    class timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+    # Older glibcs only have clock_gettime() in librt.
+    for name in ["c", "rt"]:
+        path = ctypes.util.find_library(name)
+        if path is None:
+            continue
+        try:
+            clock_gettime = ctypes.CDLL(path, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        clock_gettime.restype = ctypes.c_int
+
+        def monotonic():
+            t = timespec()
+            if clock_gettime(clock_id, ctypes.byref(t)) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return t.tv_sec + t.tv_nsec * 1e-9
+
+        try:
+            monotonic()
+        except OSError:
+            continue
+        return monotonic
+    return None
+
+
+try:
+    # A clock that can't go backwards (Python 3.3+).
+    get_time = time.monotonic
+except AttributeError:
+    # Python 2: the system's monotonic clock, where we can get at it.
+    get_time = _get_clock_gettime_monotonic()
+if get_time is None:
+    if sys.platform == "win32":
+        # time.clock() is a high resolution clock that can't go backwards on
+        # Windows.
+        get_time = time.clock
+    else:
+        # The wall clock, as a last resort. It can jump when the system time
+        # is changed, which the FixedTimestep copes with (see
+        # FixedTimestep.advance()).
+        get_time = time.time
+
+
+class FixedTimestep(object):
+    """
+    Calls an update function with a fixed dt of 1 / tick_rate seconds, as
+    many times as the time that has passed calls for. Time is collected in an
+    accumulator and spent a whole tick at a time, so the simulation always
+    advances in equal steps (which keeps collision detection and the tick
+    rate the same whatever the load) and the time left over carries on to
+    the next call.
+
+    If the updates fall behind, at most max_catch_up ticks are run in one go
+    and the rest of the time owed is dropped rather than letting the
+    simulation spiral further and further behind.
+
+    Counters:
+    ticks -- The number of ticks run.
+    overruns -- The number of ticks whose update took longer than a tick.
+    dropped_ticks -- The number of ticks dropped to catch up.
+    """
+    def __init__(self, update, tick_rate=100, max_catch_up=5, clock=get_time):
+        """
+        Arguments:
+        update -- The function to call every tick with the tick's dt.
+        tick_rate -- The number of ticks per second.
+        max_catch_up -- The most ticks to run in a single call to advance().
+        clock -- A function returning the current time in seconds.
+        """
+        self.update = update
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.accumulator = 0
+        self.last_time = None
+        self.reset_counters()
+
+    def reset_counters(self):
+        """ Resets the ticks, overruns and dropped_ticks counters to 0. """
+        self.ticks = 0
+        self.overruns = 0
+        self.dropped_ticks = 0
+
+    def advance(self):
+        """
+        Runs every tick that is due since the last call (at most
+        max_catch_up of them) and returns the time in seconds until the next
+        tick is due. Time going backwards (which the wall clock that
+        get_time falls back on can do) is treated as no time passing.
+        """
+        clock = self.clock
+        now = clock()
+        if self.last_time is None:
+            self.last_time = now
+        elapsed = now - self.last_time
+        self.last_time = now
+        if elapsed > 0:
+            self.accumulator += elapsed
+
+        dt = self.dt
+        steps = 0
+        while self.accumulator >= dt:
+            if steps >= self.max_catch_up:
+                # We are too far behind to catch up, so drop the rest of the
+                # ticks owed (keeping the part of a tick left over).
+                dropped = int(self.accumulator // dt)
+                self.dropped_ticks += dropped
+                self.accumulator -= dropped * dt
+                break
+            start = clock()
+            self.update(dt)
+            if clock() - start > dt:
+                self.overruns += 1
+            self.ticks += 1
+            steps += 1
+            self.accumulator -= dt
+        return dt - self.accumulator